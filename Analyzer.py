@@ -1,145 +1,238 @@
-import subprocess
-import nibabel as nib
 import numpy as np
-import matplotlib.pyplot as plt
-import os, glob, cv2
-from scipy import ndimage
-import skimage.measure
-import os
+import nibabel as nib
+import os, json
+from dataclasses import dataclass, field, asdict
+
+from segmentation_engine import get_engine
+from tumor_metrics import compute_metrics
+from volume_io import open_volume, ArrayVolume
+from rendering import render_slice, save_images, to_uint8, xai_overlay, encode
+from slice_store import write_store
+from mask_codec import MASK_FILE, PackedMask
+from xai import XAI_FILE, Heatmaps
+from flow import Flow
+from telemetry import span
+from result_cache import get_cache, hash_file, checkpoint_id, cache_key
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-# ================= nnUNet PATHS =================
-os.environ["nnUNet_raw"] = os.path.join(BASE_DIR, "nnUNet_raw")
-os.environ["nnUNet_preprocessed"] = os.path.join(BASE_DIR, "nnUNet_preprocessed")
-os.environ["nnUNet_results"] = os.path.join(BASE_DIR, "nnUNet_results")
-
-INPUT_DIR = os.path.join(BASE_DIR, "static", "uploads")
-OUTPUT_DIR = os.path.join(BASE_DIR, "static", "output_case012")
-CHECKPOINT = os.path.join(BASE_DIR, "checkpoint_best.pth")
-
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-# ================= READ INPUT IMAGE =================
-with open("file.txt", "r") as f:
-    INPUT_IMAGE = f.read().strip()
-
-print("Running nnU-Net inference...")
-
-# ================= RUN nnUNet =================
-subprocess.check_call([
-    "nnUNetv2_predict",
-    "-i", INPUT_DIR,
-    "-o", OUTPUT_DIR,
-    "-d", "0",
-    "-c", "3d_fullres",
-    "-f", "0",
-    "-device", "cpu",
-    "-chk", CHECKPOINT
-])
-
-# ================= LOAD PREDICTION =================
-pred_file = glob.glob(os.path.join(OUTPUT_DIR, "*.nii*"))[0]
-pred_img = nib.load(pred_file)
-pred = pred_img.get_fdata()
-spacing = pred_img.header.get_zooms()[:3]
-
-ct_img = nib.load(INPUT_IMAGE)
-ct = ct_img.get_fdata()
-
-mask = (pred > 0).astype(np.uint8)
-
-# ================= METRICS =================
-voxel_count = int(mask.sum())
-voxel_volume_mm3 = spacing[0] * spacing[1] * spacing[2]
-volume_mm3 = voxel_count * voxel_volume_mm3
-# ================= TUMOR SIZE CALCULATION =================
-coords = np.where(mask > 0)
-
-if len(coords[0]) > 0:
-    x_min, x_max = coords[0].min(), coords[0].max()
-    y_min, y_max = coords[1].min(), coords[1].max()
-    z_min, z_max = coords[2].min(), coords[2].max()
-
-    tumor_size_x_mm = (x_max - x_min + 1) * spacing[0]
-    tumor_size_y_mm = (y_max - y_min + 1) * spacing[1]
-    tumor_size_z_mm = (z_max - z_min + 1) * spacing[2]
-
-    tumor_max_diameter_mm = max(
-        tumor_size_x_mm,
-        tumor_size_y_mm,
-        tumor_size_z_mm
+
+# Fixed order the prediction page expects: overlay, segmentation, heatmap, heatmap MIP
+OUTPUT_IMAGES = ["overlay.png", "segmentation.png", "xai_overlay.png", "xai_mip.png"]
+
+# Bump when metrics or rendered images change so stale cache entries are not reused
+CACHE_VERSION = "8"
+
+# The prediction is stored packed (mask_codec); also write it as NIfTI
+SAVE_NIFTI = os.getenv("SAVE_NIFTI", "0") == "1"
+
+
+@dataclass
+class AnalysisResult:
+    volume: float
+    shape: tuple
+    voxel_count: int
+    spacing: tuple
+    mid_slice: int
+    size_x: float
+    size_y: float
+    size_z: float
+    max_diameter: float
+    prediction_path: str = None
+    images: list = field(default_factory=list)
+    inference_seconds: float = None
+    cached: bool = False
+    lesion_count: int = 0
+    lesions: list = field(default_factory=list)
+    slice_areas: list = field(default_factory=list)
+    conversion_seconds: float = None
+
+    def to_dict(self):
+        d = asdict(self)
+        d["shape"] = list(self.shape)
+        d["spacing"] = list(self.spacing)
+        return d
+
+
+# ================= RENDERING =================
+def render_outputs(ct_slice, mask_z, output_dir, heatmaps=None, z=None):
+    """
+    Overlay, mask-only and XAI heatmap views of one slice, as PNGs. With
+    `heatmaps` (xai.Heatmaps) the heatmap is its slice `z` and their
+    projection is rendered over the same slice as a fourth image.
+    """
+    if heatmaps is None:
+        return save_images(render_slice(ct_slice, mask_z), output_dir)
+    paths = save_images(render_slice(ct_slice, mask_z, weights=heatmaps.axial(z)), output_dir)
+    mip_path = os.path.join(output_dir, OUTPUT_IMAGES[3])
+    with open(mip_path, "wb") as f:
+        f.write(encode(xai_overlay(to_uint8(ct_slice), heatmaps.mip())))
+    return paths + [mip_path]
+
+
+# ================= STAGES =================
+class _Case:
+    """What the segmentation stage hands to the stages that depend on it."""
+
+    def __init__(self, output_dir, key, metrics=None, seg=None, ct=None, conversion_seconds=None):
+        self.output_dir = output_dir
+        self.prediction_path = os.path.join(output_dir, MASK_FILE)
+        self.key = key
+        self.metrics = metrics          # only set on a cache hit
+        self.seg = seg
+        self.ct = ct
+        self.conversion_seconds = conversion_seconds
+
+    @property
+    def cached(self):
+        return self.metrics is not None
+
+
+def segment_case(input_image, output_dir, engine=None, content_hash=None, use_cache=True):
+    """Cache lookup, then (on a miss) nnU-Net on the NIfTI or zipped DICOM input."""
+    os.makedirs(output_dir, exist_ok=True)
+    engine = engine or get_engine()
+
+    key = None
+    if use_cache:
+        tag = getattr(engine, "cache_tag", "")
+        version = f"{CACHE_VERSION}-{tag}" if tag else CACHE_VERSION
+        key = cache_key(content_hash or hash_file(input_image), checkpoint_id(engine.checkpoint), version)
+        metrics = get_cache().get(key, output_dir)
+        if metrics is not None:
+            return _Case(output_dir, key, metrics=metrics)
+
+    if input_image.lower().endswith(".zip"):
+        # DICOM series: decode in memory and segment the array directly
+        from dicom_ingest import load_dicom_zip
+
+        with span("segment.dicom"):
+            series = load_dicom_zip(input_image)
+        print(f"Decoded DICOM series {series.volume.shape} in {series.seconds:.2f}s")
+        print("Running nnU-Net inference...")
+        seg = engine.segment_array(series.volume, series.spacing, series.affine)
+        ct = ArrayVolume(series.volume, series.spacing, series.affine)
+        return _Case(output_dir, key, seg=seg, ct=ct, conversion_seconds=series.seconds)
+
+    print("Running nnU-Net inference...")
+    seg = engine.segment(input_image)
+    # only the slices that are rendered or stored are ever read from disk
+    return _Case(output_dir, key, seg=seg, ct=open_volume(input_image))
+
+
+def measure_case(case):
+    return case.metrics if case.cached else compute_metrics(case.seg.label_map, case.seg.spacing)
+
+
+def save_mask(case):
+    """The packed prediction (first) and, with SAVE_NIFTI, a NIfTI copy."""
+    nifti_path = os.path.join(case.output_dir, "prediction.nii.gz")
+    if case.cached:
+        return [case.prediction_path] + ([nifti_path] if os.path.exists(nifti_path) else [])
+
+    PackedMask.encode(case.seg.label_map, case.seg.spacing, case.ct.affine).save(case.prediction_path)
+    if not SAVE_NIFTI:
+        return [case.prediction_path]
+    nib.save(nib.Nifti1Image(case.seg.label_map.astype(np.uint8), case.ct.affine), nifti_path)
+    return [case.prediction_path, nifti_path]
+
+
+def explain_case(case):
+    """3D heatmaps of every tumor slice (one EDT over the tumor's box), stored with the case."""
+    if case.cached:
+        return None
+    heatmaps = Heatmaps.compute(case.seg.label_map, case.seg.spacing)
+    heatmaps.save(os.path.join(case.output_dir, XAI_FILE))
+    return heatmaps
+
+
+def render_case(case, metrics, heatmaps):
+    if case.cached:
+        return [os.path.join(case.output_dir, f) for f in OUTPUT_IMAGES]
+    z = metrics["mid_slice"]
+    return render_outputs(
+        case.ct.axial(z),
+        (case.seg.label_map[:, :, z] > 0).astype(np.uint8),
+        case.output_dir,
+        heatmaps,
+        z
     )
-else:
-    tumor_size_x_mm = tumor_size_y_mm = tumor_size_z_mm = tumor_max_diameter_mm = 0
-
-# ================= FIND BEST TUMOR SLICE =================
-tumor_slices = np.where(mask.sum(axis=(0,1)) > 0)[0]
-z = int(tumor_slices[len(tumor_slices)//2]) if len(tumor_slices) > 0 else mask.shape[2]//2
-
-# ======================================================
-# OVERLAY → CT + LIGHT RED FILL + RED BOUNDARY
-# ======================================================
-plt.figure(figsize=(6,6))
-plt.imshow(ct[:,:,z], cmap="gray")
-
-# light fill
-plt.imshow(
-    np.ma.masked_where(mask[:,:,z] == 0, mask[:,:,z]),
-    cmap="Reds",
-    alpha=0.25
-)
-
-# boundary
-contours = skimage.measure.find_contours(mask[:,:,z], 0.5)
-for cnt in contours:
-    plt.plot(cnt[:,1], cnt[:,0], color="red", linewidth=2)
-
-plt.axis("off")
-plt.savefig(os.path.join(OUTPUT_DIR, "overlay.png"), dpi=200, bbox_inches="tight")
-plt.close()
-
-# ================= SEGMENTATION (CT + FILLED MASK) =================
-# ================= SEGMENTATION (MASK ONLY – NO CT) =================
-seg_mask = (mask[:, :, z] * 255).astype(np.uint8)
-
-plt.figure(figsize=(6,6))
-plt.imshow(seg_mask, cmap="gray")   # or cmap="Blues"
-plt.axis("off")
-
-plt.savefig(
-    os.path.join(OUTPUT_DIR, "segmentation.png"),
-    dpi=200,
-    bbox_inches="tight"
-)
-plt.close()
-
-
-
-
-# ======================================================
-# HEATMAP (XAI) → CT + ATTENTION
-# ======================================================
-dist = ndimage.distance_transform_edt(mask[:,:,z])
-if dist.max() > 0:
-    dist = dist / dist.max()
-
-ct_slice = ct[:,:,z]
-ct_norm = ct_slice - ct_slice.min()
-if ct_norm.max() > 0:
-    ct_norm = ct_norm / ct_norm.max()
-
-ct_rgb = cv2.cvtColor((ct_norm*255).astype(np.uint8), cv2.COLOR_GRAY2BGR)
-heatmap = cv2.applyColorMap((dist*255).astype(np.uint8), cv2.COLORMAP_JET)
-xai_overlay = cv2.addWeighted(ct_rgb, 0.6, heatmap, 0.4, 0)
-cv2.imwrite(os.path.join(OUTPUT_DIR, "xai_overlay.png"), xai_overlay)
-
-# ================= SAVE RESULTS =================
-with open("dice_vol.txt", "w") as f:
-    f.write(
-        f"NA|{volume_mm3}|{mask.shape}|{voxel_count}|{spacing}|{z}|"
-        f"{tumor_size_x_mm:.2f}|{tumor_size_y_mm:.2f}|"
-        f"{tumor_size_z_mm:.2f}|{tumor_max_diameter_mm:.2f}"
+
+
+def store_case(case):
+    """Downsampled CT for the slice viewer (the mask comes from the packed prediction)."""
+    return [] if case.cached else write_store(case.ct, case.output_dir)
+
+
+def finish_case(case, metrics, mask_files, images, store_files):
+    if case.cached:
+        return AnalysisResult(**metrics, prediction_path=mask_files[0], images=images,
+                              inference_seconds=0.0, cached=True)
+
+    if case.key is not None:
+        xai_files = [os.path.join(case.output_dir, XAI_FILE)]
+        get_cache().put(case.key, metrics, mask_files + images + store_files + xai_files)
+    return AnalysisResult(
+        **metrics,
+        prediction_path=mask_files[0],
+        images=images,
+        inference_seconds=case.seg.seconds,
+        conversion_seconds=case.conversion_seconds
     )
 
 
-print("Inference completed successfully")
+def add_analysis_stages(flow, input_image, output_dir, engine=None, content_hash=None, use_cache=True):
+    """
+    Declare the imaging stages on a flow.Flow. After `segment`, the mask
+    is written, measured, explained, rendered and stored concurrently; `analysis`
+    joins them into an AnalysisResult. Other stages may depend on
+    `metrics` to start before rendering is done.
+    """
+    flow.stage("segment", lambda: segment_case(input_image, output_dir, engine, content_hash, use_cache))
+    flow.stage("metrics", measure_case, "segment")
+    flow.stage("save_mask", save_mask, "segment")
+    flow.stage("xai", explain_case, "segment")
+    flow.stage("render", render_case, "segment", "metrics", "xai")
+    flow.stage("store", store_case, "segment")
+    flow.stage("analysis", finish_case, "segment", "metrics", "save_mask", "render", "store")
+    return flow
+
+
+# ================= FULL ANALYSIS =================
+def run_analysis(input_image, output_dir, engine=None, content_hash=None, use_cache=True):
+    """
+    Segment `input_image` with the warm in-process engine, compute tumor
+    metrics and render the overlay / segmentation / heatmap images into
+    `output_dir`, which should be private to this case.
+
+    Results are cached on (volume content hash, checkpoint hash); a hit
+    skips inference and rendering and only links the stored artifacts
+    into `output_dir`.
+    """
+    flow = add_analysis_stages(Flow(), input_image, output_dir, engine, content_hash, use_cache)
+    return flow.run()["analysis"]
+
+
+if __name__ == "__main__":
+    import argparse
+    from segmentation_engine import (BACKENDS, INFERENCE_BACKEND, MODES, QUANTIZE, SEGMENTATION_MODE, TILE_STEP_SIZE,
+                                     TTA, SegmentationEngine)
+    from workspace import Workspace
+
+    parser = argparse.ArgumentParser(description="Segment one CT volume and print its tumor metrics as JSON")
+    parser.add_argument("input_image")
+    parser.add_argument("--output-dir", help="defaults to a fresh workspace")
+    parser.add_argument("--mode", choices=MODES, default=SEGMENTATION_MODE,
+                        help="whole-volume inference, or a coarse pass then a refined crop")
+    parser.add_argument("--backend", choices=BACKENDS, default=INFERENCE_BACKEND)
+    parser.add_argument("--quantize", action="store_true", default=QUANTIZE, help="int8 weights (onnx backend)")
+    parser.add_argument("--tta", default=TTA, help='mirror axes: "all", "none" or e.g. "2"')
+    parser.add_argument("--tile-step", type=float, default=TILE_STEP_SIZE, help="sliding-window step, fraction of a patch")
+    args = parser.parse_args()
+
+    engine = SegmentationEngine(mode=args.mode, backend=args.backend, quantize=args.quantize, tta=args.tta,
+                                tile_step_size=args.tile_step)
+    output_dir = args.output_dir or Workspace.create().output_dir
+    result = run_analysis(os.path.abspath(args.input_image), output_dir, engine=engine)
+
+    print(json.dumps(result.to_dict(), indent=2))
+    print("Inference completed successfully")
@@ -1,39 +1,30 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, abort, Response, stream_with_context, send_file
 from werkzeug.utils import secure_filename
 from datetime import datetime
-import os, shutil
+import io, itertools, os
 
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 # ================= DATABASE =================
 from database import init_db, hash_password
-from models import User
-from lab_prediction import predict_pancreas_stage
-
-# ================= GEMINI =================
-import google.generativeai as genai
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-gemini_model = genai.GenerativeModel("gemini-2.5-flash")
-chat = gemini_model.start_chat(history=[])
+from models import User, Prediction
+import jobs
+from workspace import WORKSPACE_ROOT, CASES_ROOT, case_dir
+from result_cache import get_cache
+import telemetry
+from uploads import Upload, UploadError, save_stream, CHUNK_SIZE, MAX_UPLOAD_BYTES
 
 # ================= FLASK APP =================
 app = Flask(__name__)
 app.secret_key = "change-this-secret"
-app.config["UPLOAD_FOLDER"] = os.path.join(BASE_DIR, "static", "uploads")
-app.config["MAX_CONTENT_LENGTH"] = 32 * 1024 * 1024  # 32MB
+# Large studies go through the chunked /uploads API; plain form posts are
+# streamed to disk by uploads.save_stream, so this only caps a single request
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES + 1024 * 1024
 
 init_db()
-
-# ================= HELPERS =================
-def clear_folder(folder):
-    if os.path.exists(folder):
-        for f in os.listdir(folder):
-            p = os.path.join(folder, f)
-            if os.path.isfile(p):
-                os.remove(p)
-            elif os.path.isdir(p):
-                shutil.rmtree(p)
+jobs.init_queue()
+telemetry.init_metrics()
 
 # ================= ROUTES =================
 @app.route("/")
@@ -69,16 +60,11 @@ def signup():
         password = request.form["password"]
         full_name = request.form.get("full_name", "")
 
-        if User.get_by_username(username):
-            flash("Username already exists", "error")
-            return redirect(url_for("signup"))
-
-        if User.get_by_email(email):
-            flash("Email already registered", "error")
+        _, error = User.register(username, email, hash_password(password), full_name)
+        if error:
+            flash(error, "error")
             return redirect(url_for("signup"))
 
-        user = User(username, email, hash_password(password), full_name)
-        user.save()
         flash("Signup successful! Please login.", "success")
         return redirect(url_for("login"))
 
@@ -94,90 +80,21 @@ def prediction():
     png_files = []
 
     if request.method == "POST":
-        clear_folder(os.path.join(BASE_DIR, "static", "uploads"))
-        clear_folder(os.path.join(BASE_DIR, "static", "output_case012"))
-
         # -------- IMAGE UPLOAD --------
-        file = request.files["image"]
-        filename = secure_filename(file.filename)
-        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{session['user_id']}_{ts}_{filename}"
-        img_path = os.path.join(BASE_DIR, "static", "uploads", filename)
-        file.save(img_path)
-
-        with open(os.path.join(BASE_DIR, "file.txt"), "w") as f:
-            f.write(os.path.abspath(img_path))
-
-        # -------- RUN ANALYZER --------
-        ret = os.system(f"python {os.path.join(BASE_DIR, 'Analyzer.py')}")
-        if ret != 0:
-            flash("Inference failed. Check Analyzer.py logs.", "error")
-            return render_template("prediction.html", png_files=[])
-
-        # -------- READ OUTPUT --------
-        _, volume, shape, voxel_count, spacing, mid_slice, size_x, size_y, size_z, max_diameter = \
-          open(os.path.join(BASE_DIR, "dice_vol.txt")).read().split("|")
-
-        volume = float(volume)
-        max_diameter = float(max_diameter)
-
-
-        # -------- LAB MODEL --------
-        stage, survival, advice = predict_pancreas_stage(
-            CA19_9=float(request.form["ca19_9"]),
-            Total_Bilirubin=float(request.form["total_bilirubin"]),
-            ALP=float(request.form["alp"]),
-            Albumin=float(request.form["albumin"]),
-            NLR=float(request.form["nlr"]),
-            Age=int(request.form["age"])
-        )
-        report = request.form['symptoms']
-        # if not report.strip():
-        #     report = "Radiology report text was not provided."
-
-        # -------- GEMINI --------
-        prompt = f"""
-<div>
-
-<p><b>Radiology Report:</b></p>
-<p>{report}</p>
-
-<p><b>AI Predictions (use as given):</b></p>
-<ul>
-  <li>Tumor volume: {float(volume)/1000:.2f} mL</li>
-  <li>Tumor maximum diameter: {max_diameter:.2f} mm</li>
-  <li>Lab-based predicted stage: {stage}</li>
-</ul>
-
-<p><b>Tasks:</b></p>
-<ol>
-  <li>Highlight only the exact phrases from the report that indicate tumor or malignancy using <mark> tags.</li>
-  <li>Briefly summarize tumor size and extent using the provided imaging values.</li>
-  <li>Briefly restate the lab-based stage prediction.</li>
-  <li>Provide concise clinical recommendations in bullet points.</li>
-</ol>
-
-<p><b>Rules:</b></p>
-<ul>
-  <li>Do not validate, compare, or question predictions</li>
-  <li>No TNM or staging logic</li>
-  <li>No inconsistency analysis</li>
-  <li>HTML only, start with &lt;div&gt;</li>
-</ul>
-
-</div>
-"""
-
-
-        ai_resp = chat.send_message(prompt).text
-
-        # -------- OUTPUT IMAGES --------
-        output_dir = os.path.join(BASE_DIR, "static", "output_case012")
-        png_files = [
-            "static/output_case012/" + f
-            for f in os.listdir(output_dir)
-            if f.endswith(".png")
-        ]
+        try:
+            if request.form.get("upload_id"):
+                # already streamed through the chunked /uploads API
+                upload = _own_upload(request.form["upload_id"])
+                ws, img_path, content_hash = upload.ws, upload.path, upload.finish()
+            else:
+                file = request.files["image"]
+                filename = secure_filename(file.filename)
+                ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+                filename = f"{session['user_id']}_{ts}_{filename}"
+                ws, img_path, content_hash = save_stream(file.stream, filename, session["user_id"])
+        except UploadError as e:
+            flash(f"Upload rejected: {e}", "error")
+            return redirect(url_for("prediction"))
 
         # -------- FIXED NUMERIC DATA --------
         data = {
@@ -189,31 +106,273 @@ def prediction():
             "nlr": float(request.form["nlr"])
         }
 
-        return render_template(
-            "prediction.html",
-            result=stage,
-            survival=survival,
-            explanation=advice,
-            AI_REC=ai_resp,
-            png_files=png_files,
-            volume=volume,
-            Shape=shape,
-            voxel_count=voxel_count,
-            voxel_spacing_mm=spacing,
-            middle_slice_index=mid_slice,
-            tumor_size_x=size_x,
-            tumor_size_y=size_y,
-            tumor_size_z=size_z,
-            tumor_max_diameter=max_diameter,
-            dice="Not applicable (no ground truth)",
-            data=data
-        )
+        # -------- QUEUE ANALYSIS --------
+        # the job is keyed by the upload's workspace: a resubmitted upload
+        # (double click, browser retry) goes to the job already queued for it
+        if jobs.get_job(ws.id) is not None:
+            return redirect(url_for("prediction_job", job_id=ws.id))
+        job_id = jobs.enqueue(session["user_id"], {
+            "user_id": session["user_id"],
+            "image_path": os.path.abspath(img_path),
+            "content_hash": content_hash,
+            "data": data,
+            "report": request.form["symptoms"],
+            # ?profile=1 samples this case's stacks into profile.folded
+            "profile": request.values.get("profile") in ("1", "true", "on")
+        }, job_id=ws.id)
+        return redirect(url_for("prediction_job", job_id=job_id))
 
     # GET request
     return render_template("prediction.html", png_files=png_files)
 
+
+def _own_upload(upload_id):
+    upload = Upload.load(secure_filename(upload_id))
+    if upload is None or upload.meta["user_id"] != session.get("user_id"):
+        abort(404)
+    return upload
+
+def _own_job(job_id):
+    job = jobs.get_job(job_id)
+    if job is None or job["user_id"] != session.get("user_id"):
+        abort(404)
+    return job
+
+# ---------- JOB PAGE ----------
+@app.route("/prediction/<job_id>")
+def prediction_job(job_id):
+    if "user_id" not in session:
+        return redirect(url_for("login"))
+
+    job = _own_job(job_id)
+    if job["status"] == "done":
+        return render_template("prediction.html", **job["result"])
+    if job["status"] == "failed":
+        flash("Inference failed. Check Analyzer.py logs.", "error")
+        return render_template("prediction.html", png_files=[])
+    return render_template("prediction.html", png_files=[], job_id=job_id, job_status=job["status"])
+
+# ---------- CHUNKED UPLOADS ----------
+@app.route("/uploads", methods=["POST"])
+def upload_create():
+    """Start a resumable upload: {"filename", "size"} → upload id + chunk size."""
+    if "user_id" not in session:
+        abort(401)
+    body = request.get_json(silent=True) or request.form
+    filename = secure_filename(body.get("filename", ""))
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    try:
+        upload = Upload.create(f"{session['user_id']}_{ts}_{filename}", int(body.get("size", 0)), session["user_id"])
+    except (UploadError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"upload_id": upload.id, "chunk_size": CHUNK_SIZE, "offset": 0}), 201
+
+@app.route("/uploads/<upload_id>", methods=["GET"])
+def upload_status(upload_id):
+    if "user_id" not in session:
+        abort(401)
+    upload = _own_upload(upload_id)
+    return jsonify({"offset": upload.offset, "total": upload.meta["total"], "complete": upload.complete})
+
+@app.route("/uploads/<upload_id>", methods=["PUT"])
+def upload_chunk(upload_id):
+    """Append one chunk; the body is streamed to disk as it arrives."""
+    if "user_id" not in session:
+        abort(401)
+    upload = _own_upload(upload_id)
+
+    # Content-Range: bytes <start>-<end>/<total>
+    start = 0
+    content_range = request.headers.get("Content-Range", "")
+    if content_range.startswith("bytes "):
+        start = int(content_range[6:].split("-", 1)[0])
+    try:
+        offset = upload.write_chunk(request.stream, start)
+    except UploadError as e:
+        return jsonify({"error": str(e), "offset": upload.offset if upload.ws.exists() else None}), 409
+    return jsonify({"offset": offset, "total": upload.meta["total"]})
+
+@app.route("/uploads/<upload_id>/complete", methods=["POST"])
+def upload_complete(upload_id):
+    if "user_id" not in session:
+        abort(401)
+    upload = _own_upload(upload_id)
+    try:
+        return jsonify({"upload_id": upload.id, "sha256": upload.finish()})
+    except UploadError as e:
+        return jsonify({"error": str(e)}), 400
+
+# ---------- HISTORY ----------
+@app.route("/history")
+def history():
+    if "user_id" not in session:
+        return redirect(url_for("login"))
+
+    # a missing or malformed cursor just shows the first page
+    before = None
+    before_id = request.args.get("before_id", type=int)
+    if request.args.get("before_ts") and before_id is not None:
+        before = (request.args["before_ts"], before_id)
+
+    rows, next_cursor = Prediction.page(session["user_id"], before=before)
+    return render_template("history.html", rows=rows, next_cursor=next_cursor)
+
+@app.route("/history/<int:prediction_id>")
+def history_case(prediction_id):
+    if "user_id" not in session:
+        return redirect(url_for("login"))
+
+    row = Prediction.get(session["user_id"], prediction_id)
+    if row is None or row["result"] is None:
+        abort(404)
+    return render_template("prediction.html", **row["result"])
+
+# ---------- SLICE VIEWER ----------
+@app.route("/cases/<case_id>/slice/<plane>/<int:index>.<fmt>")
+def case_slice(case_id, plane, index, fmt):
+    """
+    Any axial / coronal / sagittal slice of a stored case, rendered from
+    its pre-built slice store; `?layer=xai` shows an axial slice's
+    precomputed heatmap instead. Responses are immutable per case, so they
+    carry an ETag and a long private max-age.
+    """
+    from slice_store import SliceStore, PLANES   # OpenCV is only loaded once a slice is viewed
+
+    if "user_id" not in session:
+        abort(401)
+    layer = request.args.get("layer", "overlay")
+    if plane not in PLANES or fmt not in ("png", "webp") or layer not in ("overlay", "xai"):
+        abort(404)
+    if layer == "xai" and plane != "axial":
+        abort(404)
+    if not Prediction.owns_case(session["user_id"], case_id):
+        abort(404)
+
+    directory = case_dir(case_id)
+    if not SliceStore.exists(directory):
+        abort(404)
+
+    size = min(int(request.args.get("size", 384)), 1024)
+    etag = f"{case_id}-{plane}-{index}-{size}-{fmt}-{layer}"
+    if etag in request.if_none_match:
+        return Response(status=304, headers={"ETag": f'"{etag}"'})
+
+    try:
+        data = SliceStore(directory).render(plane, index, fmt, size, layer)
+    except (IndexError, FileNotFoundError):
+        abort(404)
+
+    resp = Response(data, mimetype=f"image/{fmt}")
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "private, max-age=604800, immutable"
+    return resp
+
+# ---------- JOB API ----------
+@app.route("/jobs/<job_id>/status")
+def job_status(job_id):
+    if "user_id" not in session:
+        abort(401)
+    job = _own_job(job_id)
+    return jsonify({
+        "id": job["id"],
+        "status": job["status"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"]
+    })
+
+@app.route("/jobs/<job_id>/result")
+def job_result(job_id):
+    if "user_id" not in session:
+        abort(401)
+    job = _own_job(job_id)
+    if job["status"] not in ("done", "failed"):
+        return jsonify({"id": job_id, "status": job["status"]}), 202
+    return jsonify({"id": job_id, "status": job["status"], "result": job["result"], "error": job["error"]})
+
+@app.route("/jobs/metrics")
+def job_metrics():
+    return jsonify(jobs.queue_metrics())
+
+@app.route("/jobs/<job_id>/profile")
+def job_profile(job_id):
+    if "user_id" not in session:
+        abort(401)
+    _own_job(job_id)
+    path = os.path.join(case_dir(job_id), telemetry.PROFILE_FILE)
+    if not os.path.exists(path):
+        abort(404)
+    return send_file(path, mimetype="text/plain", as_attachment=True,
+                     download_name=f"{job_id}.folded")
+
+@app.route("/metrics")
+def prometheus_metrics():
+    """Prometheus scrape endpoint: stage/request metrics plus queue and cache gauges."""
+    queue = jobs.queue_metrics()
+    cache = get_cache().stats()
+    gauges = {
+        "jobs_queue_depth": queue["queue_depth"],
+        "jobs_running": queue["running"],
+        "jobs_done": queue["done"],
+        "jobs_failed": queue["failed"],
+        "jobs_oldest_queued_age_seconds": queue["oldest_queued_age_s"],
+        "result_cache_hits": cache["hits"],
+        "result_cache_misses": cache["misses"],
+        "result_cache_evictions": cache["evictions"],
+        "result_cache_size_bytes": cache["size_bytes"]
+    }
+    return Response(telemetry.render_prometheus(gauges), mimetype="text/plain; version=0.0.4")
+
+@app.route("/cache/stats")
+def cache_stats():
+    return jsonify(get_cache().stats())
+
+# ---------- LAB BATCH SCORING ----------
+@app.route("/lab/batch", methods=["POST"])
+def lab_batch():
+    """
+    Upload a CSV with the lab FEATURES columns; the scored CSV is streamed
+    back chunk by chunk so large cohorts never sit in memory at once. Rows
+    with blank or non-numeric values are reported in its "error" column.
+    """
+    if "user_id" not in session:
+        abort(401)
+
+    import pandas as pd
+    from lab_prediction import FEATURES, predict_pancreas_stage_batch
+
+    file = request.files.get("file")
+    if file is None:
+        abort(400, "CSV file required")
+    chunksize = int(request.form.get("chunksize", 10000))
+
+    try:
+        reader = pd.read_csv(file.stream, chunksize=chunksize)
+        first = next(reader)
+    except (StopIteration, ValueError) as e:
+        abort(400, f"Could not read CSV: {e}")
+    missing = [c for c in FEATURES if c not in first.columns]
+    if missing:
+        abort(400, f"Missing columns: {', '.join(missing)}")
+
+    def generate():
+        header = True
+        for chunk in itertools.chain([first], reader):
+            buf = io.StringIO()
+            pd.concat([chunk, predict_pancreas_stage_batch(chunk)], axis=1) \
+                .to_csv(buf, header=header, index=False)
+            header = False
+            yield buf.getvalue()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/csv",
+        headers={"Content-Disposition": "attachment; filename=scored.csv"}
+    )
+
 # ================= MAIN =================
 if __name__ == "__main__":
-    os.makedirs(os.path.join(BASE_DIR, "static", "uploads"), exist_ok=True)
-    os.makedirs(os.path.join(BASE_DIR, "static", "output_case012"), exist_ok=True)
+    os.makedirs(WORKSPACE_ROOT, exist_ok=True)
+    os.makedirs(CASES_ROOT, exist_ok=True)
+    jobs.start_workers(int(os.getenv("JOB_WORKERS", jobs.DEFAULT_WORKERS)))
     app.run(debug=True, port=5000, use_reloader=False)
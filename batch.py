@@ -0,0 +1,257 @@
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+
+from jobs import THREADS_PER_JOB, DEFAULT_WORKERS, pin_threads
+
+VOLUME_SUFFIXES = (".nii.gz", ".nii", ".zip")
+RESULT_FILE = "result.json"
+ERROR_FILE = "error.json"
+
+
+# ================= CASE LIST =================
+def case_id_for(path):
+    name = os.path.basename(path)
+    for suffix in VOLUME_SUFFIXES:
+        if name.lower().endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def discover(input_dir):
+    """Every volume under `input_dir` (recursively), as a case list."""
+    cases = []
+    for root, _, files in os.walk(input_dir):
+        for name in sorted(files):
+            if name.lower().endswith(VOLUME_SUFFIXES):
+                path = os.path.join(root, name)
+                cases.append({"case_id": case_id_for(path), "path": os.path.abspath(path)})
+    return cases
+
+
+def read_manifest(path):
+    """
+    CSV with a `path` column (relative to the manifest) and optionally
+    `case_id` and the lab FEATURES columns.
+    """
+    import pandas as pd
+
+    df = pd.read_csv(path)
+    if "path" not in df.columns:
+        raise SystemExit(f"{path}: manifest needs a 'path' column")
+    base = os.path.dirname(os.path.abspath(path))
+    df["path"] = [os.path.normpath(os.path.join(base, p)) for p in df["path"]]
+    if "case_id" not in df.columns:
+        df["case_id"] = [case_id_for(p) for p in df["path"]]
+    df["case_id"] = df["case_id"].astype(str)
+    return df.to_dict("records")
+
+
+# ================= WORKERS =================
+def _init_worker(threads):
+    pin_threads(threads)
+
+
+def _write_json(path, obj):
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "w") as f:
+        json.dump(obj, f)
+    os.replace(tmp, path)
+
+
+def process_case(case_id, path, out_dir, use_cache=True):
+    """
+    Segmentation, metrics and rendering for one volume (Analyzer.run_analysis).
+    The row is written to `<out_dir>/result.json` last, so a case only
+    counts as done once everything else is on disk.
+    """
+    from Analyzer import run_analysis
+
+    os.makedirs(out_dir, exist_ok=True)
+    t0 = time.perf_counter()
+    try:
+        analysis = run_analysis(path, out_dir, use_cache=use_cache)
+    except Exception as e:
+        _write_json(os.path.join(out_dir, ERROR_FILE), {
+            "case_id": case_id, "path": path, "error": f"{type(e).__name__}: {e}",
+            "traceback": traceback.format_exc(limit=5)
+        })
+        return {"case_id": case_id, "status": "failed", "error": f"{type(e).__name__}: {e}"}
+
+    st = os.stat(path)
+    row = {
+        "case_id": case_id,
+        "path": path,
+        "source_size": st.st_size,
+        "source_mtime": st.st_mtime,
+        "status": "done",
+        "seconds": time.perf_counter() - t0,
+        **analysis.to_dict()
+    }
+    _write_json(os.path.join(out_dir, RESULT_FILE), row)
+    if os.path.exists(os.path.join(out_dir, ERROR_FILE)):
+        os.remove(os.path.join(out_dir, ERROR_FILE))
+    return row
+
+
+def load_done(out_dir, path):
+    """The stored row if this case already finished for the same source file."""
+    result_path = os.path.join(out_dir, RESULT_FILE)
+    if not os.path.exists(result_path):
+        return None
+    with open(result_path) as f:
+        row = json.load(f)
+    st = os.stat(path)
+    if row.get("path") != path or row.get("source_size") != st.st_size or row.get("source_mtime") != st.st_mtime:
+        return None
+    return row
+
+
+def run_batch(cases, out_root, workers=DEFAULT_WORKERS, threads=THREADS_PER_JOB, use_cache=True, force=False):
+    """
+    Process `cases` ({"case_id", "path"} dicts) on `workers` processes with
+    `threads` math threads each. Finished cases are skipped on a re-run
+    unless `force`; failed ones are retried. Cases whose source file does
+    not exist are reported as failed without being scheduled. Returns one
+    row per case.
+    """
+    rows, todo = {}, []
+    for case in cases:
+        if not os.path.isfile(case["path"]):
+            rows[case["case_id"]] = {"case_id": case["case_id"], "path": case["path"], "status": "failed",
+                                     "error": "missing source"}
+            continue
+        case_out = os.path.join(out_root, "cases", case["case_id"])
+        done = None if force else load_done(case_out, case["path"])
+        if done is not None:
+            rows[case["case_id"]] = done
+        else:
+            todo.append((case["case_id"], case["path"], case_out))
+
+    missing = sum(r.get("error") == "missing source" for r in rows.values())
+    print(f"{len(cases)} cases: {len(rows) - missing} already done, {missing} missing, {len(todo)} to run "
+          f"on {workers} workers x {threads} threads", file=sys.stderr)
+    # largest volumes first, so one big case does not finish the batch alone
+    todo.sort(key=lambda c: os.path.getsize(c[1]), reverse=True)
+
+    t0 = time.perf_counter()
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=ctx, initializer=_init_worker, initargs=(threads,)) as pool:
+        futures = {pool.submit(process_case, case_id, path, case_out, use_cache): case_id
+                   for case_id, path, case_out in todo}
+        try:
+            for i, future in enumerate(as_completed(futures), 1):
+                row = future.result()
+                rows[row["case_id"]] = row
+                elapsed = time.perf_counter() - t0
+                eta = elapsed / i * (len(todo) - i)
+                detail = f"{row['seconds']:.1f}s" if row["status"] == "done" else row["error"]
+                print(f"[{i}/{len(todo)}] {row['case_id']}: {row['status']} ({detail})  ETA {eta:.0f}s",
+                      file=sys.stderr)
+        except KeyboardInterrupt:
+            print("Interrupted; finished cases are kept, re-run to resume", file=sys.stderr)
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    for case_id, path, _ in todo:
+        rows.setdefault(case_id, {"case_id": case_id, "path": path, "status": "failed", "error": "not run"})
+    return [rows[c["case_id"]] for c in cases]
+
+
+# ================= RESULTS TABLE =================
+TABLE_COLUMNS = ["case_id", "path", "status", "error", "volume", "max_diameter", "size_x", "size_y", "size_z",
+                 "voxel_count", "lesion_count", "mid_slice", "shape", "spacing", "inference_seconds",
+                 "conversion_seconds", "cached", "seconds", "images", "prediction_path"]
+
+
+def results_table(rows, labs=None):
+    """
+    One row per case. Lab stage columns come from
+    lab_prediction.predict_pancreas_stage_batch on the cases' lab values.
+    """
+    import pandas as pd
+
+    df = pd.DataFrame(rows).reindex(columns=TABLE_COLUMNS)
+    for col in ("shape", "spacing", "images"):
+        df[col] = df[col].map(lambda v: json.dumps(v) if isinstance(v, (list, tuple)) else v)
+    df = df.rename(columns={"volume": "volume_mm3", "max_diameter": "max_diameter_mm"})
+
+    if labs is not None and len(labs):
+        from lab_prediction import FEATURES, predict_pancreas_stage_batch
+
+        labs = labs.drop_duplicates("case_id").set_index("case_id")
+        labs = labs.reindex(df["case_id"])[FEATURES]
+        have = labs.notna().all(axis=1).to_numpy()
+        lab_cols = labs.reset_index(drop=True)
+        df = pd.concat([df, lab_cols], axis=1)
+        if have.any():
+            scored = predict_pancreas_stage_batch(lab_cols[have])
+            scored.index = lab_cols.index[have]
+            df = df.join(scored)
+    return df
+
+
+def write_table(df, path):
+    if path.endswith(".parquet"):
+        try:
+            df.to_parquet(path, index=False)
+        except ImportError as e:
+            raise SystemExit(f"Parquet output needs pyarrow or fastparquet ({e}); use a .csv path instead")
+    else:
+        df.to_csv(path, index=False)
+    return path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the imaging + lab pipeline over a cohort of CT volumes")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input-dir", help="directory searched recursively for .nii/.nii.gz/.zip")
+    source.add_argument("--manifest", help="CSV with a path column (and optional case_id / lab columns)")
+    parser.add_argument("--labs", help="CSV with case_id and the lab feature columns")
+    parser.add_argument("--out", required=True, help="output directory (per-case outputs + results table)")
+    parser.add_argument("--table", help="results table path, .parquet or .csv (default: <out>/results.csv)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--threads", type=int, default=THREADS_PER_JOB, help="math threads per worker")
+    parser.add_argument("--no-cache", action="store_true", help="do not read or fill the result cache")
+    parser.add_argument("--force", action="store_true", help="re-run cases that already finished")
+    parser.add_argument("--segmentation-mode", choices=("full", "cascade"),
+                        help="whole-volume or cascaded inference (default: $SEGMENTATION_MODE or full)")
+    args = parser.parse_args()
+    if args.segmentation_mode:
+        # read by the spawned workers when they build their engine
+        os.environ["SEGMENTATION_MODE"] = args.segmentation_mode
+
+    import pandas as pd
+
+    cases = read_manifest(args.manifest) if args.manifest else discover(args.input_dir)
+    ids = [c["case_id"] for c in cases]
+    if len(set(ids)) != len(ids):
+        dupes = sorted({i for i in ids if ids.count(i) > 1})
+        raise SystemExit(f"Duplicate case ids: {', '.join(dupes[:10])}")
+
+    labs = pd.read_csv(args.labs, dtype={"case_id": str}) if args.labs else None
+    if labs is None and args.manifest:
+        from lab_prediction import FEATURES
+        manifest = pd.DataFrame(cases)
+        if all(f in manifest.columns for f in FEATURES):
+            labs = manifest[["case_id"] + FEATURES]
+
+    os.makedirs(args.out, exist_ok=True)
+    t0 = time.perf_counter()
+    try:
+        rows = run_batch(cases, os.path.abspath(args.out), args.workers, args.threads,
+                         use_cache=not args.no_cache, force=args.force)
+    except KeyboardInterrupt:
+        sys.exit(130)
+
+    table = write_table(results_table(rows, labs), args.table or os.path.join(args.out, "results.csv"))
+    failed = sum(r["status"] != "done" for r in rows)
+    print(f"{len(rows) - failed}/{len(rows)} cases done in {time.perf_counter() - t0:.1f}s → {table}",
+          file=sys.stderr)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,91 @@
+"""
+Cascaded (coarse pass + refined crop) vs. whole-volume nnU-Net inference:
+speed and agreement on a reference set.
+
+    python benchmarks/bench_cascade.py reference/*.nii.gz [--margin-mm 20] [-o cascade.json]
+
+Both modes share one loaded predictor and each case is warmed up first,
+so the timings are inference only. Agreement is the Dice of the cascaded
+label map against the whole-volume one (foreground and per label), plus
+the relative change in tumor volume. Needs the trained checkpoint.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import segmentation_engine
+from segmentation_engine import SegmentationEngine
+from tumor_metrics import dice
+
+
+def compare(full, cascade, path):
+    t0 = time.perf_counter()
+    ref = full.segment(path)
+    full_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    out = cascade.segment(path)
+    cascade_s = time.perf_counter() - t0
+
+    a, b = ref.label_map, out.label_map
+    labels = sorted((set(np.unique(a).tolist()) | set(np.unique(b).tolist())) - {0})
+    ref_voxels = int(np.count_nonzero(a))
+    roi_voxels = int(np.prod([stop - start for start, stop in out.roi])) if out.roi else a.size
+    return {
+        "case": os.path.basename(path),
+        "full_seconds": full_s,
+        "cascade_seconds": cascade_s,
+        "speedup": full_s / cascade_s,
+        "roi": out.roi,
+        "roi_fraction": roi_voxels / a.size,
+        "dice": dice(a, b),
+        "dice_per_label": {int(l): dice(a == l, b == l) for l in labels},
+        "volume_change": (np.count_nonzero(b) - ref_voxels) / ref_voxels if ref_voxels else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("volumes", nargs="+", help="reference NIfTI volumes")
+    parser.add_argument("--margin-mm", type=float, default=segmentation_engine.CASCADE_MARGIN_MM,
+                        help="padding around the coarse foreground")
+    parser.add_argument("-o", "--output", help="write the per-case rows and summary as JSON")
+    args = parser.parse_args()
+
+    segmentation_engine.CASCADE_MARGIN_MM = args.margin_mm
+    full = SegmentationEngine(mode="full")
+    cascade = SegmentationEngine(mode="cascade")
+    cascade.predictor = full.load()
+    full.segment(args.volumes[0])     # warm-up
+
+    print(f"{'case':>28} {'full s':>8} {'cascade s':>10} {'speedup':>8} {'ROI %':>6} {'Dice':>6} {'vol Δ %':>8}")
+    rows = []
+    for path in args.volumes:
+        r = compare(full, cascade, path)
+        rows.append(r)
+        print(f"{r['case']:>28} {r['full_seconds']:8.2f} {r['cascade_seconds']:10.2f} {r['speedup']:7.2f}x "
+              f"{100 * r['roi_fraction']:6.1f} {r['dice']:6.3f} {100 * r['volume_change']:8.2f}")
+
+    speedups = sorted(r["speedup"] for r in rows)
+    dices = [r["dice"] for r in rows]
+    summary = {
+        "cases": len(rows),
+        "margin_mm": args.margin_mm,
+        "median_speedup": speedups[len(speedups) // 2],
+        "mean_dice": float(np.mean(dices)),
+        "min_dice": float(np.min(dices)),
+    }
+    print(f"\nmedian speedup {summary['median_speedup']:.2f}x, "
+          f"Dice mean {summary['mean_dice']:.3f} / min {summary['min_dice']:.3f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"summary": summary, "cases": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
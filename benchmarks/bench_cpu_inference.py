@@ -0,0 +1,110 @@
+"""
+Latency and accuracy of the CPU inference configurations: backend
+(torch / TorchScript / ONNX Runtime), int8 quantization, TTA mirroring and
+tile step size.
+
+    python benchmarks/bench_cpu_inference.py reference/*.nii.gz [--configs onnx onnx-int8] [-o cpu.json]
+
+The first configuration ("torch": nnU-Net's defaults) is the reference;
+every other one reports its per-case latency and the Dice / tumor volume
+change of its label map against the reference. Each configuration is
+warmed up (model load and export) on the first case before timing. Needs
+the trained checkpoint; the onnx configurations also need onnx and
+onnxruntime.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jobs import INTEROP_THREADS, THREADS_PER_JOB, pin_threads
+
+CONFIGS = {
+    "torch": {},
+    "torch-tta-off": {"tta": "none"},
+    "torch-tta-x": {"tta": "2"},
+    "torch-step-0.75": {"tile_step_size": 0.75},
+    "torchscript": {"backend": "torchscript"},
+    "onnx": {"backend": "onnx"},
+    "onnx-int8": {"backend": "onnx", "quantize": True},
+    "onnx-int8-tta-off": {"backend": "onnx", "quantize": True, "tta": "none"},
+}
+
+
+def run_config(kwargs, volumes):
+    from segmentation_engine import SegmentationEngine
+
+    engine = SegmentationEngine(mode="full", **kwargs)
+    t0 = time.perf_counter()
+    engine.segment(volumes[0])
+    warmup = time.perf_counter() - t0
+
+    outputs = []
+    for path in volumes:
+        t0 = time.perf_counter()
+        result = engine.segment(path)
+        outputs.append((time.perf_counter() - t0, result.label_map))
+    return warmup, outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("volumes", nargs="+", help="reference NIfTI volumes")
+    parser.add_argument("--configs", nargs="+", choices=list(CONFIGS), default=list(CONFIGS),
+                        help="configurations to run (the reference always runs first)")
+    parser.add_argument("--threads", type=int, default=THREADS_PER_JOB, help="intra-op threads")
+    parser.add_argument("--interop-threads", type=int, default=INTEROP_THREADS)
+    parser.add_argument("-o", "--output", help="write every row as JSON")
+    args = parser.parse_args()
+
+    pin_threads(args.threads, args.interop_threads)
+    from tumor_metrics import dice
+
+    names = ["torch"] + [c for c in args.configs if c != "torch"]
+    reference, rows = None, []
+    print(f"{'config':>20} {'case':>24} {'seconds':>8} {'speedup':>8} {'Dice':>6} {'vol Δ %':>8}")
+    for name in names:
+        try:
+            warmup, outputs = run_config(CONFIGS[name], args.volumes)
+        except (ImportError, ValueError, RuntimeError) as e:
+            if reference is None:
+                raise SystemExit(f"reference configuration failed: {e}")
+            print(f"{name:>20}  skipped: {e}")
+            continue
+        if reference is None:
+            reference = outputs
+
+        for path, (seconds, label_map), (ref_seconds, ref_map) in zip(args.volumes, outputs, reference):
+            ref_voxels = np.count_nonzero(ref_map)
+            row = {
+                "config": name,
+                "case": os.path.basename(path),
+                "seconds": seconds,
+                "warmup_seconds": warmup,
+                "speedup": ref_seconds / seconds,
+                "dice": dice(ref_map, label_map),
+                "volume_change": (np.count_nonzero(label_map) - ref_voxels) / ref_voxels if ref_voxels else 0.0,
+            }
+            rows.append(row)
+            print(f"{name:>20} {row['case']:>24} {seconds:8.2f} {row['speedup']:7.2f}x "
+                  f"{row['dice']:6.3f} {100 * row['volume_change']:8.2f}")
+
+    print(f"\n{'config':>20} {'median s':>9} {'median speedup':>15} {'min Dice':>9}")
+    for name in names:
+        mine = [r for r in rows if r["config"] == name]
+        if mine:
+            print(f"{name:>20} {np.median([r['seconds'] for r in mine]):9.2f} "
+                  f"{np.median([r['speedup'] for r in mine]):14.2f}x {min(r['dice'] for r in mine):9.3f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"threads": args.threads, "interop_threads": args.interop_threads, "rows": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Login / signup throughput against the SQLite data-access layer.
+
+    python benchmarks/bench_db.py --threads 1 4 8 --seconds 5
+
+Runs against a throwaway database. Login = one username lookup; signup =
+User.register (two lookups + insert in one transaction). Each thread
+mixes `--signup-ratio` signups into its login traffic.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+tmp = tempfile.mkdtemp()
+os.environ["DATABASE_PATH"] = os.path.join(tmp, "bench.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import init_db, hash_password, close_connection
+from models import User
+
+
+def worker(tid, deadline, signup_ratio, counts, usernames):
+    rng = random.Random(tid)
+    pw = hash_password("secret")
+    logins = signups = 0
+    n = 0
+    while time.perf_counter() < deadline:
+        if rng.random() < signup_ratio:
+            n += 1
+            User.register(f"t{tid}_{n}", f"t{tid}_{n}@example.com", pw)
+            signups += 1
+        else:
+            user = User.get_by_username(rng.choice(usernames))
+            assert user is None or user["password"] == pw
+            logins += 1
+    close_connection()
+    counts[tid] = (logins, signups)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--signup-ratio", type=float, default=0.05)
+    args = parser.parse_args()
+
+    init_db()
+    usernames = [f"user{i}" for i in range(args.users)]
+    pw = hash_password("secret")
+    for u in usernames:
+        User.register(u, u + "@example.com", pw)
+
+    for n in args.threads:
+        counts = {}
+        deadline = time.perf_counter() + args.seconds
+        threads = [threading.Thread(target=worker, args=(i + 1000 * n, deadline, args.signup_ratio, counts, usernames))
+                   for i in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        logins = sum(c[0] for c in counts.values())
+        signups = sum(c[1] for c in counts.values())
+        print(f"{n:>3} threads: login {logins / args.seconds:10.0f} QPS   signup {signups / args.seconds:8.0f} QPS")
+
+
+if __name__ == "__main__":
+    main()
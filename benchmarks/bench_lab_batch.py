@@ -0,0 +1,59 @@
+"""
+Rows/sec of the per-row lab model path vs. the vectorized batch path.
+
+    python benchmarks/bench_lab_batch.py --rows 1000 10000 100000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lab_prediction import FEATURES, predict_pancreas_stage, predict_pancreas_stage_batch
+
+
+def synthetic_cohort(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "CA19_9": rng.uniform(0, 1500, n),
+        "Total_Bilirubin": rng.uniform(0.2, 15, n),
+        "ALP": rng.uniform(40, 900, n),
+        "Albumin": rng.uniform(2.0, 5.0, n),
+        "NLR": rng.uniform(1, 12, n),
+        "Age": rng.integers(30, 90, n)
+    }, columns=FEATURES)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--per-row-limit", type=int, default=2000,
+                        help="rows timed on the per-row path (it is extrapolated)")
+    args = parser.parse_args()
+
+    for n in args.rows:
+        df = synthetic_cohort(n)
+
+        sample = df.head(min(n, args.per_row_limit))
+        t0 = time.perf_counter()
+        single = [predict_pancreas_stage(**row) for row in sample.to_dict("records")]
+        per_row = len(sample) / (time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        batch = predict_pancreas_stage_batch(df)
+        batched = n / (time.perf_counter() - t0)
+
+        agree = all(
+            (s[0], s[1]) == (b.stage, b.survival)
+            for s, b in zip(single, batch.head(len(sample)).itertuples())
+        )
+        print(f"{n:>8} rows: per-row {per_row:10.0f} rows/s   batch {batched:12.0f} rows/s   "
+              f"speedup {batched / per_row:7.1f}x   parity {'ok' if agree else 'MISMATCH'}")
+
+
+if __name__ == "__main__":
+    main()
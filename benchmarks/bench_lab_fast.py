@@ -0,0 +1,113 @@
+"""
+Parity and per-call latency of the single-row lab model fast path.
+
+    python benchmarks/bench_lab_fast.py --rows 2000 --calls 20000
+
+Every synthetic row is scored by both `predict_pancreas_stage` and
+`lab_fast.predict_pancreas_stage_fast`; any disagreement is printed and
+makes the script exit non-zero. The same parity check is run for a few
+other model types (compiled linear ones and a one-vs-one linear SVC that
+has to fall back to sklearn), fitted on the synthetic rows.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lab_prediction import FEATURES, load_model, predict_pancreas_stage
+from lab_fast import FastLabModel
+
+
+def synthetic_rows(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        rng.uniform(0, 1500, n),
+        rng.uniform(0.2, 15, n),
+        rng.uniform(40, 900, n),
+        rng.uniform(2.0, 5.0, n),
+        rng.uniform(1, 12, n),
+        rng.integers(30, 90, n)
+    ])
+
+
+def alternative_models():
+    from sklearn.linear_model import LogisticRegression, RidgeClassifier, SGDClassifier
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.svm import SVC, LinearSVC
+
+    return {
+        "LogisticRegression": make_pipeline(StandardScaler(), LogisticRegression(max_iter=1000)),
+        "RidgeClassifier": make_pipeline(StandardScaler(), RidgeClassifier()),
+        "LinearSVC": make_pipeline(StandardScaler(), LinearSVC()),
+        "SGDClassifier": make_pipeline(StandardScaler(), SGDClassifier(random_state=0)),
+        "SVC(kernel=linear), one-vs-one": make_pipeline(StandardScaler(), SVC(kernel="linear")),
+    }
+
+
+def check_alternatives(rows):
+    """Parity of FastLabModel with sklearn for other estimator types; returns the mismatch count."""
+    import pandas as pd
+
+    _, encoder = load_model()
+    frame = pd.DataFrame(rows, columns=FEATURES)
+    frame["Age"] = frame["Age"].astype(int)
+    # every encoded class present: bin CA19_9 into as many quantiles as classes
+    n = len(encoder.classes_)
+    y = np.digitize(rows[:, 0], np.quantile(rows[:, 0], np.linspace(0, 1, n + 1)[1:-1]))
+    y = encoder.transform(encoder.classes_)[y]
+
+    mismatches = 0
+    for name, estimator in alternative_models().items():
+        estimator.fit(frame, y)
+        fast = FastLabModel(estimator, encoder)
+        expected = estimator.predict(frame).tolist()
+        got = [np.asarray(estimator.classes_)[fast.predict_index(r.tolist())] for r in frame.to_numpy(dtype=float)]
+        bad = sum(a != b for a, b in zip(expected, got))
+        mismatches += bad
+        print(f"{name:>32}  compiled: {fast.compiled!s:5}  parity: {len(rows) - bad}/{len(rows)}")
+    return mismatches
+
+
+def per_call_us(fn, rows, calls):
+    t0 = time.perf_counter()
+    for i in range(calls):
+        fn(rows[i % len(rows)])
+    return (time.perf_counter() - t0) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--calls", type=int, default=20000)
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.rows)
+    fast = FastLabModel()
+    print(f"model: {type(fast.estimator).__name__}  compiled: {fast.compiled}")
+
+    mismatches = 0
+    for r in rows:
+        ref = predict_pancreas_stage(*r[:5], int(r[5]))
+        got = fast.predict(r)
+        if ref != got:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"MISMATCH {r.tolist()}: {ref[:2]} != {got[:2]}")
+    print(f"parity: {args.rows - mismatches}/{args.rows} rows identical")
+    mismatches += check_alternatives(rows)
+
+    slow = per_call_us(lambda r: predict_pancreas_stage(*r[:5], int(r[5])), rows, min(args.calls, 2000))
+    quick = per_call_us(fast.predict, rows, args.calls)
+    print(f"predict_pancreas_stage: {slow:9.1f} us/call")
+    print(f"FastLabModel.predict:   {quick:9.1f} us/call   ({slow / quick:.0f}x)")
+
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Packed prediction masks (mask_codec) vs. NIfTI: file size, write time,
+full decode, one-slice decode and metrics.
+
+    python benchmarks/bench_mask_codec.py [--shape 512 512 120] [--repeat 5]
+    python benchmarks/bench_mask_codec.py --masks runs/*/prediction.nii.gz
+
+Without `--masks` one synthetic mask per tumor shape is used. For
+reference, the table also lists the size of the bounding box bit-packed
+with np.packbits.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import nibabel as nib
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mask_codec import PackedMask, foreground_bbox
+from synthetic import TUMOR_SHAPES, tumor_mask
+from tumor_metrics import compute_metrics
+
+
+def best(fn, repeat):
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - t0)
+    return min(runs)
+
+
+def compare(name, labels, spacing, tmp, repeat):
+    affine = np.diag(list(spacing) + [1.0])
+    nii_path = os.path.join(tmp, f"{name}.nii.gz")
+    packed_path = os.path.join(tmp, f"{name}.mask.npz")
+    z = int(np.argmax(np.count_nonzero(labels, axis=(0, 1))))
+
+    nii_write = best(lambda: nib.save(nib.Nifti1Image(labels, affine), nii_path), repeat)
+    pack_write = best(lambda: PackedMask.encode(labels, spacing, affine).save(packed_path), repeat)
+
+    nii_decode = best(lambda: np.asarray(nib.load(nii_path).dataobj), repeat)
+    pack_decode = best(lambda: PackedMask.load(packed_path).crop(), repeat)
+    nii_slice = best(lambda: np.asarray(nib.load(nii_path).dataobj[:, :, z]), repeat)
+    pack_slice = best(lambda: PackedMask.load(packed_path).axial(z), repeat)
+
+    nii_metrics = best(lambda: compute_metrics(np.asarray(nib.load(nii_path).dataobj), spacing), repeat)
+    pack_metrics = best(lambda: PackedMask.load(packed_path).metrics(), repeat)
+
+    packed = PackedMask.load(packed_path)
+    assert np.array_equal(packed.dense(), labels), name
+    assert packed.metrics() == compute_metrics(labels, spacing), name
+
+    bbox = foreground_bbox(labels)
+    bits = np.packbits(labels[tuple(slice(a, b) for a, b in bbox)] > 0).nbytes if bbox else 0
+    return {
+        "name": name,
+        "nii_bytes": os.path.getsize(nii_path), "packed_bytes": os.path.getsize(packed_path), "bitpacked_bytes": bits,
+        "nii_write": nii_write, "packed_write": pack_write,
+        "nii_decode": nii_decode, "packed_decode": pack_decode,
+        "nii_slice": nii_slice, "packed_slice": pack_slice,
+        "nii_metrics": nii_metrics, "packed_metrics": pack_metrics,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--masks", nargs="+", help="NIfTI label maps (default: synthetic)")
+    parser.add_argument("--shape", type=int, nargs=3, default=[512, 512, 120])
+    parser.add_argument("--spacing", type=float, nargs=3, default=[0.8, 0.8, 2.5])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.masks:
+        cases = []
+        for path in args.masks:
+            img = nib.load(path)
+            cases.append((os.path.basename(path), np.asarray(img.dataobj).astype(np.uint8),
+                          tuple(float(s) for s in img.header.get_zooms()[:3])))
+    else:
+        spacing = tuple(args.spacing)
+        cases = [(kind, tumor_mask(tuple(args.shape), spacing, kind).astype(np.uint8), spacing)
+                 for kind in TUMOR_SHAPES]
+
+    print(f"{'':>16} | {'size KB':^26} | {'ms, nii.gz / packed':^47}")
+    print(f"{'mask':>16} | {'nii.gz':>8} {'packed':>8} {'bits':>8} | "
+          f"{'write':>11} {'decode':>11} {'slice':>11} {'metrics':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, labels, spacing in cases:
+            r = compare(name, labels, spacing, tmp, args.repeat)
+            ms = lambda key: f"{1000 * r['nii_' + key]:.1f}/{1000 * r['packed_' + key]:.2f}"
+            print(f"{name[:16]:>16} | {r['nii_bytes'] / 1024:8.1f} {r['packed_bytes'] / 1024:8.1f} "
+                  f"{r['bitpacked_bytes'] / 1024:8.1f} | {ms('write'):>11} {ms('decode'):>11} "
+                  f"{ms('slice'):>11} {ms('metrics'):>11}")
+
+
+if __name__ == "__main__":
+    main()
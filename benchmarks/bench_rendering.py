@@ -0,0 +1,112 @@
+"""
+Rendering time of the three case images: legacy matplotlib vs. rendering.py.
+
+    python benchmarks/bench_rendering.py [--size 512] [--repeat 5] [--slices 8]
+
+"legacy" is the old Analyzer.py code (two matplotlib figures at dpi=200
+with bbox_inches="tight", skimage contours, OpenCV heatmap) writing to a
+temp directory. "rendering" composites the same views with NumPy/OpenCV
+into PNG buffers; "rendering x N" renders N slices of a slab sharing one
+intensity window.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rendering
+
+
+def synthetic_slice(size, seed=0):
+    rng = np.random.default_rng(seed)
+    y, x = np.ogrid[:size, :size]
+    body = ((x - size / 2) / (size * 0.42)) ** 2 + ((y - size / 2) / (size * 0.35)) ** 2 <= 1
+    ct = np.where(body, 40 + rng.normal(0, 20, (size, size)), -1000).astype(np.int16)
+    mask = (((x - size * 0.55) / 18) ** 2 + ((y - size * 0.5) / 12) ** 2 <= 1).astype(np.uint8)
+    return ct, mask
+
+
+def legacy_render(ct_slice, mask_z, output_dir):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import cv2
+    import skimage.measure
+    from scipy import ndimage
+
+    plt.figure(figsize=(6, 6))
+    plt.imshow(ct_slice, cmap="gray")
+    plt.imshow(np.ma.masked_where(mask_z == 0, mask_z), cmap="Reds", alpha=0.25)
+    for cnt in skimage.measure.find_contours(mask_z, 0.5):
+        plt.plot(cnt[:, 1], cnt[:, 0], color="red", linewidth=2)
+    plt.axis("off")
+    plt.savefig(os.path.join(output_dir, "overlay.png"), dpi=200, bbox_inches="tight")
+    plt.close()
+
+    plt.figure(figsize=(6, 6))
+    plt.imshow((mask_z * 255).astype(np.uint8), cmap="gray")
+    plt.axis("off")
+    plt.savefig(os.path.join(output_dir, "segmentation.png"), dpi=200, bbox_inches="tight")
+    plt.close()
+
+    dist = ndimage.distance_transform_edt(mask_z)
+    if dist.max() > 0:
+        dist = dist / dist.max()
+    ct_norm = ct_slice - ct_slice.min()
+    if ct_norm.max() > 0:
+        ct_norm = ct_norm / ct_norm.max()
+    ct_rgb = cv2.cvtColor((ct_norm * 255).astype(np.uint8), cv2.COLOR_GRAY2BGR)
+    heatmap = cv2.applyColorMap((dist * 255).astype(np.uint8), cv2.COLORMAP_JET)
+    cv2.imwrite(os.path.join(output_dir, "xai_overlay.png"), cv2.addWeighted(ct_rgb, 0.6, heatmap, 0.4, 0))
+
+
+def render_slab(ct_slab, mask_slab):
+    """render_slice over every slice of a (x, y, n) slab, one window for all."""
+    lo, hi = float(np.min(ct_slab)), float(np.max(ct_slab))
+    window = ((lo + hi) / 2, max(hi - lo, 1e-6))
+    return {
+        z: rendering.render_slice(ct_slab[:, :, z], mask_slab[:, :, z], window=window)
+        for z in range(ct_slab.shape[2])
+    }
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--slices", type=int, default=8)
+    args = parser.parse_args()
+
+    ct, mask = synthetic_slice(args.size)
+    out = tempfile.mkdtemp()
+
+    legacy = best_of(lambda: legacy_render(ct.astype(np.float64), mask, out), args.repeat)
+    new = best_of(lambda: rendering.save_images(rendering.render_slice(ct, mask), out), args.repeat)
+
+    slab = np.repeat(ct[:, :, None], args.slices, axis=2)
+    mslab = np.repeat(mask[:, :, None], args.slices, axis=2)
+    multi = best_of(lambda: render_slab(slab, mslab), args.repeat)
+    webp = best_of(lambda: rendering.render_slice(ct, mask, fmt="webp"), args.repeat)
+
+    print(f"legacy matplotlib         : {legacy * 1000:8.1f} ms / slice")
+    print(f"rendering (png)           : {new * 1000:8.1f} ms / slice  ({legacy / new:.1f}x)")
+    print(f"rendering (webp)          : {webp * 1000:8.1f} ms / slice")
+    print(f"rendering x {args.slices:<3} (png)     : {multi * 1000 / args.slices:8.1f} ms / slice")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Cold vs. warm latency of the in-process segmentation engine.
+
+    python benchmarks/bench_segmentation_engine.py case1.nii.gz [case2.nii.gz ...] --repeat 3
+
+The first call pays for importing nnU-Net and deserializing the checkpoint
+(cold); every following call reuses the loaded predictor (warm).
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from segmentation_engine import SegmentationEngine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("volumes", nargs="+", help="NIfTI volumes to segment")
+    parser.add_argument("--repeat", type=int, default=3, help="warm runs per volume")
+    args = parser.parse_args()
+
+    engine = SegmentationEngine()
+
+    t0 = time.perf_counter()
+    engine.segment(args.volumes[0])
+    cold = time.perf_counter() - t0
+    print(f"cold   {os.path.basename(args.volumes[0])}: {cold:.2f}s "
+          f"(checkpoint load {engine.load_seconds:.2f}s)")
+
+    for path in args.volumes:
+        runs = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            engine.segment(path)
+            runs.append(time.perf_counter() - t0)
+        runs.sort()
+        print(f"warm   {os.path.basename(path)}: "
+              f"min {runs[0]:.2f}s  median {runs[len(runs)//2]:.2f}s  max {runs[-1]:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
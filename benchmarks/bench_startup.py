@@ -0,0 +1,113 @@
+"""
+Import / boot time and memory of the web app and the job workers, and
+how much memory forked workers share after a preload.
+
+    python benchmarks/bench_startup.py [--children 4]
+
+Each measurement runs in a fresh interpreter. "preload + fork" loads the
+libraries and lab model in a parent, forks `--children` processes that
+touch the model, and reads their Shared / Private memory from
+/proc/<pid>/smaps_rollup (Linux only).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PRELUDE = f'''
+import json, os, resource, sys, time
+sys.path.insert(0, {ROOT!r})
+os.chdir({ROOT!r})
+def rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+t0 = time.perf_counter()
+'''
+
+CASES = {
+    "import app": "import app",
+    "import pipeline (first case)": "import pipeline",
+    "lab model load": "import lab_prediction; lab_prediction.load_model()",
+    "worker boot (jobs + pin_threads)": "import jobs\ntry:\n    jobs.pin_threads(4)\nexcept ImportError:\n    pass",
+    "preload()": "import startup; startup.preload(engine=False)",
+}
+
+FORK = PRELUDE + r'''
+import startup
+startup.preload(engine={engine})
+parent_s = time.perf_counter() - t0
+
+def smaps(pid):
+    out = {{}}
+    with open(f"/proc/{{pid}}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Shared_Clean:", "Shared_Dirty:", "Private_Clean:", "Private_Dirty:"):
+                out[parts[0][:-1]] = int(parts[1]) / 1024
+    return out
+
+children = []
+for _ in range({n}):
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(r)
+        import lab_fast
+        try:
+            lab_fast.predict_pancreas_stage_fast([100, 1, 100, 4, 3, 60])
+        except OSError:
+            pass
+        os.write(w, b"x")
+        time.sleep(2)
+        os._exit(0)
+    os.close(w)
+    os.read(r, 1)
+    children.append(pid)
+
+stats = [smaps(pid) for pid in children]
+for pid in children:
+    os.waitpid(pid, 0)
+print(json.dumps({{"parent_seconds": parent_s, "children": stats}}))
+'''
+
+
+def run(code):
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if out.returncode != 0:
+        return {"error": out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "failed"}
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--children", type=int, default=4)
+    parser.add_argument("--engine", action="store_true", help="also preload nnU-Net (needs the checkpoint)")
+    args = parser.parse_args()
+
+    print(f"{'step':>34} {'seconds':>8} {'peak RSS MB':>12}")
+    for label, body in CASES.items():
+        code = PRELUDE + body + "\nprint(json.dumps({'seconds': time.perf_counter() - t0, 'rss': rss_mb()}))"
+        r = run(code)
+        if "error" in r:
+            print(f"{label:>34}  {r['error']}")
+        else:
+            print(f"{label:>34} {r['seconds']:8.3f} {r['rss']:12.0f}")
+
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        return
+    r = run(FORK.format(n=args.children, engine=args.engine))
+    if "error" in r:
+        print(f"preload + fork: {r['error']}")
+        return
+    print(f"\npreload + fork: parent ready in {r['parent_seconds']:.2f}s")
+    print(f"{'child':>6} {'RSS MB':>8} {'shared MB':>10} {'private MB':>11}")
+    for i, c in enumerate(r["children"]):
+        shared = c.get("Shared_Clean", 0) + c.get("Shared_Dirty", 0)
+        private = c.get("Private_Clean", 0) + c.get("Private_Dirty", 0)
+        print(f"{i:>6} {c.get('Rss', 0):8.0f} {shared:10.0f} {private:11.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Time and peak memory of the tumor metrics on synthetic 512x512xN label maps.
+
+    python benchmarks/bench_tumor_metrics.py --slices 100 200 400
+
+"legacy" reproduces the old Analyzer.py path: a float64 copy of the
+prediction (get_fdata), a uint8 mask, np.where over the whole volume and
+a second full pass for the best slice. "tumor_metrics" is the single-pass
+integer implementation, including connected components and Feret diameter.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tumor_metrics import compute_metrics
+
+
+def synthetic_labels(n_slices, size=512, seed=0):
+    rng = np.random.default_rng(seed)
+    labels = np.zeros((size, size, n_slices), dtype=np.uint8)
+    x, y, z = np.ogrid[:size, :size, :n_slices]
+    for _ in range(3):
+        c = rng.uniform([size * 0.3, size * 0.3, n_slices * 0.3], [size * 0.7, size * 0.7, n_slices * 0.7])
+        r = rng.uniform(8, 25, size=3)
+        labels[((x - c[0]) / r[0]) ** 2 + ((y - c[1]) / r[1]) ** 2 + ((z - c[2]) / r[2]) ** 2 <= 1] = 1
+    return labels
+
+
+def legacy_metrics(labels, spacing):
+    pred = labels.astype(np.float64)
+    mask = (pred > 0).astype(np.uint8)
+    voxel_count = int(mask.sum())
+    coords = np.where(mask > 0)
+    sizes = [(c.max() - c.min() + 1) * s for c, s in zip(coords, spacing)]
+    tumor_slices = np.where(mask.sum(axis=(0, 1)) > 0)[0]
+    z = int(tumor_slices[len(tumor_slices) // 2])
+    return voxel_count, max(sizes), z
+
+
+def measure(fn, *args, repeat=3):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - t0)
+
+    tracemalloc.start()
+    fn(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(times), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--slices", type=int, nargs="+", default=[100, 200, 400])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    spacing = (0.8, 0.8, 2.5)
+    print(f"{'volume':>16} {'impl':>14} {'time (s)':>9} {'peak MB':>8}")
+    for n in args.slices:
+        labels = synthetic_labels(n)
+        for name, fn in (("legacy", legacy_metrics), ("tumor_metrics", compute_metrics)):
+            t, peak = measure(fn, labels, spacing, repeat=args.repeat)
+            print(f"{'512x512x%d' % n:>16} {name:>14} {t:9.3f} {peak / 2**20:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Peak RSS and latency of reading one axial slice from a NIfTI volume.
+
+    python benchmarks/bench_volume_io.py ct.nii.gz [--slice 120]
+
+Each strategy runs in a fresh subprocess so its peak RSS is isolated:
+"get_fdata" is the old full float64 load, "volume_io" the lazy proxy
+(the first .nii.gz access includes the one-off decompression, the second
+reuses it).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r'''
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+path, z, mode = {path!r}, {z}, {mode!r}
+t0 = time.perf_counter()
+if mode == "get_fdata":
+    import nibabel as nib
+    ct = nib.load(path).get_fdata()
+    zz = ct.shape[2] // 2 if z < 0 else z
+    s = ct[:, :, zz]
+else:
+    from volume_io import open_volume
+    ct = open_volume(path)
+    zz = ct.shape[2] // 2 if z < 0 else z
+    s = ct.axial(zz)
+dt = time.perf_counter() - t0
+print(json.dumps({{"seconds": dt, "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, "dtype": str(s.dtype)}}))
+'''
+
+
+def run(path, z, mode):
+    out = subprocess.check_output([sys.executable, "-c", CHILD.format(root=ROOT, path=path, z=z, mode=mode)])
+    return json.loads(out.decode().strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("volume")
+    parser.add_argument("--slice", type=int, default=-1, help="axial index (default: middle)")
+    args = parser.parse_args()
+
+    path = os.path.abspath(args.volume)
+    for label, mode in (("get_fdata", "get_fdata"), ("volume_io (first)", "lazy"), ("volume_io (warm)", "lazy")):
+        r = run(path, args.slice, mode)
+        print(f"{label:>18}: {r['seconds']:.3f}s  peak RSS {r['peak_rss_mb']:.0f} MB  slice dtype {r['dtype']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+XAI heatmaps: one spacing-aware 3D EDT over the tumor's bounding box
+(xai.Heatmaps) vs. a 2D EDT per tumor slice and a 3D EDT of the full
+volume.
+
+    python benchmarks/bench_xai.py [--shape 512 512 120] [--spacing 0.8 0.8 2.5] [--repeat 3]
+
+"per slice" is what producing every tumor slice's heatmap cost before:
+one full-size 2D transform each, ignoring the spacing. "lookup" is
+serving one slice from the computed heatmaps.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from scipy import ndimage
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rendering import heatmap_weights
+from synthetic import TUMOR_SHAPES, tumor_mask
+from xai import Heatmaps
+
+
+def best(fn, repeat):
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - t0)
+    return min(runs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--shape", type=int, nargs=3, default=[512, 512, 120])
+    parser.add_argument("--spacing", type=float, nargs=3, default=[0.8, 0.8, 2.5])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--full-volume", action="store_true", help="also time a 3D EDT of the whole volume (slow)")
+    args = parser.parse_args()
+
+    spacing = tuple(args.spacing)
+    print(f"{'tumor':>12} {'slices':>7} {'per slice ms':>13} {'full 3D ms':>11} {'box 3D ms':>10} "
+          f"{'lookup ms':>10} {'speedup':>8}")
+    for kind in TUMOR_SHAPES:
+        if kind == "none":
+            continue
+        labels = tumor_mask(tuple(args.shape), spacing, kind).astype(np.uint8)
+        zs = np.flatnonzero(labels.any(axis=(0, 1)))
+
+        per_slice = best(lambda: [heatmap_weights(labels[:, :, z]) for z in zs], args.repeat)
+        full = (best(lambda: ndimage.distance_transform_edt(labels, sampling=spacing), 1)
+                if args.full_volume else float("nan"))
+        box = best(lambda: Heatmaps.compute(labels, spacing), args.repeat)
+        heatmaps = Heatmaps.compute(labels, spacing)
+        z = int(zs[len(zs) // 2])
+        lookup = best(lambda: heatmaps.axial(z), args.repeat * 10)
+
+        print(f"{kind:>12} {len(zs):7d} {1000 * per_slice:13.1f} {1000 * full:11.1f} {1000 * box:10.1f} "
+              f"{1000 * lookup:10.2f} {per_slice / box:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+Benchmark suite: every pipeline stage in isolation plus an end-to-end
+run with a stub segmenter, reported as JSON percentiles.
+
+    python benchmarks/suite.py --shape 512 512 120 --repeat 20 -o bench.json
+    python benchmarks/suite.py --stages metrics rendering --compare bench.json
+
+Stages: volume_load, volume_decompress, metrics, rendering, slice_store,
+mask_pack, lab_model, lab_model_fast, db_login, db_save, db_history, e2e. Stages
+whose dependencies are missing (e.g. no lab model file) are reported as
+skipped. `--compare` prints the p50 ratio per stage against an earlier
+report and exits non-zero if any stage is slower than `--threshold`.
+Everything runs against temporary files and databases.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+tmp = tempfile.mkdtemp(prefix="bench-suite-")
+os.environ["DATABASE_PATH"] = os.path.join(tmp, "bench.db")
+os.environ.setdefault("SUMMARY_BACKEND", "stub")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+from synthetic import write_case, StubEngine, TUMOR_SHAPES
+
+STAGES = ("volume_load", "volume_decompress", "metrics", "rendering", "slice_store",
+          "mask_pack", "lab_model", "lab_model_fast", "db_login", "db_save", "db_history", "e2e")
+PERCENTILES = (50, 90, 95, 99)
+
+LAB_ROW = [120.0, 1.2, 140.0, 3.8, 3.5, 64]
+FORM = {"ca19_9": 120.0, "total_bilirubin": 1.2, "alp": 140.0, "albumin": 3.8, "nlr": 3.5, "age": 64}
+REPORT = "Ill-defined hypodense mass in the pancreatic head with upstream ductal dilatation."
+
+
+class Skip(Exception):
+    pass
+
+
+def summarize(samples):
+    a = np.asarray(samples)
+    stats = {"n": len(a), "min": float(a.min()), "mean": float(a.mean()), "max": float(a.max())}
+    stats.update({f"p{p}": float(np.percentile(a, p)) for p in PERCENTILES})
+    return stats
+
+
+def timed(fn, repeat, warmup, setup=None):
+    samples = []
+    for i in range(warmup + repeat):
+        arg = setup() if setup else None
+        t0 = time.perf_counter()
+        fn(arg) if setup else fn()
+        if i >= warmup:
+            samples.append(time.perf_counter() - t0)
+    return samples
+
+
+# ================= STAGES =================
+class Suite:
+    def __init__(self, args):
+        self.args = args
+        self.nii_gz = os.path.join(tmp, "case.nii.gz")
+        self.labels = write_case(self.nii_gz, tuple(args.shape), tuple(args.spacing), args.tumor,
+                                 args.radius_mm, args.seed)
+        self.spacing = tuple(args.spacing)
+
+    def run(self, name):
+        return getattr(self, name)()
+
+    def _time(self, fn, setup=None, repeat=None):
+        return timed(fn, repeat or self.args.repeat, self.args.warmup, setup)
+
+    def volume_load(self):
+        from volume_io import open_volume
+        open_volume(self.nii_gz).axial(0)      # decompress once, as a worker would
+        z = self.args.shape[2] // 2
+        return self._time(lambda: open_volume(self.nii_gz).axial(z))
+
+    def volume_decompress(self):
+        from volume_io import open_volume
+
+        def setup():
+            raw = self.nii_gz[:-3]
+            if os.path.exists(raw):
+                os.remove(raw)
+        return self._time(lambda _: open_volume(self.nii_gz).axial(0), setup=setup,
+                          repeat=max(1, self.args.repeat // 4))
+
+    def metrics(self):
+        from tumor_metrics import compute_metrics
+        return self._time(lambda: compute_metrics(self.labels, self.spacing))
+
+    def rendering(self):
+        from volume_io import open_volume
+        from tumor_metrics import compute_metrics
+        from rendering import render_slice
+        z = compute_metrics(self.labels, self.spacing)["mid_slice"]
+        ct_slice, mask = open_volume(self.nii_gz).axial(z), self.labels[:, :, z]
+        return self._time(lambda: render_slice(ct_slice, mask))
+
+    def slice_store(self):
+        from volume_io import open_volume
+        from slice_store import write_store
+        out = os.path.join(tmp, "store")
+        os.makedirs(out, exist_ok=True)
+        ct = open_volume(self.nii_gz)
+        return self._time(lambda: write_store(ct, out))
+
+    def mask_pack(self):
+        from mask_codec import PackedMask
+        path = os.path.join(tmp, "prediction.mask.npz")
+        return self._time(lambda: PackedMask.encode(self.labels, self.spacing).save(path))
+
+    def lab_model(self):
+        try:
+            from lab_prediction import predict_pancreas_stage, load_model
+            load_model()
+        except (OSError, ImportError) as e:
+            raise Skip(f"lab model unavailable: {e}")
+        return self._time(lambda: predict_pancreas_stage(*LAB_ROW[:5], LAB_ROW[5]), repeat=self.args.repeat * 10)
+
+    def lab_model_fast(self):
+        try:
+            from lab_fast import predict_pancreas_stage_fast
+            from lab_prediction import load_model
+            load_model()
+        except (OSError, ImportError) as e:
+            raise Skip(f"lab model unavailable: {e}")
+        return self._time(lambda: predict_pancreas_stage_fast(LAB_ROW), repeat=self.args.repeat * 10)
+
+    def _db(self):
+        from database import init_db, hash_password
+        from models import User
+        init_db()
+        if not hasattr(self, "user_id"):
+            self.user_id, _ = User.register("bench", "bench@example.com", hash_password("secret"))
+        return self.user_id
+
+    def _fake_result(self):
+        return {
+            "data": FORM, "report": REPORT, "result": "Stage 2", "explanation": "", "survival": "1 year",
+            "AI_REC": "<div></div>", "png_files": ["/static/cases/x/overlay.png"],
+            "analysis": {"volume": 12000.0, "max_diameter": 31.0, "lesion_count": 1, "prediction_path": None}
+        }
+
+    def db_login(self):
+        from models import User
+        self._db()
+        return self._time(lambda: User.get_by_username("bench"), repeat=self.args.repeat * 10)
+
+    def db_save(self):
+        from models import Prediction
+        user_id = self._db()
+        result = self._fake_result()
+        return self._time(lambda: Prediction.save_analysis(user_id, "job", "case.nii.gz", result))
+
+    def db_history(self):
+        from models import Prediction
+        user_id = self._db()
+        result = self._fake_result()
+        for _ in range(500):
+            Prediction.save_analysis(user_id, "job", "case.nii.gz", result)
+        return self._time(lambda: Prediction.page(user_id, limit=20), repeat=self.args.repeat * 10)
+
+    def e2e(self):
+        try:
+            from lab_prediction import load_model
+            load_model()    # the pipeline needs the lab model
+        except (OSError, ImportError) as e:
+            raise Skip(f"lab model unavailable: {e}")
+        import summarizer
+        from pipeline import run_prediction
+
+        summarizer._summarizer = summarizer.Summarizer(
+            summarizer.StubBackend(self.args.summary_latency), cache=False
+        )
+        engine = StubEngine(self.args.stub_latency)
+
+        def setup():
+            out = os.path.join(tmp, "e2e")
+            shutil.rmtree(out, ignore_errors=True)
+            return out
+
+        return self._time(
+            lambda out: run_prediction(self.nii_gz, out, FORM, REPORT, engine=engine, use_cache=False),
+            setup=setup, repeat=max(1, self.args.repeat // 4)
+        )
+
+
+# ================= REPORT =================
+def environment():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                         stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count()
+    }
+
+
+def compare(report, baseline_path, threshold):
+    with open(baseline_path) as f:
+        baseline = json.load(f)["stages"]
+    regressions = []
+    print(f"{'stage':>18} {'base p50':>10} {'now p50':>10} {'ratio':>7}", file=sys.stderr)
+    for name, stats in report["stages"].items():
+        old = baseline.get(name)
+        if "p50" not in stats or not old or "p50" not in old:
+            continue
+        ratio = stats["p50"] / old["p50"] if old["p50"] else float("inf")
+        flag = "  SLOWER" if ratio > threshold else ""
+        print(f"{name:>18} {old['p50'] * 1000:9.2f}ms {stats['p50'] * 1000:9.2f}ms {ratio:7.2f}{flag}",
+              file=sys.stderr)
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--shape", type=int, nargs=3, default=[512, 512, 120])
+    parser.add_argument("--spacing", type=float, nargs=3, default=[0.8, 0.8, 2.5])
+    parser.add_argument("--tumor", choices=TUMOR_SHAPES, default="lobulated")
+    parser.add_argument("--radius-mm", type=float, default=18.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--stub-latency", type=float, default=0.0, help="seconds the stub segmenter sleeps")
+    parser.add_argument("--summary-latency", type=float, default=0.0, help="seconds the stub summarizer sleeps")
+    parser.add_argument("-o", "--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", help="earlier JSON report to compare p50s against")
+    parser.add_argument("--threshold", type=float, default=1.2, help="p50 ratio counted as a regression")
+    args = parser.parse_args()
+
+    try:
+        suite = Suite(args)
+        report = {
+            "env": environment(),
+            "config": {k: getattr(args, k) for k in ("shape", "spacing", "tumor", "radius_mm", "seed",
+                                                      "repeat", "warmup", "stub_latency", "summary_latency")},
+            "stages": {}
+        }
+        for name in args.stages:
+            print(f"running {name}...", file=sys.stderr)
+            try:
+                # keep stdout clean for the JSON report
+                with contextlib.redirect_stdout(sys.stderr):
+                    report["stages"][name] = summarize(suite.run(name))
+            except Skip as e:
+                report["stages"][name] = {"skipped": str(e)}
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare and compare(report, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Synthetic CT cases for the benchmarks, and a deterministic stand-in for
+nnU-Net so the whole pipeline can be timed on a CPU-only box.
+
+    python benchmarks/synthetic.py case.nii.gz --shape 512 512 120 --spacing 0.8 0.8 2.5 --tumor lobulated
+
+The CT is int16 HU-like noise inside an elliptical body outline. Tumor
+voxels are given a distinct intensity band so `StubEngine` recovers the
+exact ground-truth mask by thresholding.
+"""
+import argparse
+import os
+import sys
+import time
+
+import nibabel as nib
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from segmentation_engine import SegmentationResult
+
+TUMOR_SHAPES = ("ellipsoid", "lobulated", "multifocal", "none")
+TUMOR_HU = (700, 900)       # outside anything the background noise reaches
+BODY_HU = (-100, 300)
+AIR_HU = -1000
+
+
+def tumor_mask(shape, spacing, kind="ellipsoid", radius_mm=18.0, seed=0):
+    """Boolean (x, y, z) mask of a tumor of physical size ~`radius_mm`."""
+    rng = np.random.default_rng(seed)
+    nx, ny, nz = shape
+    x, y, z = np.ogrid[:nx, :ny, :nz]
+    mask = np.zeros(shape, dtype=bool)
+    if kind == "none":
+        return mask
+
+    def blob(center, radii_mm):
+        r = np.asarray(radii_mm) / np.asarray(spacing)
+        return ((x - center[0]) / r[0]) ** 2 + ((y - center[1]) / r[1]) ** 2 + ((z - center[2]) / r[2]) ** 2 <= 1
+
+    center = np.array([nx * 0.55, ny * 0.45, nz * 0.5])
+    if kind == "ellipsoid":
+        mask |= blob(center, [radius_mm, radius_mm * 0.8, radius_mm * 0.7])
+    elif kind == "lobulated":
+        for _ in range(6):
+            offset = rng.normal(0, radius_mm * 0.35, 3) / np.asarray(spacing)
+            mask |= blob(center + offset, rng.uniform(0.4, 0.7, 3) * radius_mm)
+    elif kind == "multifocal":
+        for _ in range(3):
+            c = rng.uniform([nx * 0.3, ny * 0.3, nz * 0.25], [nx * 0.7, ny * 0.7, nz * 0.75])
+            mask |= blob(c, rng.uniform(0.3, 0.6, 3) * radius_mm)
+    else:
+        raise ValueError(f"Unknown tumor shape {kind!r}; expected one of {TUMOR_SHAPES}")
+    return mask
+
+
+def synthetic_ct(shape, spacing, kind="ellipsoid", radius_mm=18.0, seed=0):
+    """(ct int16, ground-truth uint8 label map), both (x, y, z)."""
+    rng = np.random.default_rng(seed)
+    nx, ny = shape[:2]
+    x, y = np.ogrid[:nx, :ny]
+    body = ((x - nx / 2) / (nx * 0.42)) ** 2 + ((y - ny / 2) / (ny * 0.32)) ** 2 <= 1
+
+    ct = np.full(shape, AIR_HU, dtype=np.int16)
+    noise = rng.integers(BODY_HU[0], BODY_HU[1], size=shape, dtype=np.int16)
+    ct[body] = noise[body]
+
+    labels = tumor_mask(shape, spacing, kind, radius_mm, seed).astype(np.uint8)
+    ct[labels > 0] = rng.integers(*TUMOR_HU, size=int(labels.sum()), dtype=np.int16)
+    return ct, labels
+
+
+def write_case(path, shape=(512, 512, 120), spacing=(0.8, 0.8, 2.5), kind="ellipsoid", radius_mm=18.0, seed=0):
+    """Write the CT to `path` (.nii or .nii.gz); returns the ground-truth labels."""
+    ct, labels = synthetic_ct(shape, spacing, kind, radius_mm, seed)
+    img = nib.Nifti1Image(ct, np.diag(list(spacing) + [1.0]))
+    img.header.set_zooms(spacing)
+    nib.save(img, path)
+    return labels
+
+
+class StubEngine:
+    """
+    Drop-in for SegmentationEngine: thresholds the synthetic tumor band
+    instead of running nnU-Net, after an optional fixed `latency`.
+    """
+
+    checkpoint = None
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def load(self):
+        return self
+
+    @property
+    def is_loaded(self):
+        return True
+
+    def _segment(self, ct, spacing, affine, output_path):
+        t0 = time.perf_counter()
+        if self.latency:
+            time.sleep(self.latency)
+        label_map = ((ct >= TUMOR_HU[0]) & (ct < TUMOR_HU[1])).astype(np.uint8)
+        if output_path is not None:
+            nib.save(nib.Nifti1Image(label_map, affine), output_path)
+        return SegmentationResult(label_map, tuple(float(s) for s in spacing), {"spacing": list(spacing[::-1])},
+                                  time.perf_counter() - t0)
+
+    def segment(self, volume_path, output_path=None):
+        img = nib.load(volume_path)
+        return self._segment(np.asarray(img.dataobj), img.header.get_zooms()[:3], img.affine, output_path)
+
+    def segment_array(self, volume, spacing, affine, output_path=None):
+        return self._segment(np.asarray(volume), spacing, affine, output_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic CT volume")
+    parser.add_argument("output", help=".nii or .nii.gz")
+    parser.add_argument("--shape", type=int, nargs=3, default=[512, 512, 120])
+    parser.add_argument("--spacing", type=float, nargs=3, default=[0.8, 0.8, 2.5])
+    parser.add_argument("--tumor", choices=TUMOR_SHAPES, default="ellipsoid")
+    parser.add_argument("--radius-mm", type=float, default=18.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    labels = write_case(args.output, tuple(args.shape), tuple(args.spacing), args.tumor, args.radius_mm, args.seed)
+    print(f"{args.output}: {tuple(args.shape)} @ {tuple(args.spacing)} mm, {int(labels.sum())} tumor voxels")
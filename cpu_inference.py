@@ -0,0 +1,144 @@
+"""
+CPU execution of the nnU-Net network: the trained PyTorch module
+exported once to TorchScript or ONNX Runtime (optionally int8), and
+swapped into the predictor so nnU-Net's own preprocessing, sliding
+window, mirroring and export keep working unchanged.
+
+Exports are cached under EXPORT_DIR, keyed by the checkpoint content,
+patch size and backend, and rebuilt automatically when those change.
+"""
+import os
+
+import torch
+
+from result_cache import checkpoint_id
+from segmentation_engine import BACKENDS
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EXPORT_DIR = os.getenv("INFERENCE_EXPORT_DIR", os.path.join(BASE_DIR, "exported"))
+ONNX_OPSET = 17
+
+
+class _ExportedNetwork(torch.nn.Module):
+    """
+    Weights are baked into the exported graph. nnU-Net reloads the fold's
+    state dict before every prediction, so that becomes a no-op here.
+    """
+
+    def load_state_dict(self, state_dict, strict=True, assign=False):
+        return None
+
+
+class TorchScriptNetwork(_ExportedNetwork):
+    def __init__(self, path):
+        super().__init__()
+        module = torch.jit.load(path, map_location="cpu")
+        # conv + bias/norm folding and oneDNN layouts for CPU
+        self.module = torch.jit.optimize_for_inference(module)
+
+    def forward(self, x):
+        return self.module(x)
+
+
+class OnnxNetwork(_ExportedNetwork):
+    def __init__(self, path):
+        super().__init__()
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        # same budget as torch in this worker (see jobs.pin_threads)
+        options.intra_op_num_threads = torch.get_num_threads()
+        options.inter_op_num_threads = torch.get_num_interop_threads()
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def forward(self, x):
+        out = self.session.run(None, {self.input_name: x.detach().cpu().numpy()})[0]
+        return torch.from_numpy(out)
+
+
+def export_path(checkpoint, patch_size, backend, quantize=False):
+    name = "-".join([checkpoint_id(checkpoint)[:16], "x".join(str(int(p)) for p in patch_size), backend])
+    if quantize:
+        name += "-int8"
+    return os.path.join(EXPORT_DIR, name + (".onnx" if backend == "onnx" else ".pt"))
+
+
+def _trained_network(predictor):
+    network = predictor.network
+    network = getattr(network, "_orig_mod", network)   # torch.compile wrapper
+    network.load_state_dict(predictor.list_of_parameters[0])
+    return network.eval()
+
+
+def _example_input(predictor):
+    channels = len(predictor.dataset_json["channel_names"])
+    return torch.zeros((1, channels, *predictor.configuration_manager.patch_size), dtype=torch.float32)
+
+
+def export_torchscript(network, example, path):
+    with torch.no_grad():
+        traced = torch.jit.freeze(torch.jit.trace(network, example))
+    torch.jit.save(traced, path)
+
+
+def export_onnx(network, example, path):
+    with torch.no_grad():
+        # fixed shape: the sliding window always feeds single patches
+        torch.onnx.export(network, example, path, input_names=["input"], output_names=["logits"],
+                          opset_version=ONNX_OPSET)
+
+
+def quantize_onnx(src, dst):
+    """
+    Dynamic int8 quantization: weights stored as int8, activations
+    quantized per call. torch's own dynamic quantization only covers
+    Linear/RNN layers, so the convolutions are quantized through ONNX
+    Runtime's ConvInteger instead.
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    # QUInt8: ConvInteger on the CPU provider lacks signed weight kernels in many builds
+    quantize_dynamic(src, dst, weight_type=QuantType.QUInt8)
+
+
+def _write_atomic(export, path, *args):
+    tmp = f"{path}.tmp{os.getpid()}"
+    export(*args, tmp)
+    os.replace(tmp, path)
+
+
+def compile_network(predictor, checkpoint, backend, quantize=False):
+    """
+    The predictor's network in `backend` form, exporting it on first use.
+    For "torch" the trained module is returned as is.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend {backend!r}; expected one of {BACKENDS}")
+    if quantize and backend != "onnx":
+        raise ValueError("int8 quantization needs the onnx backend")
+    if backend == "torch":
+        return predictor.network
+
+    patch_size = predictor.configuration_manager.patch_size
+    path = export_path(checkpoint, patch_size, backend, quantize)
+    if not os.path.exists(path):
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        network, example = _trained_network(predictor), _example_input(predictor)
+        if backend == "torchscript":
+            _write_atomic(export_torchscript, path, network, example)
+        else:
+            try:
+                import onnx  # noqa: F401 - needed by torch.onnx.export
+                import onnxruntime  # noqa: F401
+            except ImportError as e:
+                raise ImportError(f"The onnx backend needs onnx and onnxruntime ({e})") from e
+            fp32 = export_path(checkpoint, patch_size, backend)
+            if not os.path.exists(fp32):
+                _write_atomic(export_onnx, fp32, network, example)
+            if quantize:
+                _write_atomic(quantize_onnx, path, fp32)
+
+    return TorchScriptNetwork(path) if backend == "torchscript" else OnnxNetwork(path)
@@ -1,66 +1,153 @@
 import sqlite3
+from contextlib import contextmanager
 from datetime import datetime
 import hashlib
 import os
+import threading
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.getenv("DATABASE_PATH", os.path.join(BASE_DIR, "database.db"))
+
+# ================= CONNECTION POOL =================
+# One long-lived connection per thread (and per process, connections are
+# never carried across a fork). sqlite3 keeps a prepared-statement cache
+# on each connection, so repeated queries skip re-parsing.
+_local = threading.local()
+
+
+def _open_connection():
+    conn = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None, cached_statements=256)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")      # readers don't block the writer
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
+
+def get_connection():
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.pid != os.getpid():
+        conn = _open_connection()
+        _local.conn = conn
+        _local.pid = os.getpid()
+    return conn
+
+
+def close_connection():
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
+@contextmanager
+def transaction():
+    """
+    Single write transaction on this thread's connection. BEGIN IMMEDIATE
+    takes the write lock up front, so check-then-insert flows like signup
+    cannot interleave with another writer.
+    """
+    conn = get_connection()
+    if conn.in_transaction:
+        # nested use joins the outer transaction
+        yield conn
+        return
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    else:
+        conn.execute("COMMIT")
+
+
+PREDICTION_ANALYSIS_COLUMNS = [
+    ("job_id", "TEXT"),
+    ("total_bilirubin", "REAL"),
+    ("alp", "REAL"),
+    ("albumin", "REAL"),
+    ("nlr", "REAL"),
+    ("volume_mm3", "REAL"),
+    ("max_diameter_mm", "REAL"),
+    ("lesion_count", "INTEGER"),
+    ("survival", "TEXT"),
+    ("ai_summary", "TEXT"),
+    ("artifacts", "TEXT"),   # JSON: rendered images + prediction mask
+    ("result", "TEXT"),      # JSON: full context rendered by prediction.html
+]
+
 
 def init_db():
- 
-
-    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-    cursor = conn.cursor()
-    
-    # Create users table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT UNIQUE NOT NULL,
-        email TEXT UNIQUE NOT NULL,
-        password TEXT NOT NULL,
-        full_name TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    # Create predictions table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS predictions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER,
-        image_path TEXT,
-        age INTEGER,
-        bmi REAL,
-        glucose_level REAL,
-        insulin_level REAL,
-        ca19_9 REAL,
-        cea REAL,
-        symptoms TEXT,
-        prediction_result TEXT,
-        confidence_score REAL,
-        explanation TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (user_id) REFERENCES users (id)
-    )
-    ''')
-    
-    # Create patient_records table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS patient_records (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER,
-        record_type TEXT,
-        value TEXT,
-        date_recorded TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (user_id) REFERENCES users (id)
-    )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        cursor = conn.cursor()
+
+        # Create users table
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            full_name TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+
+        # Create predictions table
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS predictions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            image_path TEXT,
+            age INTEGER,
+            bmi REAL,
+            glucose_level REAL,
+            insulin_level REAL,
+            ca19_9 REAL,
+            cea REAL,
+            symptoms TEXT,
+            prediction_result TEXT,
+            confidence_score REAL,
+            explanation TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''')
+
+        # Columns added for stored analyses (ALTER keeps existing databases usable)
+        existing = {r["name"] for r in cursor.execute("PRAGMA table_info(predictions)")}
+        for name, column_type in PREDICTION_ANALYSIS_COLUMNS:
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE predictions ADD COLUMN {name} {column_type}")
+
+        # History pages are keyset-paginated on (created_at, id) per user
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_predictions_user_created
+        ON predictions (user_id, created_at DESC, id DESC)
+        ''')
+
+        # Slice viewer requests check case ownership by job id
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_predictions_job
+        ON predictions (job_id)
+        ''')
+
+        # Create patient_records table
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS patient_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            record_type TEXT,
+            value TEXT,
+            date_recorded TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''')
 
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
 def get_db_connection():
-    conn = sqlite3.connect('database.db')
-    conn.row_factory = sqlite3.Row
-    return conn
\ No newline at end of file
+    return get_connection()
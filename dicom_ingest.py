@@ -0,0 +1,191 @@
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pydicom
+
+DEFAULT_WORKERS = min(8, os.cpu_count() or 1)
+# Slices further apart than this fraction of the median step are rejected
+MAX_SPACING_DEVIATION = 0.1
+
+
+class DicomError(ValueError):
+    pass
+
+
+class DicomSeries:
+    """
+    A CT series decoded into a (x, y, z) array, i.e. the same layout
+    nibabel gives for the equivalent NIfTI, with a RAS affine.
+    """
+
+    def __init__(self, volume, affine, spacing, timings, series_uid=None):
+        self.volume = volume
+        self.affine = affine
+        self.spacing = spacing
+        self.timings = timings
+        self.series_uid = series_uid
+
+    @property
+    def seconds(self):
+        return sum(self.timings.values())
+
+
+# ================= HELPERS =================
+class _ZipReader:
+    """ZipFile handles are not safe to share, so each thread opens its own."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def read(self, name):
+        zf = getattr(self._local, "zf", None)
+        if zf is None:
+            zf = self._local.zf = zipfile.ZipFile(self.path)
+        return zf.open(name)
+
+
+# Slices without these (scouts, secondary captures, ...) are skipped
+REQUIRED_TAGS = ("ImagePositionPatient", "ImageOrientationPatient", "PixelSpacing", "Rows", "Columns")
+
+
+def _read_header(reader, name):
+    try:
+        with reader.read(name) as f:
+            ds = pydicom.dcmread(f, stop_before_pixels=True, force=True)
+    except Exception:
+        return None
+    if any(tag not in ds for tag in REQUIRED_TAGS):
+        return None
+    try:
+        return {
+            "name": name,
+            "series": str(ds.get("SeriesInstanceUID", "")),
+            "position": np.array([float(v) for v in ds.ImagePositionPatient]),
+            "orientation": np.array([float(v) for v in ds.ImageOrientationPatient]),
+            "pixel_spacing": [float(v) for v in ds.PixelSpacing],
+            "shape": (int(ds.Rows), int(ds.Columns)),
+            "slope": float(ds.get("RescaleSlope", 1) or 1),
+            "intercept": float(ds.get("RescaleIntercept", 0) or 0)
+        }
+    except (AttributeError, TypeError, ValueError):
+        # present but empty / malformed values
+        return None
+
+
+def _affine(first, step, row_cos, col_cos, pixel_spacing):
+    """
+    LPS → RAS affine for volume[i, j, k] = pixel_array[j, i] of slice k.
+    DICOM PixelSpacing is (between rows, between columns).
+    """
+    affine = np.eye(4)
+    affine[:3, 0] = row_cos * pixel_spacing[1]
+    affine[:3, 1] = col_cos * pixel_spacing[0]
+    affine[:3, 2] = step
+    affine[:3, 3] = first
+    affine[:2, :] *= -1
+    return affine
+
+
+# ================= LOADING =================
+def load_dicom_zip(path, workers=DEFAULT_WORKERS):
+    """
+    Read a zipped DICOM series. Headers are parsed in parallel, slices are
+    sorted along the slice normal by ImagePositionPatient, and pixel data
+    is decoded in parallel straight into a preallocated float32 volume.
+    If the archive holds several series the one with the most slices is used.
+    """
+    timings = {}
+    t0 = time.perf_counter()
+    reader = _ZipReader(path)
+    with zipfile.ZipFile(path) as zf:
+        names = [i.filename for i in zf.infolist() if not i.is_dir()]
+
+    with ThreadPoolExecutor(workers) as pool:
+        headers = [h for h in pool.map(lambda n: _read_header(reader, n), names) if h is not None]
+    if not headers:
+        raise DicomError("No DICOM images with position information found in archive")
+
+    by_series = {}
+    for h in headers:
+        by_series.setdefault(h["series"], []).append(h)
+    series_uid, slices = max(by_series.items(), key=lambda kv: len(kv[1]))
+    if len(slices) < 2:
+        raise DicomError("Series has fewer than two slices")
+    timings["headers"] = time.perf_counter() - t0
+
+    # -------- geometry --------
+    t0 = time.perf_counter()
+    orientation = slices[0]["orientation"]
+    row_cos, col_cos = orientation[:3], orientation[3:]
+    normal = np.cross(row_cos, col_cos)
+    slices.sort(key=lambda h: float(h["position"] @ normal))
+
+    positions = np.array([h["position"] @ normal for h in slices])
+    steps = np.diff(positions)
+    median_step = float(np.median(steps))
+    if median_step <= 0:
+        raise DicomError("Duplicate slice positions in series")
+    if np.abs(steps - median_step).max() > MAX_SPACING_DEVIATION * median_step:
+        raise DicomError("Non-uniform slice spacing (missing slices?)")
+
+    rows, cols = slices[0]["shape"]
+    if any(h["shape"] != (rows, cols) for h in slices):
+        raise DicomError("Slices have different matrix sizes")
+
+    pixel_spacing = slices[0]["pixel_spacing"]
+    step = (slices[-1]["position"] - slices[0]["position"]) / (len(slices) - 1)
+    affine = _affine(slices[0]["position"], step, row_cos, col_cos, pixel_spacing)
+    spacing = (pixel_spacing[1], pixel_spacing[0], median_step)
+
+    # Slices are written contiguously as (z, row, col); the (x, y, z) volume
+    # is a transposed view of it, and that (z, y, x) buffer is exactly what
+    # nnU-Net consumes, so no copy is made on the way to segmentation.
+    data = np.empty((len(slices), rows, cols), dtype=np.float32)
+    timings["geometry"] = time.perf_counter() - t0
+
+    # -------- pixel data --------
+    t0 = time.perf_counter()
+
+    def decode(k):
+        h = slices[k]
+        with reader.read(h["name"]) as f:
+            pixels = pydicom.dcmread(f, force=True).pixel_array
+        out = data[k]
+        np.copyto(out, pixels, casting="unsafe")
+        if h["slope"] != 1 or h["intercept"] != 0:
+            out *= h["slope"]
+            out += h["intercept"]
+
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(decode, range(len(slices))))
+    timings["decode"] = time.perf_counter() - t0
+
+    return DicomSeries(data.transpose(2, 1, 0), affine, spacing, timings, series_uid)
+
+
+def save_nifti(series, path):
+    import nibabel as nib
+    nib.save(nib.Nifti1Image(series.volume, series.affine), path)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert a zipped DICOM series to NIfTI")
+    parser.add_argument("zip")
+    parser.add_argument("-o", "--output", help="write the volume as .nii / .nii.gz")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    args = parser.parse_args()
+
+    series = load_dicom_zip(args.zip, args.workers)
+    print(f"series {series.series_uid}: shape {series.volume.shape}, spacing {series.spacing}")
+    for stage, seconds in series.timings.items():
+        print(f"  {stage:>9}: {seconds:.3f}s")
+    print(f"  {'total':>9}: {series.seconds:.3f}s ({args.workers} workers)")
+    if args.output:
+        save_nifti(series, args.output)
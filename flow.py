@@ -0,0 +1,107 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import nullcontext
+
+from telemetry import current_trace
+
+MAX_WORKERS = 6
+
+
+class FlowResult:
+    def __init__(self, results, timings, seconds, critical_path):
+        self.results = results
+        self.timings = timings      # {stage: {"start": s, "seconds": s}}, relative to the flow start
+        self.seconds = seconds
+        self.critical_path = critical_path    # stages on the chain that set the total
+
+    def __getitem__(self, name):
+        return self.results[name]
+
+    def summary(self):
+        width = max(len(name) for name in self.timings)
+        lines = [f"  {name:<{width}}  start {t['start']:7.3f}s  took {t['seconds']:7.3f}s"
+                 for name, t in sorted(self.timings.items(), key=lambda kv: kv[1]["start"])]
+        lines.append(f"  {'total':<{width}}  {self.seconds:.3f}s  (critical path: {' → '.join(self.critical_path)})")
+        return "\n".join(lines)
+
+
+class Flow:
+    """
+    A small DAG of named stages run on a thread pool. A stage starts as
+    soon as all its dependencies have finished and is called with their
+    results as positional arguments, in the order they were declared:
+
+        flow = Flow()
+        flow.stage("a", load)
+        flow.stage("b", other)
+        flow.stage("c", combine, "a", "b")    # combine(result_a, result_b)
+        flow.run()["c"]
+
+    The heavy stages here (nnU-Net, SciPy, OpenCV, SQLite, HTTP) release
+    the GIL, so threads are enough to overlap them. If a stage raises,
+    no further stages are started and the exception is re-raised.
+
+    When run inside a telemetry.Trace, every stage is also recorded as a
+    span of that trace (wall, CPU and peak RSS).
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS):
+        self.max_workers = max_workers
+        self.stages = {}
+
+    def stage(self, name, fn, *deps):
+        if name in self.stages:
+            raise ValueError(f"Duplicate stage {name!r}")
+        missing = [d for d in deps if d not in self.stages]
+        if missing:
+            # declaring dependencies first also rules out cycles
+            raise ValueError(f"Stage {name!r} depends on undeclared {missing}")
+        self.stages[name] = (fn, deps)
+        return self
+
+    def run(self):
+        results, timings = {}, {}
+        pending = dict(self.stages)
+        running = {}
+        trace = current_trace()
+        t0 = time.perf_counter()
+
+        def call(name, fn, args):
+            start = time.perf_counter()
+            try:
+                with trace.span(name) if trace is not None else nullcontext():
+                    return fn(*args)
+            finally:
+                timings[name] = {"start": start - t0, "seconds": time.perf_counter() - start}
+
+        with ThreadPoolExecutor(self.max_workers, thread_name_prefix="flow") as pool:
+            while pending or running:
+                for name, (fn, deps) in list(pending.items()):
+                    if all(d in results for d in deps):
+                        del pending[name]
+                        running[pool.submit(call, name, fn, [results[d] for d in deps])] = name
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        for other in running:
+                            other.cancel()
+                        raise error
+                    results[name] = future.result()
+
+        return FlowResult(results, timings, time.perf_counter() - t0, self._critical_path(timings))
+
+    def _critical_path(self, timings):
+        # walk back from the stage that finished last through the dependency
+        # that finished last, i.e. the one each stage actually waited on
+        def end(name):
+            return timings[name]["start"] + timings[name]["seconds"]
+
+        name = max(timings, key=end)
+        path = [name]
+        while self.stages[name][1]:
+            name = max(self.stages[name][1], key=end)
+            path.append(name)
+        return path[::-1]
@@ -0,0 +1,36 @@
+"""
+    gunicorn app:app -c gunicorn.conf.py
+
+Run the job workers separately (`python jobs.py`). With WEB_PRELOAD=1
+the app, the heavy libraries (not torch / nnU-Net: the web processes
+never run inference) and the lab model are loaded once in the master
+and the web workers are forked from it, sharing those pages
+copy-on-write instead of each importing its own copy.
+"""
+import os
+import time
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_WORKERS", "2"))
+threads = int(os.getenv("WEB_THREADS", "4"))
+timeout = 120
+preload_app = os.getenv("WEB_PRELOAD", "0") == "1"
+
+_started = time.perf_counter()
+
+
+def when_ready(server):
+    # runs in the master after the app is imported and before any fork
+    if preload_app:
+        import startup
+        timings = startup.preload(engine=False)
+        for step, seconds in timings.items():
+            server.log.info("preload %s: %.3fs", step, seconds)
+    server.log.info("master ready in %.2fs", time.perf_counter() - _started)
+
+
+def post_worker_init(server):
+    from startup import process_age
+    age = process_age()
+    if age is not None:
+        server.log.info("worker %s ready in %.2fs", os.getpid(), age)
@@ -0,0 +1,278 @@
+import json
+import multiprocessing
+import os
+import sqlite3
+import time
+import traceback
+import uuid
+
+import telemetry
+from workspace import Workspace, case_dir, cleanup_expired
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+JOBS_DB = os.path.join(BASE_DIR, "jobs.db")
+
+# Each nnU-Net run is given a fixed number of torch threads; the pool size
+# is derived from it so parallel cases never oversubscribe the CPU.
+THREADS_PER_JOB = int(os.getenv("JOB_THREADS", "4"))
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 1) // THREADS_PER_JOB)
+# the sliding window runs one patch at a time, so extra inter-op threads only oversubscribe
+INTEROP_THREADS = int(os.getenv("JOB_INTEROP_THREADS", "1"))
+# Load models once in the parent and fork the workers from it (shared
+# copy-on-write) instead of spawning workers that each load their own
+PRELOAD = os.getenv("JOB_PRELOAD", "0") == "1"
+POLL_INTERVAL = 0.5
+CLEANUP_INTERVAL = 15 * 60
+
+
+# ================= QUEUE =================
+def _connect():
+    conn = sqlite3.connect(JOBS_DB, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def init_queue():
+    conn = _connect()
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        user_id INTEGER,
+        status TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        result TEXT,
+        error TEXT,
+        worker INTEGER,
+        created_at REAL NOT NULL,
+        started_at REAL,
+        finished_at REAL
+    )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+    conn.close()
+
+
+def enqueue(user_id, payload, job_id=None):
+    """Queue a job; enqueueing an explicit `job_id` that exists is a no-op."""
+    job_id = job_id or uuid.uuid4().hex
+    conn = _connect()
+    conn.execute(
+        "INSERT OR IGNORE INTO jobs (id, user_id, status, payload, created_at) VALUES (?, ?, 'queued', ?, ?)",
+        (job_id, user_id, json.dumps(payload), time.time())
+    )
+    conn.close()
+    return job_id
+
+
+def claim(worker_id):
+    """Atomically move the oldest queued job to `running` and return it."""
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            "SELECT id, payload FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute(
+            "UPDATE jobs SET status = 'running', worker = ?, started_at = ? WHERE id = ?",
+            (worker_id, time.time(), row["id"])
+        )
+        conn.execute("COMMIT")
+        return row["id"], json.loads(row["payload"])
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def finish(job_id, result=None, error=None):
+    conn = _connect()
+    conn.execute(
+        "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+        ("failed" if error else "done",
+         json.dumps(result) if result is not None else None,
+         error, time.time(), job_id)
+    )
+    conn.close()
+
+
+def get_job(job_id):
+    conn = _connect()
+    row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    conn.close()
+    if row is None:
+        return None
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+def requeue_running():
+    """Jobs left `running` by a killed pool are put back in the queue."""
+    conn = _connect()
+    conn.execute("UPDATE jobs SET status = 'queued', worker = NULL, started_at = NULL WHERE status = 'running'")
+    conn.close()
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def queue_metrics(window=200):
+    conn = _connect()
+    counts = {
+        r["status"]: r["n"]
+        for r in conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")
+    }
+    oldest = conn.execute("SELECT MIN(created_at) FROM jobs WHERE status = 'queued'").fetchone()[0]
+    recent = conn.execute(
+        "SELECT created_at, started_at, finished_at FROM jobs "
+        "WHERE status IN ('done', 'failed') ORDER BY finished_at DESC LIMIT ?",
+        (window,)
+    ).fetchall()
+    conn.close()
+
+    wait = [r["started_at"] - r["created_at"] for r in recent]
+    run = [r["finished_at"] - r["started_at"] for r in recent]
+    return {
+        "queue_depth": counts.get("queued", 0),
+        "running": counts.get("running", 0),
+        "done": counts.get("done", 0),
+        "failed": counts.get("failed", 0),
+        "oldest_queued_age_s": time.time() - oldest if oldest else 0.0,
+        "wait_p50_s": _percentile(wait, 0.5),
+        "wait_p95_s": _percentile(wait, 0.95),
+        "run_p50_s": _percentile(run, 0.5),
+        "run_p95_s": _percentile(run, 0.95),
+    }
+
+
+# ================= WORKERS =================
+def run_job(job_id, payload):
+    """
+    Jobs share their id with the workspace the upload was saved into.
+    Outputs go to the permanent case directory and the analysis is stored
+    in the user's history; the scratch workspace is dropped on success.
+    """
+    import shutil
+    from contextlib import nullcontext
+    from pipeline import run_prediction
+    from models import Prediction
+
+    out_dir = case_dir(job_id)
+    trace = telemetry.Trace(job_id)
+    profiler = telemetry.SamplingProfiler() if payload.get("profile") else None
+    try:
+        with trace, profiler or nullcontext():
+            result = run_prediction(payload["image_path"], out_dir, payload["data"], payload["report"],
+                                    content_hash=payload.get("content_hash"))
+    except Exception:
+        shutil.rmtree(out_dir, ignore_errors=True)
+        raise
+    finally:
+        try:
+            telemetry.record(trace)
+        except Exception:
+            traceback.print_exc()
+
+    result["trace"] = trace.to_dict()
+    if profiler is not None:
+        result["profile"] = os.path.basename(profiler.write(os.path.join(out_dir, telemetry.PROFILE_FILE)))
+    result["case_id"] = job_id
+    result["prediction_id"] = Prediction.save_analysis(
+        payload["user_id"], job_id, os.path.basename(payload["image_path"]), result
+    )
+    Workspace(job_id).remove()
+    return result
+
+
+def pin_threads(threads, interop_threads=INTEROP_THREADS):
+    """
+    Pin the math libraries before torch / numpy are imported in this
+    process: `threads` inside each operator, `interop_threads` for running
+    independent operators concurrently (ONNX Runtime sessions use the same).
+    """
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    import torch
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(interop_threads)
+    except RuntimeError:
+        # only allowed once, before any inter-op work (e.g. a preloading parent already set it)
+        pass
+
+
+def worker_loop(worker_id, threads=THREADS_PER_JOB):
+    pin_threads(threads)
+    telemetry.init_metrics()
+    from startup import process_age
+    age = process_age()
+    boot = f", booted in {age:.2f}s" if age is not None else ""
+    print(f"[worker {worker_id}] started (pid {os.getpid()}, {threads} threads{boot})")
+    last_cleanup = 0.0
+    while True:
+        if worker_id == 0 and time.time() - last_cleanup > CLEANUP_INTERVAL:
+            cleanup_expired()
+            last_cleanup = time.time()
+
+        job = claim(worker_id)
+        if job is None:
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        job_id, payload = job
+        try:
+            finish(job_id, result=run_job(job_id, payload))
+        except Exception:
+            traceback.print_exc()
+            finish(job_id, error=traceback.format_exc(limit=5))
+
+
+def start_workers(n=None, threads=THREADS_PER_JOB, preload=PRELOAD):
+    """
+    Start `n` worker processes. By default they are spawned and each
+    imports the pipeline and loads nnU-Net lazily on its first case.
+
+    With `preload`, this process imports everything and loads the models
+    first, then forks the workers, which share those pages copy-on-write
+    and are ready immediately. Only safe while this process has not run
+    any inference itself (OpenMP thread pools do not survive fork).
+    """
+    init_queue()
+    requeue_running()
+    if preload:
+        import startup
+        pin_threads(threads)
+        startup.report(startup.preload(), "preload")
+        ctx = multiprocessing.get_context("fork")
+    else:
+        ctx = multiprocessing.get_context("spawn")
+    procs = []
+    for i in range(n or DEFAULT_WORKERS):
+        p = ctx.Process(target=worker_loop, args=(i, threads), daemon=True)
+        p.start()
+        procs.append(p)
+    return procs
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the CT inference worker pool")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--threads", type=int, default=THREADS_PER_JOB)
+    parser.add_argument("--preload", action="store_true", default=PRELOAD,
+                        help="load models here and fork the workers (shared copy-on-write)")
+    args = parser.parse_args()
+
+    for p in start_workers(args.workers, args.threads, args.preload):
+        p.join()
@@ -0,0 +1,206 @@
+import numpy as np
+import pandas as pd
+
+from lab_prediction import (
+    FEATURES,
+    load_model,
+    stage_base_survival_months,
+    recommendation_map,
+    compute_risk_score,
+    format_survival
+)
+
+
+# ================= COMPILED ESTIMATORS =================
+# Each compiler turns a fitted sklearn estimator into plain Python lists so
+# one row can be scored without pandas, input validation or NumPy dispatch.
+# The compiled form returns the index into the estimator's `classes_`.
+
+def _compile_tree(tree):
+    t = tree.tree_
+    value = t.value[:, 0, :]
+    proba = value / np.maximum(value.sum(axis=1, keepdims=True), 1e-300)
+    return (
+        t.feature.tolist(),
+        t.threshold.tolist(),
+        t.children_left.tolist(),
+        t.children_right.tolist(),
+        proba.tolist()
+    )
+
+
+def _tree_leaf_proba(compiled, x):
+    feature, threshold, left, right, proba = compiled
+    node = 0
+    while left[node] != -1:
+        node = left[node] if x[feature[node]] <= threshold[node] else right[node]
+    return proba[node]
+
+
+def _argmax(values):
+    best = 0
+    for i in range(1, len(values)):
+        if values[i] > values[best]:
+            best = i
+    return best
+
+
+def _compile_forest(estimator):
+    trees = [_compile_tree(t) for t in estimator.estimators_]
+    n_classes = len(estimator.classes_)
+
+    def predict_index(x):
+        # sklearn trees compare float32 features against float64 thresholds
+        x = np.asarray(x, dtype=np.float32).tolist()
+        total = [0.0] * n_classes
+        for tree in trees:
+            p = _tree_leaf_proba(tree, x)
+            for k in range(n_classes):
+                total[k] += p[k]
+        return _argmax(total)
+
+    return predict_index
+
+
+def _compile_decision_tree(estimator):
+    tree = _compile_tree(estimator)
+
+    def predict_index(x):
+        return _argmax(_tree_leaf_proba(tree, np.asarray(x, dtype=np.float32).tolist()))
+
+    return predict_index
+
+
+def _compile_linear(estimator):
+    coef = np.atleast_2d(estimator.coef_).tolist()
+    intercept = np.atleast_1d(estimator.intercept_).tolist()
+
+    def predict_index(x):
+        scores = [sum(c * v for c, v in zip(row, x)) + b for row, b in zip(coef, intercept)]
+        if len(scores) == 1:
+            return int(scores[0] > 0)
+        return _argmax(scores)
+
+    return predict_index
+
+
+def _compile_scaler(step):
+    name = type(step).__name__
+    if name == "StandardScaler":
+        mean = step.mean_.tolist() if step.with_mean else [0.0] * step.n_features_in_
+        scale = step.scale_.tolist() if step.with_std else [1.0] * step.n_features_in_
+        return lambda x: [(v - m) / s for v, m, s in zip(x, mean, scale)]
+    if name == "MinMaxScaler" and not step.clip:
+        scale, offset = step.scale_.tolist(), step.min_.tolist()
+        return lambda x: [v * s + o for v, s, o in zip(x, scale, offset)]
+    return None
+
+
+# One score row per class (or one for binary), predicted class = argmax.
+# Other estimators with coef_ (e.g. SVC(kernel="linear"), one-vs-one with
+# n*(n-1)/2 rows) do not fit that layout and go through sklearn.
+LINEAR_CLASSIFIERS = ("LogisticRegression", "RidgeClassifier", "LinearSVC", "SGDClassifier")
+
+
+def _compile_estimator(estimator):
+    name = type(estimator).__name__
+    if name in ("RandomForestClassifier", "ExtraTreesClassifier"):
+        return _compile_forest(estimator)
+    if name in ("DecisionTreeClassifier", "ExtraTreeClassifier"):
+        return _compile_decision_tree(estimator)
+    if name in LINEAR_CLASSIFIERS:
+        return _compile_linear(estimator)
+    return None
+
+
+def compile_model(estimator):
+    """
+    Returns `predict_index(x) -> int` for supported estimators (forests,
+    decision trees, LINEAR_CLASSIFIERS, optionally behind Standard/MinMax
+    scalers in a Pipeline), or None if the model has to go through sklearn.
+    """
+    if type(estimator).__name__ == "Pipeline":
+        transforms = []
+        for _, step in estimator.steps[:-1]:
+            t = _compile_scaler(step)
+            if t is None:
+                return None
+            transforms.append(t)
+
+        final = _compile_estimator(estimator.steps[-1][1])
+        if final is None:
+            return None
+
+        def predict_index(x):
+            x = [float(v) for v in x]
+            for t in transforms:
+                x = t(x)
+            return final(x)
+
+        return predict_index
+
+    return _compile_estimator(estimator)
+
+
+# ================= FAST LAB MODEL =================
+class FastLabModel:
+    """
+    Single-row inference for the lab stage model. Stage names,
+    recommendations and base survival are decoded once per class, so a
+    prediction is a compiled model walk plus a few float operations.
+    Models that cannot be compiled fall back to sklearn on a one-row
+    DataFrame, which gives the same answer as `predict_pancreas_stage`.
+    """
+
+    def __init__(self, estimator=None, encoder=None):
+        if estimator is None or encoder is None:
+            default_model, default_encoder = load_model()
+            estimator = default_model if estimator is None else estimator
+            encoder = default_encoder if encoder is None else encoder
+        self.estimator = estimator
+        self._predict_index = compile_model(estimator)
+        self.compiled = self._predict_index is not None
+
+        stages = encoder.inverse_transform(np.asarray(estimator.classes_)).tolist()
+        self.stages = stages
+        self.base_survival = [stage_base_survival_months.get(s) for s in stages]
+        self.recommendations = [recommendation_map.get(s, "No recommendations available") for s in stages]
+        self._class_index = {c: i for i, c in enumerate(np.asarray(estimator.classes_).tolist())}
+
+    def predict_index(self, x):
+        if self.compiled:
+            return self._predict_index(x)
+        frame = pd.DataFrame([list(x)], columns=FEATURES)
+        frame["Age"] = frame["Age"].astype(int)
+        return self._class_index[self.estimator.predict(frame)[0]]
+
+    def predict(self, x):
+        """
+        `x` is a feature vector in FEATURES order
+        (CA19_9, Total_Bilirubin, ALP, Albumin, NLR, Age).
+        Returns (stage, survival text, recommendations).
+        """
+        values = [float(v) for v in x]
+        ca19_9, _, _, albumin, nlr, age = values
+        values[5] = float(int(age))   # Age is an int feature, as in predict_pancreas_stage
+        i = self.predict_index(values)
+
+        base = self.base_survival[i]
+        if base is None:
+            survival = "No cancer detected — normal condition."
+        else:
+            # the raw age, as predict_pancreas_stage passes it
+            risk = compute_risk_score(ca19_9, nlr, albumin, age)
+            survival = format_survival(base * (1 - 0.4 * risk))
+
+        return self.stages[i], survival, self.recommendations[i]
+
+
+_fast_model = None
+
+
+def predict_pancreas_stage_fast(x):
+    global _fast_model
+    if _fast_model is None:
+        _fast_model = FastLabModel()
+    return _fast_model.predict(x)
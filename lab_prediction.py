@@ -1,7 +1,7 @@
-import joblib
 import numpy as np
 import pandas as pd
 import os
+import threading
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -9,8 +9,34 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 model_path = os.path.join(BASE_DIR, "best_pancreatic_model.sav")
 encoder_path = os.path.join(BASE_DIR, "label_encoder.sav")
 
-model = joblib.load(model_path)
-label_encoder = joblib.load(encoder_path)
+# Loaded on first use rather than at import, so importing this module (for
+# FEATURES, or in a process that never scores a case) stays cheap.
+_model = None
+_label_encoder = None
+_load_lock = threading.Lock()
+
+
+def load_model():
+    """(model, label_encoder), read from disk once per process."""
+    global _model, _label_encoder
+    if _model is None:
+        with _load_lock:
+            if _model is None:
+                import joblib
+                _label_encoder = joblib.load(encoder_path)
+                _model = joblib.load(model_path)
+    return _model, _label_encoder
+
+
+def __getattr__(name):
+    # keeps `from lab_prediction import model` working, loading on access
+    if name == "model":
+        return load_model()[0]
+    if name == "label_encoder":
+        return load_model()[1]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+FEATURES = ["CA19_9", "Total_Bilirubin", "ALP", "Albumin", "NLR", "Age"]
 
 # ================= BASE SURVIVAL (MONTHS) PER STAGE =================
 # This is the average survival for each stage
@@ -52,15 +78,16 @@ recommendation_map = {
 # ================= HELPER FUNCTIONS =================
 def normalize(value, min_val, max_val):
     """
-    Normalize a value to range [0,1]
+    Normalize a value (or array of values) to range [0,1]
     """
-    value = float(value)
-    return max(0.0, min(1.0, (value - min_val) / (max_val - min_val)))
+    value = np.asarray(value, dtype=np.float64)
+    return np.clip((value - min_val) / (max_val - min_val), 0.0, 1.0)
 
 
 def compute_risk_score(CA19_9, NLR, Albumin, Age):
     """
-    Compute lab-based risk score (0 = low risk, 1 = high risk)
+    Compute lab-based risk score (0 = low risk, 1 = high risk).
+    Accepts scalars or equal-length arrays.
     """
 
     risk = (
@@ -70,7 +97,20 @@ def compute_risk_score(CA19_9, NLR, Albumin, Age):
         0.20 * normalize(Albumin, 2.0, 5.0)   # Nutrition (protective)
     )
 
-    return max(0.0, min(1.0, risk))
+    risk = np.clip(risk, 0.0, 1.0)
+    return float(risk) if risk.ndim == 0 else risk
+
+
+def format_survival(adjusted_months):
+    if adjusted_months >= 12:
+        return (
+            f"Estimated survival: {adjusted_months/12:.1f} years "
+            f"(personalized based on lab risk profile)."
+        )
+    return (
+        f"Estimated survival: {adjusted_months:.0f} months "
+        f"(personalized based on lab risk profile)."
+    )
 
 
 # ================= MAIN PREDICTION FUNCTION =================
@@ -84,9 +124,10 @@ def predict_pancreas_stage(CA19_9, Total_Bilirubin, ALP, Albumin, NLR, Age):
         float(Albumin),
         float(NLR),
         int(Age)
-    ]], columns=["CA19_9", "Total_Bilirubin", "ALP", "Albumin", "NLR", "Age"])
+    ]], columns=FEATURES)
 
     # -------- Stage prediction --------
+    model, label_encoder = load_model()
     prediction = model.predict(input_data)[0]
     stage = label_encoder.inverse_transform([prediction])[0]
 
@@ -101,18 +142,109 @@ def predict_pancreas_stage(CA19_9, Total_Bilirubin, ALP, Albumin, NLR, Age):
         # Adjust survival by up to 40% based on risk
         adjusted_months = base_survival * (1 - 0.4 * risk_score)
 
-        if adjusted_months >= 12:
-            survival_time = (
-                f"Estimated survival: {adjusted_months/12:.1f} years "
-                f"(personalized based on lab risk profile)."
-            )
-        else:
-            survival_time = (
-                f"Estimated survival: {adjusted_months:.0f} months "
-                f"(personalized based on lab risk profile)."
-            )
+        survival_time = format_survival(adjusted_months)
 
     # -------- Recommendations --------
     recommendations = recommendation_map.get(stage, "No recommendations available")
 
-    return stage, survival_time, recommendations
\ No newline at end of file
+    return stage, survival_time, recommendations
+
+
+# ================= BATCH PREDICTION =================
+def predict_pancreas_stage_batch(data):
+    """
+    Vectorized `predict_pancreas_stage` for a whole cohort.
+
+    `data` is a DataFrame with the FEATURES columns (extra columns are
+    ignored) or an (n, 6) array in FEATURES order. Returns a DataFrame
+    with stage, risk_score, survival_months (NaN for Normal), survival,
+    recommendation and error, one row per input row. Rows with a blank or
+    non-numeric feature are not scored: their error names the offending
+    columns and the other outputs are left empty.
+    """
+    if isinstance(data, pd.DataFrame):
+        X = data[FEATURES].apply(pd.to_numeric, errors="coerce").astype(np.float64)
+        index = data.index
+    else:
+        X = pd.DataFrame(np.asarray(data, dtype=np.float64).reshape(-1, len(FEATURES)), columns=FEATURES)
+        index = X.index
+
+    # -------- Input validation --------
+    finite = np.isfinite(X.to_numpy())
+    ok = finite.all(axis=1)
+    error = np.full(len(X), "", dtype=object)
+    for i in np.flatnonzero(~ok):
+        error[i] = "invalid or missing: " + ", ".join(f for f, good in zip(FEATURES, finite[i]) if not good)
+    if not ok.all():
+        scored = predict_pancreas_stage_batch(X[ok]) if ok.any() else None
+        out = pd.DataFrame({
+            "stage": "", "risk_score": np.nan, "survival_months": np.nan,
+            "survival": "", "recommendation": "", "error": error
+        }, index=index)
+        if scored is not None:
+            for col in scored.columns:
+                out.loc[ok, col] = scored[col].to_numpy()
+        return out
+    X["Age"] = X["Age"].astype(int)
+
+    # -------- Stage prediction --------
+    model, label_encoder = load_model()
+    stages = label_encoder.inverse_transform(model.predict(X))
+
+    # -------- Personalized survival estimation --------
+    risk = compute_risk_score(X["CA19_9"].to_numpy(), X["NLR"].to_numpy(),
+                              X["Albumin"].to_numpy(), X["Age"].to_numpy())
+    base = pd.Series(stages).map(stage_base_survival_months).to_numpy(dtype=np.float64)
+    months = base * (1 - 0.4 * risk)
+
+    survival = np.where(
+        np.isnan(months),
+        "No cancer detected — normal condition.",
+        np.where(
+            months >= 12,
+            pd.Series(months / 12).map("Estimated survival: {:.1f} years ".format).to_numpy(),
+            pd.Series(months).map("Estimated survival: {:.0f} months ".format).to_numpy()
+        ) + "(personalized based on lab risk profile)."
+    )
+
+    return pd.DataFrame({
+        "stage": stages,
+        "risk_score": risk,
+        "survival_months": months,
+        "survival": survival,
+        "recommendation": pd.Series(stages).map(recommendation_map).fillna("No recommendations available").to_numpy(),
+        "error": error
+    }, index=index)
+
+
+def score_csv(src, dst, chunksize=10000):
+    """Score a CSV cohort chunk by chunk; input columns are kept in the output."""
+    header = True
+    rows = 0
+    for chunk in pd.read_csv(src, chunksize=chunksize):
+        out = pd.concat([chunk, predict_pancreas_stage_batch(chunk)], axis=1)
+        out.to_csv(dst, header=header, index=False)
+        header = False
+        rows += len(out)
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    import time
+
+    parser = argparse.ArgumentParser(description="Score a lab-value CSV with the stage model")
+    parser.add_argument("input", help=f"CSV with columns {', '.join(FEATURES)}")
+    parser.add_argument("-o", "--output", help="output CSV (default: stdout)")
+    parser.add_argument("--chunksize", type=int, default=10000)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    if args.output:
+        with open(args.output, "w", newline="", encoding="utf-8") as f:
+            rows = score_csv(args.input, f, args.chunksize)
+    else:
+        rows = score_csv(args.input, sys.stdout, args.chunksize)
+    dt = time.perf_counter() - t0
+    print(f"Scored {rows} rows in {dt:.2f}s ({rows / dt if dt else 0:.0f} rows/s)", file=sys.stderr)
@@ -0,0 +1,165 @@
+"""
+Compact storage for predicted label maps.
+
+Masks are almost all background, so only the bounding box of the
+foreground is kept, run-length encoded one axial slice at a time: any
+slice, or the whole box, decodes with a single `np.repeat` and the full
+volume is never materialized unless asked for.
+
+    python mask_codec.py prediction.mask.npz prediction.nii.gz     # back to NIfTI
+"""
+import numpy as np
+
+MASK_FILE = "prediction.mask.npz"
+FORMAT_VERSION = 1
+
+
+def foreground_bbox(label_map):
+    """[(x0, x1), (y0, y1), (z0, z1)] of the nonzero voxels, or None."""
+    zs = np.flatnonzero(label_map.any(axis=(0, 1)))
+    if len(zs) == 0:
+        return None
+    # only the z-slab with foreground is scanned again
+    footprint = label_map[:, :, zs[0]:zs[-1] + 1].any(axis=2)
+    xs = np.flatnonzero(footprint.any(axis=1))
+    ys = np.flatnonzero(footprint.any(axis=0))
+    return [(int(a[0]), int(a[-1]) + 1) for a in (xs, ys, zs)]
+
+
+class PackedMask:
+    """
+    A (x, y, z) label map stored as its bounding box (`offset`, `size`)
+    and per-axial-slice runs: slice k of the box is the runs
+    `slice_runs[k]:slice_runs[k + 1]` of (`values`, `lengths`), in C order
+    over (x, y).
+    """
+
+    def __init__(self, shape, spacing, affine, offset, size, values, lengths, slice_runs):
+        self.shape = tuple(int(n) for n in shape)
+        self.spacing = tuple(float(s) for s in spacing)
+        self.affine = np.asarray(affine, dtype=np.float64)
+        self.offset = tuple(int(o) for o in offset)
+        self.size = tuple(int(n) for n in size)
+        self.values = values
+        self.lengths = lengths
+        self.slice_runs = slice_runs
+        self._crop = None
+
+    # ================= ENCODING =================
+    @classmethod
+    def encode(cls, label_map, spacing, affine=None):
+        label_map = np.asarray(label_map)
+        affine = np.diag(list(spacing[:3]) + [1.0]) if affine is None else affine
+        bbox = foreground_bbox(label_map)
+        if bbox is None:
+            empty = np.zeros(0, dtype=np.uint8)
+            return cls(label_map.shape, spacing, affine, (0, 0, 0), (0, 0, 0),
+                       empty, empty.astype(np.uint32), np.zeros(1, dtype=np.int64))
+
+        (x0, x1), (y0, y1), (z0, z1) = bbox
+        # (z, x*y): one row per axial slice of the box
+        rows = np.ascontiguousarray(label_map[x0:x1, y0:y1, z0:z1].astype(np.uint8).transpose(2, 0, 1))
+        rows = rows.reshape(z1 - z0, -1)
+        n = rows.shape[1]
+
+        # a run starts at every value change and at every slice start
+        change = np.empty(rows.shape, dtype=bool)
+        change[:, 0] = True
+        np.not_equal(rows[:, 1:], rows[:, :-1], out=change[:, 1:])
+        starts = np.flatnonzero(change)
+        lengths = np.diff(np.append(starts, rows.size)).astype(np.uint32)
+        slice_runs = np.searchsorted(starts, np.arange(z1 - z0 + 1) * n)
+        return cls(label_map.shape, spacing, affine, (x0, y0, z0), (x1 - x0, y1 - y0, z1 - z0),
+                   rows.ravel()[starts], lengths, slice_runs.astype(np.int64))
+
+    # ================= DECODING =================
+    @property
+    def empty(self):
+        return self.size[2] == 0
+
+    def crop(self):
+        """The decoded bounding box, (x, y, z) uint8; memoized."""
+        if self._crop is None:
+            sx, sy, sz = self.size
+            flat = np.repeat(self.values, self.lengths)
+            self._crop = flat.reshape(sz, sx, sy).transpose(1, 2, 0)
+        return self._crop
+
+    def axial(self, z):
+        """Full-size (x, y) slice `z`; only that slice's runs are decoded."""
+        out = np.zeros(self.shape[:2], dtype=np.uint8)
+        k = z - self.offset[2]
+        if 0 <= k < self.size[2]:
+            r0, r1 = self.slice_runs[k], self.slice_runs[k + 1]
+            (x0, y0), (sx, sy) = self.offset[:2], self.size[:2]
+            out[x0:x0 + sx, y0:y0 + sy] = np.repeat(self.values[r0:r1], self.lengths[r0:r1]).reshape(sx, sy)
+        return out
+
+    def plane(self, axis, index):
+        """Full-size slice `index` along `axis` (0 = sagittal, 1 = coronal, 2 = axial)."""
+        if axis == 2:
+            return self.axial(index)
+        dims = [d for a, d in enumerate(self.shape) if a != axis]
+        out = np.zeros(dims, dtype=np.uint8)
+        k = index - self.offset[axis]
+        if not self.empty and 0 <= k < self.size[axis]:
+            other = [a for a in range(3) if a != axis]
+            box = tuple(slice(self.offset[a], self.offset[a] + self.size[a]) for a in other)
+            out[box] = np.take(self.crop(), k, axis=axis)
+        return out
+
+    def dense(self):
+        """The full label map; for export, avoid it elsewhere."""
+        out = np.zeros(self.shape, dtype=np.uint8)
+        if not self.empty:
+            out[tuple(slice(o, o + s) for o, s in zip(self.offset, self.size))] = self.crop()
+        return out
+
+    def metrics(self):
+        """tumor_metrics.compute_metrics on the box alone."""
+        from tumor_metrics import compute_metrics
+
+        return compute_metrics(self.crop(), self.spacing, offset=self.offset, shape=self.shape)
+
+    # ================= FILES =================
+    @property
+    def nbytes(self):
+        return self.values.nbytes + self.lengths.nbytes + self.slice_runs.nbytes
+
+    def save(self, path):
+        # uncompressed: the runs are already small and load without inflating
+        with open(path, "wb") as f:
+            np.savez(
+                f, version=np.int64(FORMAT_VERSION), shape=np.asarray(self.shape), spacing=np.asarray(self.spacing),
+                affine=self.affine, offset=np.asarray(self.offset), size=np.asarray(self.size),
+                values=self.values, lengths=self.lengths, slice_runs=self.slice_runs
+            )
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            if int(f["version"]) != FORMAT_VERSION:
+                raise ValueError(f"{path}: unsupported mask format version {int(f['version'])}")
+            return cls(f["shape"], f["spacing"], f["affine"], f["offset"], f["size"],
+                       f["values"], f["lengths"], f["slice_runs"])
+
+    def to_nifti(self, path):
+        import nibabel as nib
+
+        img = nib.Nifti1Image(self.dense(), self.affine)
+        img.header.set_zooms(self.spacing)
+        nib.save(img, path)
+        return path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert a packed prediction mask to NIfTI")
+    parser.add_argument("mask", help=MASK_FILE)
+    parser.add_argument("output", help=".nii or .nii.gz")
+    args = parser.parse_args()
+
+    packed = PackedMask.load(args.mask)
+    print(f"{args.mask}: {packed.shape} box {packed.size} at {packed.offset} → {packed.to_nifti(args.output)}")
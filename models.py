@@ -1,5 +1,7 @@
-import sqlite3
 from datetime import datetime
+import json
+
+from database import get_connection, transaction
 
 class User:
     def __init__(self, username, email, password, full_name=None):
@@ -8,68 +10,128 @@ class User:
         self.password = password
         self.full_name = full_name
         self.created_at = datetime.now()
-    
+
     def save(self):
-        conn = sqlite3.connect('database.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO users (username, email, password, full_name)
-            VALUES (?, ?, ?, ?)
-        ''', (self.username, self.email, self.password, self.full_name))
-        conn.commit()
-        conn.close()
-    
+        with transaction() as conn:
+            cursor = conn.execute('''
+                INSERT INTO users (username, email, password, full_name)
+                VALUES (?, ?, ?, ?)
+            ''', (self.username, self.email, self.password, self.full_name))
+        return cursor.lastrowid
+
+    @staticmethod
+    def register(username, email, password, full_name=None):
+        """
+        Signup as one transaction: both uniqueness checks and the insert
+        run under the same write lock. Returns (user_id, None) or
+        (None, error message).
+        """
+        with transaction() as conn:
+            if conn.execute('SELECT 1 FROM users WHERE username = ?', (username,)).fetchone():
+                return None, "Username already exists"
+            if conn.execute('SELECT 1 FROM users WHERE email = ?', (email,)).fetchone():
+                return None, "Email already registered"
+            return User(username, email, password, full_name).save(), None
+
     @staticmethod
     def get_by_username(username):
-        conn = sqlite3.connect('database.db')
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM users WHERE username = ?', (username,))
-        user = cursor.fetchone()
-        conn.close()
-        return user
-    
+        return get_connection().execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
+
     @staticmethod
     def get_by_email(email):
-        conn = sqlite3.connect('database.db')
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM users WHERE email = ?', (email,))
-        user = cursor.fetchone()
-        conn.close()
-        return user
+        return get_connection().execute('SELECT * FROM users WHERE email = ?', (email,)).fetchone()
 
 class Prediction:
     @staticmethod
     def save_prediction(user_id, data):
-        conn = sqlite3.connect('database.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO predictions 
-            (user_id, image_path, age, bmi, glucose_level, insulin_level, 
-             ca19_9, cea, symptoms, prediction_result, confidence_score, explanation)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            user_id, data.get('image_path'), data.get('age'), data.get('bmi'),
-            data.get('glucose_level'), data.get('insulin_level'), data.get('ca19_9'),
-            data.get('cea'), data.get('symptoms'), data.get('prediction_result'),
-            data.get('confidence_score'), data.get('explanation')
-        ))
-        conn.commit()
-        prediction_id = cursor.lastrowid
-        conn.close()
-        return prediction_id
-    
+        with transaction() as conn:
+            cursor = conn.execute('''
+                INSERT INTO predictions
+                (user_id, image_path, age, bmi, glucose_level, insulin_level,
+                 ca19_9, cea, symptoms, prediction_result, confidence_score, explanation)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                user_id, data.get('image_path'), data.get('age'), data.get('bmi'),
+                data.get('glucose_level'), data.get('insulin_level'), data.get('ca19_9'),
+                data.get('cea'), data.get('symptoms'), data.get('prediction_result'),
+                data.get('confidence_score'), data.get('explanation')
+            ))
+        return cursor.lastrowid
+
+    @staticmethod
+    def save_analysis(user_id, job_id, image_path, result):
+        """Store a finished analysis (the context returned by pipeline.run_prediction)."""
+        data = result["data"]
+        analysis = result["analysis"]
+        artifacts = {"images": result["png_files"], "prediction": analysis.get("prediction_path")}
+        with transaction() as conn:
+            cursor = conn.execute('''
+                INSERT INTO predictions
+                (user_id, job_id, image_path, age, ca19_9, total_bilirubin, alp, albumin, nlr,
+                 symptoms, prediction_result, explanation, survival, ai_summary,
+                 volume_mm3, max_diameter_mm, lesion_count, artifacts, result)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                user_id, job_id, image_path, data["age"], data["ca19_9"], data["total_bilirubin"],
+                data["alp"], data["albumin"], data["nlr"],
+                result.get("report"), result["result"], result["explanation"], result["survival"],
+                result["AI_REC"], analysis["volume"], analysis["max_diameter"],
+                analysis.get("lesion_count"), json.dumps(artifacts), json.dumps(result)
+            ))
+        return cursor.lastrowid
+
+    @staticmethod
+    def get(user_id, prediction_id):
+        """One stored analysis (primary-key lookup), or None."""
+        row = get_connection().execute(
+            'SELECT * FROM predictions WHERE id = ? AND user_id = ?', (prediction_id, user_id)
+        ).fetchone()
+        if row is None:
+            return None
+        row = dict(row)
+        row["result"] = json.loads(row["result"]) if row["result"] else None
+        row["artifacts"] = json.loads(row["artifacts"]) if row["artifacts"] else None
+        return row
+
+    @staticmethod
+    def owns_case(user_id, job_id):
+        return get_connection().execute(
+            'SELECT 1 FROM predictions WHERE job_id = ? AND user_id = ?', (job_id, user_id)
+        ).fetchone() is not None
+
+    @staticmethod
+    def page(user_id, before=None, limit=20):
+        """
+        Keyset pagination over a user's history, newest first. `before` is
+        the (created_at, id) of the last row of the previous page. Returns
+        (rows, cursor for the next page or None).
+        """
+        columns = '''id, created_at, prediction_result, survival, volume_mm3,
+                      max_diameter_mm, lesion_count, age, ca19_9'''
+        conn = get_connection()
+        if before is None:
+            rows = conn.execute(f'''
+                SELECT {columns} FROM predictions
+                WHERE user_id = ?
+                ORDER BY created_at DESC, id DESC LIMIT ?
+            ''', (user_id, limit + 1)).fetchall()
+        else:
+            rows = conn.execute(f'''
+                SELECT {columns} FROM predictions
+                WHERE user_id = ? AND (created_at, id) < (?, ?)
+                ORDER BY created_at DESC, id DESC LIMIT ?
+            ''', (user_id, before[0], before[1], limit + 1)).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = (rows[-1]["created_at"], rows[-1]["id"])
+        return rows, next_cursor
+
     @staticmethod
     def get_user_predictions(user_id):
-        conn = sqlite3.connect('database.db')
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT * FROM predictions 
-            WHERE user_id = ? 
+        return get_connection().execute('''
+            SELECT * FROM predictions
+            WHERE user_id = ?
             ORDER BY created_at DESC
-        ''', (user_id,))
-        predictions = cursor.fetchall()
-        conn.close()
-        return predictions
\ No newline at end of file
+        ''', (user_id,)).fetchall()
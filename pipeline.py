@@ -0,0 +1,78 @@
+import os
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+from lab_prediction import FEATURES
+from lab_fast import predict_pancreas_stage_fast
+from Analyzer import add_analysis_stages
+from flow import Flow
+from summarizer import get_summarizer, SUMMARY_TIMEOUT, SUMMARY_RETRIES
+
+
+def lab_vector(data):
+    """Form lab values → feature vector in lab_prediction.FEATURES order."""
+    keys = {"CA19_9": "ca19_9", "Total_Bilirubin": "total_bilirubin", "ALP": "alp",
+            "Albumin": "albumin", "NLR": "nlr", "Age": "age"}
+    return [data[keys[f]] for f in FEATURES]
+
+
+# ================= FULL PREDICTION =================
+def summarize(report, metrics, lab):
+    # the summarizer bounds each attempt itself; this only guards against a stuck pool
+    future = get_summarizer().submit(report, metrics["volume"], metrics["max_diameter"], lab[0])
+    return future.result(timeout=SUMMARY_TIMEOUT * (SUMMARY_RETRIES + 2) + 10)
+
+
+def run_prediction(image_path, output_dir, data, report, content_hash=None, engine=None, use_cache=True):
+    """
+    Imaging analysis → lab model → Gemini summary for one case.
+    `data` holds the lab values as entered on the form. Returns the
+    context rendered by prediction.html.
+
+    The steps run as a flow.Flow: the lab model does not depend on
+    imaging and runs alongside segmentation, and the report summary
+    starts as soon as the tumor metrics exist, overlapping rendering and
+    the slice store. The per-stage timings are returned under "timings".
+    `engine` and `use_cache` are passed through to the imaging stages.
+    """
+    flow = add_analysis_stages(Flow(), image_path, output_dir, engine, content_hash, use_cache)
+    flow.stage("lab", lambda: predict_pancreas_stage_fast(lab_vector(data)))
+    flow.stage("summary", lambda metrics, lab: summarize(report, metrics, lab), "metrics", "lab")
+    done = flow.run()
+    print(f"Prediction flow:\n{done.summary()}")
+
+    analysis = done["analysis"]
+    stage, survival, advice = done["lab"]
+    ai_resp = done["summary"]
+
+    volume = analysis.volume
+    max_diameter = analysis.max_diameter
+
+    # -------- OUTPUT IMAGES --------
+    png_files = [
+        "/" + os.path.relpath(p, BASE_DIR).replace(os.sep, "/")
+        for p in analysis.images
+    ]
+
+    return {
+        "result": stage,
+        "survival": survival,
+        "explanation": advice,
+        "AI_REC": ai_resp,
+        "png_files": png_files,
+        "volume": volume,
+        "Shape": list(analysis.shape),
+        "voxel_count": analysis.voxel_count,
+        "voxel_spacing_mm": list(analysis.spacing),
+        "middle_slice_index": analysis.mid_slice,
+        "tumor_size_x": f"{analysis.size_x:.2f}",
+        "tumor_size_y": f"{analysis.size_y:.2f}",
+        "tumor_size_z": f"{analysis.size_z:.2f}",
+        "tumor_max_diameter": f"{max_diameter:.2f}",
+        "lesion_count": analysis.lesion_count,
+        "dice": "Not applicable (no ground truth)",
+        "data": data,
+        "report": report,
+        "analysis": analysis.to_dict(),
+        "timings": {name: round(t["seconds"], 4) for name, t in done.timings.items()}
+    }
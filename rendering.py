@@ -0,0 +1,124 @@
+import os
+
+import cv2
+import numpy as np
+from scipy import ndimage
+
+# Output images are upscaled to this many pixels on the longer side, close
+# to what the old 6in @ 200dpi matplotlib figures showed on the page.
+OUTPUT_SIZE = 600
+
+FILL_COLOR = (13, 0, 103)      # BGR, the top of matplotlib's "Reds" map
+FILL_ALPHA = 0.25
+CONTOUR_COLOR = (0, 0, 255)    # BGR red
+CONTOUR_THICKNESS = 2
+XAI_ALPHA = 0.4
+
+IMAGE_NAMES = ("overlay", "segmentation", "xai_overlay")
+
+
+# ================= BASIC OPS =================
+def to_uint8(ct_slice, window=None):
+    """
+    CT slice → uint8 grey. Default is min-max scaling (what imshow did);
+    `window=(level, width)` applies a HU window instead.
+    """
+    s = np.asarray(ct_slice, dtype=np.float32)
+    if window is not None:
+        level, width = window
+        lo, hi = level - width / 2, level + width / 2
+    else:
+        lo, hi = float(s.min()), float(s.max())
+    if hi <= lo:
+        return np.zeros(s.shape, dtype=np.uint8)
+    return np.clip((s - lo) * (255.0 / (hi - lo)), 0, 255).astype(np.uint8)
+
+
+def _scale(shape, size):
+    return size / max(shape) if size else 1.0
+
+
+def _resize(img, scale, interpolation):
+    if scale == 1.0:
+        return img
+    h, w = img.shape[:2]
+    return cv2.resize(img, (int(round(w * scale)), int(round(h * scale))), interpolation=interpolation)
+
+
+def heatmap_weights(mask_slice):
+    """In-plane distance-to-boundary of the tumor, scaled to [0, 1]."""
+    dist = ndimage.distance_transform_edt(mask_slice)
+    peak = dist.max()
+    return dist / peak if peak > 0 else dist
+
+
+# ================= COMPOSITING =================
+def overlay(grey, mask, size=OUTPUT_SIZE):
+    """CT + translucent red fill + red outline, as a BGR image."""
+    scale = _scale(grey.shape, size)
+    grey = _resize(grey, scale, cv2.INTER_LINEAR)
+    mask = _resize(mask.astype(np.uint8), scale, cv2.INTER_NEAREST)
+
+    out = cv2.cvtColor(grey, cv2.COLOR_GRAY2BGR)
+    inside = mask > 0
+    if inside.any():
+        fill = np.asarray(FILL_COLOR, dtype=np.float32)
+        out[inside] = (out[inside] * (1 - FILL_ALPHA) + fill * FILL_ALPHA).astype(np.uint8)
+        contours, _ = cv2.findContours(mask, cv2.RETR_LIST, cv2.CHAIN_APPROX_NONE)
+        cv2.drawContours(out, contours, -1, CONTOUR_COLOR, CONTOUR_THICKNESS, cv2.LINE_AA)
+    return out
+
+
+def segmentation(mask, size=OUTPUT_SIZE):
+    """Mask only, white on black."""
+    seg = (mask > 0).astype(np.uint8) * 255
+    return _resize(seg, _scale(seg.shape, size), cv2.INTER_NEAREST)
+
+
+def xai_overlay(grey, weights, size=OUTPUT_SIZE):
+    """CT blended with a JET heatmap of `weights` (floats in [0, 1])."""
+    scale = _scale(grey.shape, size)
+    ct_rgb = cv2.cvtColor(_resize(grey, scale, cv2.INTER_LINEAR), cv2.COLOR_GRAY2BGR)
+    heat = (np.clip(weights, 0, 1) * 255).astype(np.uint8)
+    heat = cv2.applyColorMap(_resize(heat, scale, cv2.INTER_LINEAR), cv2.COLORMAP_JET)
+    return cv2.addWeighted(ct_rgb, 1 - XAI_ALPHA, heat, XAI_ALPHA, 0)
+
+
+# ================= ENCODING =================
+def encode(img, fmt="png", quality=90):
+    params = []
+    if fmt == "png":
+        params = [cv2.IMWRITE_PNG_COMPRESSION, 1]   # fast; files are small anyway
+    elif fmt == "webp":
+        params = [cv2.IMWRITE_WEBP_QUALITY, quality]
+    ok, buf = cv2.imencode("." + fmt, img, params)
+    if not ok:
+        raise ValueError(f"Could not encode image as {fmt}")
+    return buf.tobytes()
+
+
+def render_slice(ct_slice, mask_slice, weights=None, fmt="png", size=OUTPUT_SIZE, window=None):
+    """
+    All three views of one axial slice, encoded. Returns
+    {"overlay": bytes, "segmentation": bytes, "xai_overlay": bytes}.
+    """
+    grey = to_uint8(ct_slice, window)
+    mask = (np.asarray(mask_slice) > 0).astype(np.uint8)
+    if weights is None:
+        weights = heatmap_weights(mask)
+    return {
+        "overlay": encode(overlay(grey, mask, size), fmt),
+        "segmentation": encode(segmentation(mask, size), fmt),
+        "xai_overlay": encode(xai_overlay(grey, weights, size), fmt)
+    }
+
+
+def save_images(buffers, output_dir, fmt="png"):
+    """Write encoded views to `output_dir`; returns paths in IMAGE_NAMES order."""
+    paths = []
+    for name in IMAGE_NAMES:
+        path = os.path.join(output_dir, f"{name}.{fmt}")
+        with open(path, "wb") as f:
+            f.write(buffers[name])
+        paths.append(path)
+    return paths
@@ -0,0 +1,206 @@
+import errno
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(BASE_DIR, "cache")
+CACHE_MAX_BYTES = int(float(os.getenv("RESULT_CACHE_MAX_MB", "2048")) * 1024 * 1024)
+
+CHUNK = 1024 * 1024
+
+
+# ================= HASHING =================
+def hash_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+_checkpoint_ids = {}
+
+
+def checkpoint_id(path):
+    """Content hash of a checkpoint, memoized per (path, size, mtime)."""
+    st = os.stat(path)
+    key = (os.path.realpath(path), st.st_size, st.st_mtime_ns)
+    if key not in _checkpoint_ids:
+        _checkpoint_ids[key] = hash_file(path)
+    return _checkpoint_ids[key]
+
+
+def cache_key(volume_hash, checkpoint_hash, version=""):
+    """`version` lets the analysis code invalidate entries when its outputs change."""
+    return hashlib.sha256(f"{volume_hash}:{checkpoint_hash}:{version}".encode()).hexdigest()
+
+
+def _link_or_copy(src, dst):
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+# ================= CACHE =================
+class ResultCache:
+    """
+    On-disk cache of finished analyses, keyed on (volume hash, checkpoint
+    hash). Each entry is a directory holding the predicted mask, the
+    rendered PNGs and `metrics.json`; `index.db` tracks entry sizes and
+    last access so the least recently used entries are evicted once the
+    cache grows past `max_bytes`. Hit/miss counters live in the same
+    database so every worker process contributes to them.
+    """
+
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+        self.db_path = os.path.join(root, "index.db")
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS entries (
+            key TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            last_access REAL NOT NULL
+        )
+        ''')
+        conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO stats VALUES ('hits', 0), ('misses', 0), ('evictions', 0)")
+        conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def _bump(self, conn, name, n=1):
+        conn.execute("UPDATE stats SET value = value + ? WHERE name = ?", (n, name))
+
+    def _entry_dir(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, key, output_dir):
+        """
+        On a hit, hard-link the cached artifacts into `output_dir` and
+        return the stored metrics dict (artifact paths rewritten to
+        `output_dir`). Returns None on a miss.
+        """
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT key FROM entries WHERE key = ?", (key,)).fetchone()
+            entry = self._entry_dir(key)
+            meta_path = os.path.join(entry, "metrics.json")
+            if row is None or not os.path.exists(meta_path):
+                self._bump(conn, "misses")
+                return None
+
+            with open(meta_path) as f:
+                meta = json.load(f)
+
+            os.makedirs(output_dir, exist_ok=True)
+            for name in meta["files"]:
+                _link_or_copy(os.path.join(entry, name), os.path.join(output_dir, name))
+
+            conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._bump(conn, "hits")
+            return meta["metrics"]
+        finally:
+            conn.close()
+
+    def put(self, key, metrics, files):
+        """Store `metrics` and copies of the artifact `files` under `key`."""
+        entry = self._entry_dir(key)
+        suffix = f"{os.getpid()}-{threading.get_ident()}"
+        tmp = entry + f".tmp{suffix}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+
+        size = 0
+        names = []
+        for path in files:
+            name = os.path.basename(path)
+            _link_or_copy(path, os.path.join(tmp, name))
+            size += os.path.getsize(path)
+            names.append(name)
+
+        with open(os.path.join(tmp, "metrics.json"), "w") as f:
+            json.dump({"metrics": metrics, "files": names}, f)
+
+        # move any previous entry aside (atomic), then swap ours in
+        old = entry + f".old{suffix}"
+        try:
+            os.replace(entry, old)
+        except FileNotFoundError:
+            pass
+        try:
+            os.replace(tmp, entry)
+        except OSError as e:
+            if e.errno not in (errno.ENOTEMPTY, errno.EEXIST):
+                raise
+            # another worker stored the same key in between; same key,
+            # same result, so keep theirs
+            shutil.rmtree(tmp, ignore_errors=True)
+        shutil.rmtree(old, ignore_errors=True)
+
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, size, last_access) VALUES (?, ?, ?)",
+            (key, size, time.time())
+        )
+        conn.close()
+        self.evict()
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits `max_bytes`."""
+        conn = self._connect()
+        try:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes:
+                return 0
+
+            evicted = 0
+            for key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall():
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                total -= size
+                evicted += 1
+            self._bump(conn, "evictions", evicted)
+            return evicted
+        finally:
+            conn.close()
+
+    def stats(self):
+        conn = self._connect()
+        stats = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+        entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        conn.close()
+
+        lookups = stats["hits"] + stats["misses"]
+        stats.update({
+            "entries": entries,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes,
+            "hit_rate": stats["hits"] / lookups if lookups else 0.0
+        })
+        return stats
+
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = ResultCache()
+    return _cache
@@ -0,0 +1,293 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from telemetry import span
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# ================= nnUNet PATHS =================
+os.environ.setdefault("nnUNet_raw", os.path.join(BASE_DIR, "nnUNet_raw"))
+os.environ.setdefault("nnUNet_preprocessed", os.path.join(BASE_DIR, "nnUNet_preprocessed"))
+os.environ.setdefault("nnUNet_results", os.path.join(BASE_DIR, "nnUNet_results"))
+
+# Same model selection as the old `nnUNetv2_predict -d 0 -c 3d_fullres -f 0` call
+CHECKPOINT = os.path.join(BASE_DIR, "checkpoint_best.pth")
+DATASET_ID = "0"
+CONFIGURATION = "3d_fullres"
+TRAINER = "nnUNetTrainer"
+PLANS = "nnUNetPlans"
+FOLD = 0
+
+# "full" runs the sliding window over the whole volume. "cascade" first
+# runs a cheap pass (no mirroring, no tile overlap) to find the pancreas,
+# then full-quality inference on a padded crop around it only.
+MODES = ("full", "cascade")
+SEGMENTATION_MODE = os.getenv("SEGMENTATION_MODE", "full")
+CASCADE_MARGIN_MM = float(os.getenv("CASCADE_MARGIN_MM", "20"))
+COARSE_TILE_STEP = 1.0
+
+# CPU execution (see cpu_inference.py). TTA is "all" (the mirror axes the
+# model was trained with), "none", or a subset of spatial axes, e.g. "2";
+# each mirrored axis doubles the network passes.
+BACKENDS = ("torch", "torchscript", "onnx")
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+QUANTIZE = os.getenv("INFERENCE_QUANTIZE", "0") == "1"
+TTA = os.getenv("INFERENCE_TTA", "all")
+TILE_STEP_SIZE = float(os.getenv("INFERENCE_TILE_STEP", "0.5"))
+
+
+def parse_tta(value):
+    """None for the model's own mirror axes, () for none, else a tuple of axes."""
+    value = str(value).strip().lower()
+    if value == "all":
+        return None
+    if value in ("none", "off", ""):
+        return ()
+    axes = tuple(sorted({int(a) for a in value.split(",")}))
+    if any(a not in (0, 1, 2) for a in axes):
+        raise ValueError(f"TTA axes must be in 0, 1, 2 (z, y, x); got {value!r}")
+    return axes
+
+
+class SegmentationResult:
+    """
+    Output of one nnU-Net run. `label_map` is indexed like nibabel
+    data (x, y, z) so it can be used exactly like `nib.load(...).dataobj`.
+    """
+
+    def __init__(self, label_map, spacing, properties, seconds, roi=None):
+        self.label_map = label_map
+        self.spacing = spacing
+        self.properties = properties
+        self.seconds = seconds
+        self.roi = roi      # cascade only: ((x0, x1), (y0, y1), (z0, z1)) refined at full quality
+
+    @property
+    def mask(self):
+        return (self.label_map > 0).astype(np.uint8)
+
+
+class SegmentationEngine:
+    """
+    Long-lived nnU-Net predictor. The network and checkpoint are loaded
+    once on first use and kept warm for every following case handled by
+    this process.
+    """
+
+    def __init__(self, checkpoint=CHECKPOINT, device="cpu", mode=SEGMENTATION_MODE, backend=INFERENCE_BACKEND,
+                 quantize=QUANTIZE, tta=TTA, tile_step_size=TILE_STEP_SIZE):
+        if mode not in MODES:
+            raise ValueError(f"Unknown segmentation mode {mode!r}; expected one of {MODES}")
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown inference backend {backend!r}; expected one of {BACKENDS}")
+        if quantize and backend != "onnx":
+            raise ValueError("int8 quantization needs the onnx backend")
+        self.checkpoint = checkpoint
+        self.device = device
+        self.mode = mode
+        self.backend = backend
+        self.quantize = quantize
+        self.mirror_axes = parse_tta(tta)
+        self.tile_step_size = float(tile_step_size)
+        self.predictor = None
+        self.load_seconds = None
+        self._lock = threading.Lock()
+        # the predictor is shared (get_engine) and _settings mutates it, so
+        # one inference at a time per engine
+        self._infer_lock = threading.Lock()
+
+    def load(self):
+        if self.predictor is not None:
+            return self.predictor
+
+        # torch / nnU-Net are imported here too, so the span covers them
+        with self._lock, span("engine.load"):
+            if self.predictor is None:
+                import torch
+                from nnunetv2.inference.predict_from_raw_data import nnUNetPredictor
+                from nnunetv2.utilities.file_path_utilities import get_output_folder
+
+                t0 = time.perf_counter()
+                predictor = nnUNetPredictor(
+                    tile_step_size=self.tile_step_size,
+                    use_gaussian=True,
+                    use_mirroring=self.mirror_axes != (),
+                    device=torch.device(self.device),
+                    verbose=False,
+                    verbose_preprocessing=False,
+                    allow_tqdm=False
+                )
+                model_folder = get_output_folder(DATASET_ID, TRAINER, PLANS, CONFIGURATION)
+                predictor.initialize_from_trained_model_folder(
+                    model_folder,
+                    use_folds=(FOLD,),
+                    checkpoint_name=self.checkpoint
+                )
+                if self.mirror_axes and predictor.allowed_mirroring_axes:
+                    predictor.allowed_mirroring_axes = tuple(
+                        a for a in predictor.allowed_mirroring_axes if a in self.mirror_axes
+                    )
+                if self.backend != "torch":
+                    from cpu_inference import compile_network
+                    predictor.network = compile_network(predictor, self.checkpoint, self.backend, self.quantize)
+                self.load_seconds = time.perf_counter() - t0
+                self.predictor = predictor
+
+        return self.predictor
+
+    @property
+    def is_loaded(self):
+        return self.predictor is not None
+
+    @property
+    def cache_tag(self):
+        """Distinguishes cached results of non-default modes and inference settings."""
+        parts = []
+        if self.mode != "full":
+            parts.append(self.mode)
+        if self.backend != "torch":
+            parts.append(self.backend + ("-int8" if self.quantize else ""))
+        if self.mirror_axes is not None:
+            parts.append("tta" + ("".join(map(str, self.mirror_axes)) or "off"))
+        if self.tile_step_size != 0.5:
+            parts.append(f"step{self.tile_step_size:g}")
+        return "-".join(parts)
+
+    # ================= INFERENCE =================
+    @contextmanager
+    def _settings(self, tile_step_size, use_mirroring):
+        """Temporarily change the predictor's settings; hold _infer_lock."""
+        predictor = self.predictor
+        saved = predictor.tile_step_size, predictor.use_mirroring
+        predictor.tile_step_size, predictor.use_mirroring = tile_step_size, use_mirroring
+        try:
+            yield
+        finally:
+            predictor.tile_step_size, predictor.use_mirroring = saved
+
+    def _min_crop(self, spacing):
+        """One network patch, in input voxels: smaller crops gain nothing."""
+        cm = self.predictor.configuration_manager
+        return [int(np.ceil(p * t / s)) for p, t, s in zip(cm.patch_size, cm.spacing, spacing)]
+
+    def _predict(self, images, properties):
+        """
+        (z, y, x) label map for a (c, z, y, x) image. Returns (seg, roi)
+        with `roi` the refined region in (z, y, x), or None.
+        """
+        predictor = self.load()
+        with self._infer_lock:
+            return self._predict_locked(predictor, images, properties)
+
+    def _predict_locked(self, predictor, images, properties):
+        if self.mode == "full":
+            with span("segment.predict"):
+                return predictor.predict_single_npy_array(images, properties, None, None, False), None
+
+        # nnU-Net adds its preprocessing state to the properties, so each pass gets a copy
+        with span("segment.coarse"), self._settings(COARSE_TILE_STEP, False):
+            coarse = predictor.predict_single_npy_array(images, dict(properties), None, None, False)
+
+        roi = roi_bounds(coarse > 0, properties["spacing"], CASCADE_MARGIN_MM, self._min_crop(properties["spacing"]))
+        if roi is None:
+            # nothing found cheaply; do not risk missing a small lesion
+            with span("segment.predict"):
+                return predictor.predict_single_npy_array(images, dict(properties), None, None, False), None
+
+        crop = tuple(slice(a, b) for a, b in roi)
+        with span("segment.fine"):
+            fine = predictor.predict_single_npy_array(
+                np.ascontiguousarray(images[(slice(None),) + crop]), dict(properties), None, None, False
+            )
+        seg = np.zeros(images.shape[1:], dtype=fine.dtype)
+        seg[crop] = fine
+        return seg, roi
+
+    def segment(self, volume_path, output_path=None):
+        """
+        Segment one NIfTI volume. If `output_path` is given the predicted
+        label map is also written there as NIfTI.
+        """
+        predictor = self.load()
+        reader = predictor.plans_manager.image_reader_writer_class()
+
+        t0 = time.perf_counter()
+        with span("segment.read"):
+            images, properties = reader.read_images([volume_path])
+        seg, roi = self._predict(images, properties)
+
+        if output_path is not None:
+            reader.write_seg(seg, output_path, properties)
+
+        # nnU-Net readers return (z, y, x); flip back to nibabel's (x, y, z)
+        label_map = np.ascontiguousarray(seg.transpose(2, 1, 0))
+        spacing = tuple(float(s) for s in properties["spacing"][::-1])
+
+        return SegmentationResult(label_map, spacing, properties, time.perf_counter() - t0,
+                                  roi[::-1] if roi else None)
+
+    def segment_array(self, volume, spacing, affine, output_path=None):
+        """
+        Segment an in-memory (x, y, z) volume, e.g. a decoded DICOM series,
+        without writing it to disk first. `spacing` is (x, y, z) in mm.
+        """
+        import nibabel as nib
+
+        t0 = time.perf_counter()
+        # nnU-Net wants (c, z, y, x); for a transposed view this is free
+        images = np.asarray(volume, dtype=np.float32).transpose(2, 1, 0)[None]
+        properties = {"spacing": [float(s) for s in spacing[::-1]]}
+        seg, roi = self._predict(images, properties)
+
+        label_map = np.ascontiguousarray(seg.transpose(2, 1, 0))
+        if output_path is not None:
+            nib.save(nib.Nifti1Image(label_map.astype(np.uint8), affine), output_path)
+
+        return SegmentationResult(label_map, tuple(float(s) for s in spacing), properties,
+                                  time.perf_counter() - t0, roi[::-1] if roi else None)
+
+
+def roi_bounds(mask, spacing, margin_mm, min_size=None):
+    """
+    [(start, stop), ...] per axis of the foreground of `mask`, padded by
+    `margin_mm` and grown symmetrically to at least `min_size` voxels.
+    None if the mask is empty.
+    """
+    if not mask.any():
+        return None
+    bounds = []
+    for axis, n in enumerate(mask.shape):
+        others = tuple(a for a in range(mask.ndim) if a != axis)
+        idx = np.flatnonzero(mask.any(axis=others))
+        pad = int(np.ceil(margin_mm / spacing[axis]))
+        start, stop = max(0, idx[0] - pad), min(n, idx[-1] + 1 + pad)
+
+        need = (min_size[axis] if min_size else 0) - (stop - start)
+        if need > 0:
+            start = max(0, start - need // 2 - need % 2)
+            stop = min(n, start + max(stop - start, min_size[axis]))
+            start = max(0, stop - min_size[axis])
+        bounds.append((int(start), int(stop)))
+    return bounds
+
+
+# ================= PER-WORKER ENGINE =================
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = SegmentationEngine()
+    return _engine
+
+
+def segment(volume_path, output_path=None):
+    return get_engine().segment(volume_path, output_path)
@@ -0,0 +1,148 @@
+import json
+import os
+
+import cv2
+import numpy as np
+
+import rendering
+from mask_codec import MASK_FILE, PackedMask
+from xai import XAI_FILE, Heatmaps
+
+# Files written next to the other case outputs (flat, so the result cache
+# can store them like any other artifact). The mask is read from the
+# case's packed prediction (mask_codec.MASK_FILE).
+CT_FILE = "viewer_ct.npy"
+META_FILE = "viewer_meta.json"
+STORE_FILES = (CT_FILE, META_FILE)
+LEGACY_MASK_FILE = "viewer_mask.npy"    # dense mask of cases stored before masks were packed
+
+MAX_INPLANE = 256      # in-plane size of the stored slices
+CHUNK_SLICES = 32      # CT slices converted per read
+PLANES = ("axial", "coronal", "sagittal")
+
+
+# ================= WRITING =================
+def _intensity_range(ct, step=8):
+    """Robust grey range from a strided subsample of axial slices."""
+    sample = np.concatenate([np.asarray(ct.axial(z)).ravel()[::7] for z in range(0, ct.shape[2], step)])
+    lo, hi = np.percentile(sample, [0.5, 99.5])
+    return float(lo), float(max(hi, lo + 1e-6))
+
+
+def write_store(ct, output_dir, max_inplane=MAX_INPLANE):
+    """
+    Write a compact per-case slice store: the CT as uint8, downsampled
+    in-plane to `max_inplane` and laid out (z, x, y) so every axial slice
+    is one contiguous block of the .npy file.
+
+    `ct` is a volume_io.CTVolume; it is read `CHUNK_SLICES` axial slices at
+    a time, so the full-resolution volume is never held in memory.
+    """
+    nx, ny, nz = ct.shape
+    factor = max(1, int(np.ceil(max(nx, ny) / max_inplane)))
+    sx, sy = -(-nx // factor), -(-ny // factor)
+    lo, hi = _intensity_range(ct)
+
+    ct_out = np.lib.format.open_memmap(
+        os.path.join(output_dir, CT_FILE), mode="w+", dtype=np.uint8, shape=(nz, sx, sy)
+    )
+    for z0 in range(0, nz, CHUNK_SLICES):
+        z1 = min(nz, z0 + CHUNK_SLICES)
+        slab = np.asarray(ct.slab(z0, z1 - 1), dtype=np.float32)
+        for k in range(z1 - z0):
+            s = cv2.resize(slab[:, :, k], (sy, sx), interpolation=cv2.INTER_AREA)
+            ct_out[z0 + k] = np.clip((s - lo) * (255.0 / (hi - lo)), 0, 255).astype(np.uint8)
+    ct_out.flush()
+    del ct_out
+
+    meta = {
+        "shape": [nx, ny, nz],
+        "factor": factor,
+        "spacing": list(ct.spacing),
+        "range": [lo, hi]
+    }
+    with open(os.path.join(output_dir, META_FILE), "w") as f:
+        json.dump(meta, f)
+    return [os.path.join(output_dir, name) for name in STORE_FILES]
+
+
+# ================= READING =================
+class SliceStore:
+    """Memory-mapped view of a case's slice store; one small read per slice."""
+
+    def __init__(self, case_dir):
+        with open(os.path.join(case_dir, META_FILE)) as f:
+            self.meta = json.load(f)
+        self.case_dir = case_dir
+        self.ct = np.load(os.path.join(case_dir, CT_FILE), mmap_mode="r")
+        self.heatmaps = None
+        self.factor = self.meta["factor"]
+        self.spacing = self.meta["spacing"]
+        self.packed, self.legacy_mask = None, None
+        if os.path.exists(os.path.join(case_dir, MASK_FILE)):
+            self.packed = PackedMask.load(os.path.join(case_dir, MASK_FILE))
+        else:
+            self.legacy_mask = np.load(os.path.join(case_dir, LEGACY_MASK_FILE), mmap_mode="r")
+
+    @staticmethod
+    def exists(case_dir):
+        return (all(os.path.exists(os.path.join(case_dir, name)) for name in STORE_FILES)
+                and any(os.path.exists(os.path.join(case_dir, name)) for name in (MASK_FILE, LEGACY_MASK_FILE)))
+
+    def count(self, plane):
+        """Number of slices along `plane`, in original voxel indices."""
+        return self.meta["shape"][{"sagittal": 0, "coronal": 1, "axial": 2}[plane]]
+
+    def slice(self, plane, index):
+        """
+        (grey, mask) 2D arrays for one slice; `index` is in original voxel
+        coordinates. Coronal and sagittal slices are returned superior-up
+        and stretched to the physical slice thickness.
+        """
+        if not 0 <= index < self.count(plane):
+            raise IndexError(f"{plane} index {index} out of range")
+
+        if plane == "axial":
+            return np.asarray(self.ct[index]), self._mask(2, index)
+
+        i = index // self.factor
+        if plane == "coronal":
+            grey, mask = self.ct[:, :, i], self._mask(1, i * self.factor)
+            in_plane = self.spacing[0] * self.factor
+        else:
+            grey, mask = self.ct[:, i, :], self._mask(0, i * self.factor)
+            in_plane = self.spacing[1] * self.factor
+
+        grey, mask = np.ascontiguousarray(grey[::-1]), np.ascontiguousarray(mask[::-1])
+        stretch = self.spacing[2] / in_plane
+        if abs(stretch - 1) > 0.05:
+            h, w = grey.shape
+            size = (w, max(1, int(round(h * stretch))))
+            grey = cv2.resize(grey, size, interpolation=cv2.INTER_LINEAR)
+            mask = cv2.resize(mask, size, interpolation=cv2.INTER_NEAREST)
+        return grey, mask
+
+    def _mask(self, axis, index):
+        """Mask slice laid out like the CT store: downsampled in-plane, z first for coronal / sagittal."""
+        f = self.factor
+        if self.legacy_mask is not None:
+            m = self.legacy_mask
+            return np.asarray(m[index] if axis == 2 else m[:, :, index // f] if axis == 1 else m[:, index // f, :])
+        s = (self.packed.plane(axis, index) > 0).astype(np.uint8)
+        return s[::f, ::f] if axis == 2 else np.ascontiguousarray(s[::f].T)
+
+    def heatmap(self, index):
+        """
+        Axial XAI weights at store resolution, looked up in the case's
+        precomputed 3D heatmaps. FileNotFoundError for cases without them.
+        """
+        if self.heatmaps is None:
+            self.heatmaps = Heatmaps.load(os.path.join(self.case_dir, XAI_FILE))
+        return self.heatmaps.axial(index)[::self.factor, ::self.factor]
+
+    def render(self, plane, index, fmt="png", size=384, layer="overlay"):
+        """`layer` is "overlay" or, for axial slices, "xai"."""
+        grey, mask = self.slice(plane, index)
+        if layer == "xai":
+            return rendering.encode(rendering.xai_overlay(grey, self.heatmap(index), size), fmt)
+        return rendering.encode(rendering.overlay(grey, mask, size), fmt)
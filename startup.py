@@ -0,0 +1,88 @@
+import gc
+import importlib
+import os
+import sys
+import time
+
+# What a worker needs for its first case, roughly in import-cost order.
+# Optional ones are skipped if not installed.
+HEAVY_MODULES = (
+    "numpy",
+    "scipy.ndimage",
+    "scipy.spatial",
+    "cv2",
+    "nibabel",
+    "pandas",
+    "sklearn.ensemble",
+)
+# Only needed where inference runs (job workers), not in the web processes
+ENGINE_MODULES = (
+    "torch",
+    "nnunetv2.inference.predict_from_raw_data",
+)
+APP_MODULES = ("Analyzer", "pipeline", "lab_fast")
+
+
+def process_age():
+    """Seconds since this process started (Linux), or None."""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, IndexError, ValueError):
+        return None
+    return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+
+
+def preload(engine=True, lab=True, modules=None):
+    """
+    Import the heavy libraries and load the models in this process, then
+    freeze the garbage collector. Done in a master before it forks,
+    workers share these pages copy-on-write instead of each importing
+    and loading its own copy; `gc.freeze` keeps collections in the
+    workers from touching (and so copying) the preloaded objects.
+
+    `modules` defaults to HEAVY_MODULES + APP_MODULES, plus torch and
+    nnU-Net (ENGINE_MODULES) only if `engine`. Returns {step: seconds}.
+    """
+    if modules is None:
+        modules = HEAVY_MODULES + (ENGINE_MODULES if engine else ()) + APP_MODULES
+    timings = {}
+    for name in modules:
+        if name in sys.modules:
+            continue
+        t0 = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            continue
+        timings[f"import {name}"] = time.perf_counter() - t0
+
+    if lab:
+        from lab_prediction import load_model
+        t0 = time.perf_counter()
+        try:
+            load_model()
+            timings["load lab model"] = time.perf_counter() - t0
+        except OSError as e:
+            print(f"[preload] lab model not loaded: {e}")
+
+    if engine:
+        from segmentation_engine import get_engine
+        t0 = time.perf_counter()
+        try:
+            get_engine().load()
+            timings["load nnU-Net"] = time.perf_counter() - t0
+        except Exception as e:
+            print(f"[preload] nnU-Net not loaded: {e!r}")
+
+    gc.collect()
+    gc.freeze()
+    return timings
+
+
+def report(timings, label="startup"):
+    for step, seconds in timings.items():
+        print(f"[{label}] {step:<50} {seconds:7.3f}s")
+    print(f"[{label}] {'total':<50} {sum(timings.values()):7.3f}s")
@@ -0,0 +1,235 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from result_cache import CACHE_DIR
+
+SUMMARY_BACKEND = os.getenv("SUMMARY_BACKEND", "gemini")     # "gemini" or "stub"
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+SUMMARY_TIMEOUT = float(os.getenv("SUMMARY_TIMEOUT", "30"))    # seconds per attempt
+SUMMARY_RETRIES = int(os.getenv("SUMMARY_RETRIES", "2"))       # extra attempts after the first
+RETRY_BACKOFF = 1.0
+SUMMARY_THREADS = 4
+
+# Bump when the prompt changes so old summaries are not served
+PROMPT_VERSION = "1"
+
+UNAVAILABLE = "<div><p><i>AI summary unavailable: {reason}</i></p></div>"
+
+
+def build_prompt(report, volume, max_diameter, stage):
+    return f"""
+<div>
+
+<p><b>Radiology Report:</b></p>
+<p>{report}</p>
+
+<p><b>AI Predictions (use as given):</b></p>
+<ul>
+  <li>Tumor volume: {float(volume)/1000:.2f} mL</li>
+  <li>Tumor maximum diameter: {max_diameter:.2f} mm</li>
+  <li>Lab-based predicted stage: {stage}</li>
+</ul>
+
+<p><b>Tasks:</b></p>
+<ol>
+  <li>Highlight only the exact phrases from the report that indicate tumor or malignancy using <mark> tags.</li>
+  <li>Briefly summarize tumor size and extent using the provided imaging values.</li>
+  <li>Briefly restate the lab-based stage prediction.</li>
+  <li>Provide concise clinical recommendations in bullet points.</li>
+</ol>
+
+<p><b>Rules:</b></p>
+<ul>
+  <li>Do not validate, compare, or question predictions</li>
+  <li>No TNM or staging logic</li>
+  <li>No inconsistency analysis</li>
+  <li>HTML only, start with &lt;div&gt;</li>
+</ul>
+
+</div>
+"""
+
+
+# ================= BACKENDS =================
+class GeminiBackend:
+    """
+    One independent `generate_content` call per summary. There is no chat
+    session, so nothing is carried over between cases or users.
+    """
+
+    name = "gemini"
+
+    def __init__(self, model_name=GEMINI_MODEL, api_key=None):
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key or os.getenv("GEMINI_API_KEY"))
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt, timeout):
+        return self.model.generate_content(prompt, request_options={"timeout": timeout}).text
+
+
+class StubBackend:
+    """
+    Offline stand-in with a configurable latency, for tests and
+    benchmarks. Returns a fixed-shape HTML summary of the prompt values.
+    """
+
+    name = "stub"
+    model_name = "stub"
+
+    def __init__(self, latency=None):
+        self.latency = float(os.getenv("SUMMARY_STUB_LATENCY", "0.5")) if latency is None else latency
+        self.calls = 0
+
+    def generate(self, prompt, timeout):
+        self.calls += 1
+        time.sleep(min(self.latency, timeout))
+        if self.latency > timeout:
+            raise TimeoutError(f"stub backend exceeded {timeout:.1f}s")
+        facts = [line.strip()[4:-5] for line in prompt.splitlines() if line.strip().startswith("<li>Tumor")
+                 or line.strip().startswith("<li>Lab-based")]
+        items = "".join(f"<li>{fact}</li>" for fact in facts)
+        return f"<div><p><b>Summary (offline stub)</b></p><ul>{items}</ul></div>"
+
+
+BACKENDS = {"gemini": GeminiBackend, "stub": StubBackend}
+
+
+# ================= CACHE =================
+class SummaryCache:
+    """
+    Generated summaries keyed on (report, volume, diameter, stage, model,
+    prompt version). Stored in SQLite next to the result cache so every
+    worker process shares it.
+    """
+
+    def __init__(self, root=CACHE_DIR):
+        os.makedirs(root, exist_ok=True)
+        self.db_path = os.path.join(root, "summaries.db")
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS summaries (
+            key TEXT PRIMARY KEY,
+            text TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+        ''')
+        conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def get(self, key):
+        conn = self._connect()
+        row = conn.execute("SELECT text FROM summaries WHERE key = ?", (key,)).fetchone()
+        conn.close()
+        return row[0] if row else None
+
+    def put(self, key, text):
+        conn = self._connect()
+        conn.execute("INSERT OR REPLACE INTO summaries VALUES (?, ?, ?)", (key, text, time.time()))
+        conn.close()
+
+
+def summary_key(report, volume, max_diameter, stage, model_name):
+    # rounded the same way the prompt prints them, so equal prompts share a key
+    parts = [PROMPT_VERSION, model_name, report or "", f"{float(volume) / 1000:.2f}",
+             f"{float(max_diameter):.2f}", str(stage)]
+    return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+
+# ================= SERVICE =================
+class Summarizer:
+    """
+    Asynchronous, cached report summaries. `submit` returns a Future right
+    away; identical requests already in flight share one backend call, and
+    finished summaries come from the cache. Each attempt is bounded by
+    `timeout` and failed attempts are retried with exponential backoff.
+    Errors never propagate: the Future resolves to a short notice instead,
+    and failures are not cached. Pass `cache=False` to disable caching.
+    """
+
+    def __init__(self, backend=None, cache=None, timeout=SUMMARY_TIMEOUT, retries=SUMMARY_RETRIES,
+                 threads=SUMMARY_THREADS):
+        self.backend = backend or BACKENDS[SUMMARY_BACKEND]()
+        self.cache = SummaryCache() if cache is None else (cache or None)
+        self.timeout = timeout
+        self.retries = retries
+        self._pool = ThreadPoolExecutor(threads, thread_name_prefix="summary")
+        self._inflight = {}
+        self._lock = threading.RLock()     # a finished future runs its callback inline
+
+    def submit(self, report, volume, max_diameter, stage):
+        key = summary_key(report, volume, max_diameter, stage, self.backend.model_name)
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                prompt = build_prompt(report, volume, max_diameter, stage)
+                future = self._inflight[key] = self._pool.submit(self._summarize, key, prompt)
+                future.add_done_callback(lambda _: self._forget(key))
+        return future
+
+    def summarize(self, report, volume, max_diameter, stage):
+        return self.submit(report, volume, max_diameter, stage).result()
+
+    def _forget(self, key):
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def _summarize(self, key, prompt):
+        if self.cache:
+            text = self.cache.get(key)
+            if text is not None:
+                return text
+
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
+            try:
+                text = self.backend.generate(prompt, self.timeout)
+            except Exception as e:
+                error = e
+                print(f"Summary attempt {attempt + 1} failed: {e!r}")
+                continue
+            if self.cache:
+                self.cache.put(key, text)
+            return text
+        return UNAVAILABLE.format(reason=type(error).__name__)
+
+
+_summarizer = None
+_summarizer_lock = threading.Lock()
+
+
+def get_summarizer():
+    """Per-process summarizer (thread pool and backend client are not fork-safe)."""
+    global _summarizer
+    with _summarizer_lock:
+        if _summarizer is None:
+            _summarizer = Summarizer()
+        return _summarizer
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize a radiology report")
+    parser.add_argument("report")
+    parser.add_argument("--volume", type=float, default=0.0, help="mm³")
+    parser.add_argument("--diameter", type=float, default=0.0, help="mm")
+    parser.add_argument("--stage", default="Unknown")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=SUMMARY_BACKEND)
+    args = parser.parse_args()
+
+    summarizer = Summarizer(BACKENDS[args.backend]())
+    t0 = time.perf_counter()
+    print(summarizer.summarize(args.report, args.volume, args.diameter, args.stage))
+    print(f"{time.perf_counter() - t0:.2f}s")
@@ -0,0 +1,308 @@
+import collections
+import contextvars
+import os
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+METRICS_DB = os.path.join(BASE_DIR, "metrics.db")
+
+# Wall-time histogram buckets (seconds); stages range from ms (lab model)
+# to minutes (nnU-Net on CPU)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, float("inf"))
+RSS_INTERVAL = 0.02
+PROFILE_INTERVAL = 0.005
+PROFILE_FILE = "profile.folded"
+PREFIX = "pancreas"
+
+_current = contextvars.ContextVar("trace", default=None)
+
+
+# ================= MEMORY =================
+_PAGE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def current_rss():
+    """Resident set size of this process in bytes."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE
+    except OSError:
+        import resource
+        # not Linux: fall back to the lifetime peak (KiB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+# ================= TRACES =================
+class Trace:
+    """
+    Per-request record of wall time, process CPU time and peak RSS for
+    each stage. RSS is sampled by a background thread while the trace is
+    open, so a stage's peak is the highest process RSS seen while it ran.
+    CPU time is the process total over the stage's window, which includes
+    torch/OpenMP worker threads (and any stage running alongside it).
+    """
+
+    def __init__(self, name="request"):
+        self.name = name
+        self.spans = []
+        self.error = None
+        self._samples = collections.deque()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        self._cpu0 = time.process_time()
+        self._rss0 = current_rss()
+        self._sampler = threading.Thread(target=self._sample, name="rss-sampler", daemon=True)
+        self._sampler.start()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        self._stop.set()
+        self._sampler.join()
+        self.seconds = time.perf_counter() - self._t0
+        self.cpu_seconds = time.process_time() - self._cpu0
+        self.peak_rss = max([self._rss0] + [rss for _, rss in self._samples])
+        if exc is not None:
+            self.error = type(exc).__name__
+        return False
+
+    def _sample(self):
+        while not self._stop.wait(RSS_INTERVAL):
+            self._samples.append((time.perf_counter(), current_rss()))
+
+    def _peak(self, start, end, rss_start):
+        return max([rss_start, current_rss()] + [rss for t, rss in list(self._samples) if start <= t <= end])
+
+    @contextmanager
+    def span(self, name):
+        start, cpu0, rss0 = time.perf_counter(), time.process_time(), current_rss()
+        error = None
+        token = _current.set(self)
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            _current.reset(token)
+            end = time.perf_counter()
+            record = {
+                "name": name,
+                "start": start - self._t0,
+                "seconds": end - start,
+                "cpu_seconds": time.process_time() - cpu0,
+                "peak_rss": self._peak(start, end, rss0),
+                "rss_delta": current_rss() - rss0,
+                "error": error
+            }
+            with self._lock:
+                self.spans.append(record)
+
+    def to_dict(self):
+        return {
+            "seconds": round(self.seconds, 4),
+            "cpu_seconds": round(self.cpu_seconds, 4),
+            "peak_rss_mb": round(self.peak_rss / 2**20, 1),
+            "stages": {
+                s["name"]: {
+                    "start": round(s["start"], 4),
+                    "seconds": round(s["seconds"], 4),
+                    "cpu_seconds": round(s["cpu_seconds"], 4),
+                    "peak_rss_mb": round(s["peak_rss"] / 2**20, 1),
+                    "rss_delta_mb": round(s["rss_delta"] / 2**20, 1)
+                }
+                for s in sorted(self.spans, key=lambda s: s["start"])
+            }
+        }
+
+
+def current_trace():
+    return _current.get()
+
+
+@contextmanager
+def span(name):
+    """Time a block under the active trace; a no-op when nothing is traced."""
+    trace = _current.get()
+    if trace is None:
+        yield
+    else:
+        with trace.span(name):
+            yield
+
+
+# ================= PROFILER =================
+class SamplingProfiler:
+    """
+    Minimal wall-clock sampling profiler: a thread snapshots every other
+    Python thread's stack each `interval` seconds. Output is in the
+    "folded" format read by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+    def _run(self):
+        me = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for t in threading.enumerate():
+                names[t.ident] = t.name
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def write(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+# ================= AGGREGATION =================
+def _connect():
+    return sqlite3.connect(METRICS_DB, timeout=30, isolation_level=None)
+
+
+def init_metrics():
+    conn = _connect()
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS stage_totals (
+        stage TEXT PRIMARY KEY,
+        count INTEGER NOT NULL DEFAULT 0,
+        errors INTEGER NOT NULL DEFAULT 0,
+        wall_sum REAL NOT NULL DEFAULT 0,
+        cpu_sum REAL NOT NULL DEFAULT 0,
+        rss_max INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS stage_buckets (
+        stage TEXT NOT NULL,
+        le REAL NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (stage, le)
+    )
+    ''')
+    conn.close()
+
+
+def _observe(conn, stage, seconds, cpu, rss, error):
+    conn.execute("INSERT OR IGNORE INTO stage_totals (stage) VALUES (?)", (stage,))
+    conn.execute('''
+        UPDATE stage_totals SET count = count + 1, errors = errors + ?, wall_sum = wall_sum + ?,
+               cpu_sum = cpu_sum + ?, rss_max = MAX(rss_max, ?)
+        WHERE stage = ?
+    ''', (1 if error else 0, seconds, cpu, rss, stage))
+    conn.executemany("INSERT OR IGNORE INTO stage_buckets (stage, le) VALUES (?, ?)",
+                     [(stage, le) for le in BUCKETS])
+    conn.execute("UPDATE stage_buckets SET count = count + 1 WHERE stage = ? AND le >= ?", (stage, seconds))
+
+
+def record(trace):
+    """
+    Add a finished trace to the shared totals. Every worker process
+    writes here, so /metrics in the web process sees all of them.
+    """
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        for s in trace.spans:
+            _observe(conn, s["name"], s["seconds"], s["cpu_seconds"], s["peak_rss"], s["error"])
+        _observe(conn, "", trace.seconds, trace.cpu_seconds, trace.peak_rss, trace.error)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+# ================= PROMETHEUS =================
+def _labels(**labels):
+    body = ",".join(f'{k}="{str(v)}"' for k, v in labels.items() if v != "")
+    return "{" + body + "}" if body else ""
+
+
+def _le(le):
+    return "+Inf" if le == float("inf") else repr(float(le))
+
+
+def render_prometheus(gauges=None):
+    """
+    Stage and request metrics in the Prometheus text format. `gauges` is
+    an optional {name: value} of extra point-in-time values to append.
+    """
+    conn = _connect()
+    totals = conn.execute("SELECT stage, count, errors, wall_sum, cpu_sum, rss_max FROM stage_totals "
+                          "ORDER BY stage").fetchall()
+    buckets = conn.execute("SELECT stage, le, count FROM stage_buckets ORDER BY stage, le").fetchall()
+    conn.close()
+
+    by_stage = collections.defaultdict(list)
+    for stage, le, count in buckets:
+        by_stage[stage].append((le, count))
+
+    out = []
+    for kind, doc in (("request", "End-to-end prediction requests"), ("stage", "Prediction flow stages")):
+        rows = [r for r in totals if (r[0] == "") == (kind == "request")]
+        name = f"{PREFIX}_{kind}"
+
+        out.append(f"# HELP {name}_seconds {doc}: wall time.")
+        out.append(f"# TYPE {name}_seconds histogram")
+        for stage, count, _, wall_sum, _, _ in rows:
+            for le, n in by_stage[stage]:
+                out.append(f"{name}_seconds_bucket{_labels(stage=stage, le=_le(le))} {n}")
+            out.append(f"{name}_seconds_sum{_labels(stage=stage)} {wall_sum}")
+            out.append(f"{name}_seconds_count{_labels(stage=stage)} {count}")
+
+        out.append(f"# HELP {name}_cpu_seconds_total {doc}: process CPU time.")
+        out.append(f"# TYPE {name}_cpu_seconds_total counter")
+        for stage, _, _, _, cpu_sum, _ in rows:
+            out.append(f"{name}_cpu_seconds_total{_labels(stage=stage)} {cpu_sum}")
+
+        out.append(f"# HELP {name}_errors_total {doc}: runs that raised.")
+        out.append(f"# TYPE {name}_errors_total counter")
+        for stage, _, errors, _, _, _ in rows:
+            out.append(f"{name}_errors_total{_labels(stage=stage)} {errors}")
+
+        out.append(f"# HELP {name}_peak_rss_bytes {doc}: highest process RSS seen.")
+        out.append(f"# TYPE {name}_peak_rss_bytes gauge")
+        for stage, _, _, _, _, rss_max in rows:
+            out.append(f"{name}_peak_rss_bytes{_labels(stage=stage)} {rss_max}")
+
+    for name, value in (gauges or {}).items():
+        out.append(f"# TYPE {PREFIX}_{name} gauge")
+        out.append(f"{PREFIX}_{name} {float(value)}")
+    return "\n".join(out) + "\n"
@@ -0,0 +1,78 @@
+"""
+lab_fast.FastLabModel must give exactly what predict_pancreas_stage gives
+(stage, survival text, recommendations), for every kind of estimator it
+compiles and for one it has to hand back to sklearn.
+
+    python -m pytest -q tests
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lab_prediction
+from lab_prediction import FEATURES, predict_pancreas_stage
+from lab_fast import FastLabModel
+
+pytest.importorskip("sklearn")
+joblib = pytest.importorskip("joblib")
+
+
+def _models():
+    from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+    from sklearn.linear_model import LogisticRegression, RidgeClassifier, SGDClassifier
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import MinMaxScaler, StandardScaler
+    from sklearn.svm import SVC, LinearSVC
+    from sklearn.tree import DecisionTreeClassifier
+
+    return {
+        "RandomForestClassifier": RandomForestClassifier(n_estimators=20, random_state=0),
+        "ExtraTreesClassifier": ExtraTreesClassifier(n_estimators=20, random_state=0),
+        "DecisionTreeClassifier": DecisionTreeClassifier(random_state=0),
+        "LogisticRegression": make_pipeline(StandardScaler(), LogisticRegression(max_iter=1000)),
+        "RidgeClassifier": make_pipeline(MinMaxScaler(), RidgeClassifier()),
+        "LinearSVC": make_pipeline(StandardScaler(), LinearSVC()),
+        "SGDClassifier": make_pipeline(StandardScaler(), SGDClassifier(random_state=0)),
+        "SVC (sklearn fallback)": make_pipeline(StandardScaler(), SVC(kernel="linear")),
+    }
+
+
+def _rows(n, seed):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        rng.uniform(0, 1500, n),
+        rng.uniform(0.2, 15, n),
+        rng.uniform(40, 900, n),
+        rng.uniform(2.0, 5.0, n),
+        rng.uniform(1, 12, n),
+        rng.uniform(30, 90, n)   # fractional ages: truncated for the stage, raw for the risk
+    ])
+
+
+@pytest.fixture(scope="module")
+def encoder():
+    return joblib.load(lab_prediction.encoder_path)
+
+
+@pytest.mark.parametrize("name", list(_models()))
+def test_fast_path_matches_predict_pancreas_stage(name, encoder, monkeypatch):
+    estimator = _models()[name]
+    train = pd.DataFrame(_rows(400, seed=0), columns=FEATURES)
+    train["Age"] = train["Age"].astype(int)
+    # every class present: CA19_9 quantile bins
+    n = len(encoder.classes_)
+    bins = np.digitize(train["CA19_9"], np.quantile(train["CA19_9"], np.linspace(0, 1, n + 1)[1:-1]))
+    estimator.fit(train, encoder.transform(encoder.classes_)[bins])
+
+    monkeypatch.setattr(lab_prediction, "_model", estimator)
+    monkeypatch.setattr(lab_prediction, "_label_encoder", encoder)
+    fast = FastLabModel(estimator, encoder)
+    assert fast.compiled == (name != "SVC (sklearn fallback)")
+
+    for row in _rows(200, seed=1).tolist():
+        assert fast.predict(row) == predict_pancreas_stage(*row), row
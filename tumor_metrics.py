@@ -0,0 +1,156 @@
+import numpy as np
+from scipy import ndimage
+from scipy.spatial import ConvexHull, QhullError
+from scipy.spatial.distance import pdist
+
+# 26-connectivity: voxels touching by a face, edge or corner form one lesion
+CONNECTIVITY = ndimage.generate_binary_structure(3, 3)
+
+
+# ================= HELPERS =================
+def _hull_points(points):
+    """
+    The points the farthest pair must be among: the convex hull vertices.
+    A flat point set (e.g. a lesion on a single slice) is hulled in its
+    own plane, a collinear one reduces to its two ends, so pdist never
+    sees the full point cloud.
+    """
+    try:
+        return points[ConvexHull(points).vertices]
+    except QhullError:
+        pass
+    centered = points - points.mean(axis=0)
+    _, s, vt = np.linalg.svd(centered, full_matrices=False)
+    if s[1] > s[0] * 1e-9:
+        try:
+            return points[ConvexHull(centered @ vt[:2].T).vertices]
+        except QhullError:
+            pass
+    t = centered @ vt[0]
+    return points[[int(t.argmin()), int(t.argmax())]]
+
+
+def _max_feret(points):
+    """Largest distance between any two points (rows of an (n, 3) array)."""
+    if len(points) < 2:
+        return 0.0
+    if len(points) > 64:
+        points = _hull_points(points)
+    return float(pdist(points).max())
+
+
+def lesion_stats(mask, spacing, offset=(0, 0, 0)):
+    """
+    Connected-component analysis of a boolean mask. For each lesion
+    returns its voxel count, volume, bounding box (in `offset`-shifted
+    voxel coordinates) and maximum Feret diameter in mm. The diameter is
+    measured between voxel centres but never reported below the lesion's
+    largest extent along an axis (one voxel is one voxel wide, not 0 mm).
+    Largest lesion first.
+    """
+    labels, n = ndimage.label(mask, structure=CONNECTIVITY)
+    if n == 0:
+        return []
+
+    spacing = np.asarray(spacing, dtype=np.float64)
+    voxel_volume = float(np.prod(spacing))
+    counts = np.bincount(labels.ravel(), minlength=n + 1)
+
+    lesions = []
+    for i, box in enumerate(ndimage.find_objects(labels), start=1):
+        lesion = labels[box] == i
+        # The Feret diameter is reached between boundary voxels, so the
+        # interior can be dropped before building the point cloud.
+        boundary = lesion & ~ndimage.binary_erosion(lesion)
+        points = np.argwhere(boundary) * spacing
+
+        lo = [int(s.start) + o for s, o in zip(box, offset)]
+        hi = [int(s.stop) - 1 + o for s, o in zip(box, offset)]
+        lesions.append({
+            "voxel_count": int(counts[i]),
+            "volume_mm3": float(counts[i] * voxel_volume),
+            "bbox": [lo, hi],
+            "max_feret_mm": max(_max_feret(points),
+                                float(max((s.stop - s.start) * d for s, d in zip(box, spacing))))
+        })
+
+    lesions.sort(key=lambda l: l["voxel_count"], reverse=True)
+    return lesions
+
+
+# ================= METRICS =================
+def compute_metrics(label_map, spacing, offset=(0, 0, 0), shape=None):
+    """
+    Tumor metrics straight from the integer nnU-Net label map, without a
+    float copy of the volume.
+
+    The full volume is read once to build the per-slice area profile;
+    everything else (bounding box, best slice, lesions) works on the
+    z-slab that actually contains tumor.
+
+    `label_map` may also be a crop (e.g. a decoded mask_codec.PackedMask)
+    whose (x, y, z) corner is `offset` in a volume of `shape`; results
+    are then in full-volume coordinates.
+    """
+    spacing = tuple(float(s) for s in spacing[:3])
+    shape = tuple(int(n) for n in (shape or label_map.shape))
+    ox, oy, oz = (int(o) for o in offset)
+    mask = label_map > 0
+
+    # per-slice area profile (voxels per axial slice)
+    slice_areas = np.zeros(shape[2], dtype=np.int64)
+    slice_areas[oz:oz + mask.shape[2]] = np.count_nonzero(mask, axis=(0, 1))
+    tumor_slices = np.flatnonzero(slice_areas)
+    voxel_count = int(slice_areas.sum())
+
+    metrics = {
+        "volume": voxel_count * spacing[0] * spacing[1] * spacing[2],
+        "shape": shape,
+        "voxel_count": voxel_count,
+        "spacing": spacing,
+        "mid_slice": shape[2] // 2,
+        "size_x": 0.0,
+        "size_y": 0.0,
+        "size_z": 0.0,
+        "max_diameter": 0.0,
+        "lesion_count": 0,
+        "lesions": [],
+        "slice_areas": slice_areas.tolist()
+    }
+    if voxel_count == 0:
+        return metrics
+
+    z_min, z_max = int(tumor_slices[0]), int(tumor_slices[-1])
+    slab = mask[:, :, z_min - oz:z_max - oz + 1]
+
+    footprint = slab.any(axis=2)
+    xs = np.flatnonzero(footprint.any(axis=1))
+    ys = np.flatnonzero(footprint.any(axis=0))
+    x_min, x_max = int(xs[0]), int(xs[-1])
+    y_min, y_max = int(ys[0]), int(ys[-1])
+
+    crop = slab[x_min:x_max + 1, y_min:y_max + 1]
+    x_min, x_max, y_min, y_max = x_min + ox, x_max + ox, y_min + oy, y_max + oy
+    lesions = lesion_stats(crop, spacing, offset=(x_min, y_min, z_min))
+
+    metrics.update({
+        "mid_slice": int(tumor_slices[len(tumor_slices) // 2]),
+        "size_x": (x_max - x_min + 1) * spacing[0],
+        "size_y": (y_max - y_min + 1) * spacing[1],
+        "size_z": (z_max - z_min + 1) * spacing[2],
+        "max_diameter": max(l["max_feret_mm"] for l in lesions),
+        "lesion_count": len(lesions),
+        "lesions": lesions
+    })
+    return metrics
+
+
+
+# ================= COMPARISON =================
+def dice(a, b):
+    """Dice overlap of two masks (nonzero = foreground); 1.0 if both are empty."""
+    a, b = np.asarray(a) > 0, np.asarray(b) > 0
+    total = np.count_nonzero(a) + np.count_nonzero(b)
+    if total == 0:
+        return 1.0
+    return 2.0 * np.count_nonzero(a & b) / total
@@ -0,0 +1,229 @@
+import hashlib
+import json
+import os
+import struct
+import threading
+import zlib
+
+from workspace import Workspace
+
+CHUNK_SIZE = 8 * 1024 * 1024        # client chunk size for resumable uploads
+COPY_BLOCK = 1024 * 1024            # server-side read size while streaming
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_MB", "4096")) * 1024 * 1024)
+
+ALLOWED_SUFFIXES = (".nii", ".nii.gz", ".zip")
+META_FILE = "upload.json"
+
+
+class UploadError(ValueError):
+    pass
+
+
+# ================= HEADER VALIDATION =================
+def check_nifti_header(head):
+    """
+    Validate the first bytes of an (uncompressed) NIfTI-1/2 stream.
+    Returns None if more bytes are needed, raises UploadError if invalid.
+    """
+    if len(head) < 4:
+        return None
+
+    for endian in "<>":
+        sizeof_hdr = struct.unpack(endian + "i", head[:4])[0]
+        if sizeof_hdr == 348:
+            if len(head) < 348:
+                return None
+            if head[344:347] not in (b"n+1", b"ni1"):
+                raise UploadError("Not a NIfTI-1 file (bad magic)")
+            dims = struct.unpack(endian + "8h", head[40:56])
+            break
+        if sizeof_hdr == 540:
+            if len(head) < 540:
+                return None
+            if head[4:7] not in (b"n+2", b"ni2"):
+                raise UploadError("Not a NIfTI-2 file (bad magic)")
+            dims = struct.unpack(endian + "8q", head[16:80])
+            break
+    else:
+        raise UploadError("Not a NIfTI file (bad header size)")
+
+    if not 3 <= dims[0] <= 4 or any(d <= 0 for d in dims[1:dims[0] + 1]):
+        raise UploadError(f"Unsupported NIfTI dimensions {dims[:dims[0] + 1]}")
+    return True
+
+
+class HeaderSniffer:
+    """Feeds the first bytes of an upload to the matching header check."""
+
+    def __init__(self, filename):
+        self.kind = next(s for s in ALLOWED_SUFFIXES if filename.lower().endswith(s))
+        self.inflate = zlib.decompressobj(16 + zlib.MAX_WBITS) if self.kind == ".nii.gz" else None
+        self.head = b""
+        self.done = False
+
+    def feed(self, data):
+        if self.done:
+            return
+        if self.kind == ".zip":
+            self.head += data[:4 - len(self.head)]
+            if len(self.head) >= 4:
+                if self.head != b"PK\x03\x04":
+                    raise UploadError("Not a zip archive")
+                self.done = True
+            return
+
+        if self.inflate is not None:
+            try:
+                data = self.inflate.decompress(data, 540 - len(self.head))
+            except zlib.error:
+                raise UploadError("Corrupt gzip stream")
+        self.head += data[:540 - len(self.head)]
+        if check_nifti_header(self.head):
+            self.done = True
+
+
+# ================= RESUMABLE UPLOADS =================
+# sha256 state of in-progress uploads handled by this process. If a chunk
+# lands on another process (or after a restart) the state is rebuilt by
+# hashing the bytes already on disk.
+_hashers = {}
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _upload_lock(upload_id):
+    with _locks_guard:
+        return _locks.setdefault(upload_id, threading.Lock())
+
+
+class Upload:
+    """
+    A resumable upload streamed straight into a fresh workspace. Chunks
+    must arrive in order; `offset` (the bytes on disk) tells a client
+    where to resume.
+    """
+
+    def __init__(self, ws, meta):
+        self.ws = ws
+        self.meta = meta
+        self.path = ws.input_path(meta["filename"])
+
+    @property
+    def id(self):
+        return self.ws.id
+
+    @classmethod
+    def create(cls, filename, total_size, user_id=None):
+        if not filename.lower().endswith(ALLOWED_SUFFIXES):
+            raise UploadError(f"Unsupported file type; expected one of {', '.join(ALLOWED_SUFFIXES)}")
+        if total_size <= 0 or total_size > MAX_UPLOAD_BYTES:
+            raise UploadError(f"Upload size must be between 1 byte and {MAX_UPLOAD_BYTES} bytes")
+
+        ws = Workspace.create()
+        upload = cls(ws, {"filename": filename, "total": total_size, "user_id": user_id,
+                          "sha256": None, "valid": False})
+        open(upload.path, "wb").close()
+        upload._save_meta()
+        return upload
+
+    @classmethod
+    def load(cls, upload_id):
+        ws = Workspace(upload_id)
+        meta_path = os.path.join(ws.input_dir, META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as f:
+            return cls(ws, json.load(f))
+
+    def _save_meta(self):
+        with open(os.path.join(self.ws.input_dir, META_FILE), "w") as f:
+            json.dump(self.meta, f)
+
+    @property
+    def offset(self):
+        return os.path.getsize(self.path)
+
+    @property
+    def complete(self):
+        return self.meta["sha256"] is not None
+
+    def _hasher(self):
+        h = _hashers.get(self.id)
+        if h is None or h[1] != self.offset:
+            sha = hashlib.sha256()
+            with open(self.path, "rb") as f:
+                for block in iter(lambda: f.read(COPY_BLOCK), b""):
+                    sha.update(block)
+            h = [sha, self.offset]
+        return h
+
+    def write_chunk(self, stream, start):
+        """
+        Append bytes from `stream` (read in COPY_BLOCK pieces) at `start`,
+        which must equal the current offset. Validates the file header as
+        soon as enough bytes have arrived. Returns the new offset.
+        """
+        with _upload_lock(self.id):
+            if self.complete:
+                raise UploadError("Upload already completed")
+            if start != self.offset:
+                raise UploadError(f"Expected chunk at offset {self.offset}, got {start}")
+
+            sha, _ = h = self._hasher()
+            sniffer = HeaderSniffer(self.meta["filename"]) if not self.meta["valid"] else None
+            if sniffer is not None and start > 0:
+                with open(self.path, "rb") as f:
+                    sniffer.feed(f.read(64 * 1024))
+
+            written = start
+            try:
+                with open(self.path, "ab") as f:
+                    for block in iter(lambda: stream.read(COPY_BLOCK), b""):
+                        written += len(block)
+                        if written > self.meta["total"]:
+                            raise UploadError("More bytes than announced")
+                        if sniffer is not None and not sniffer.done:
+                            sniffer.feed(block)
+                        f.write(block)
+                        sha.update(block)
+            except UploadError:
+                _hashers.pop(self.id, None)
+                self.ws.remove()
+                raise
+
+            h[1] = written
+            _hashers[self.id] = h
+            if sniffer is not None and sniffer.done:
+                self.meta["valid"] = True
+                self._save_meta()
+            return written
+
+    def finish(self):
+        """Check the upload is whole and valid; returns its sha256."""
+        with _upload_lock(self.id):
+            if self.complete:
+                return self.meta["sha256"]
+            if self.offset != self.meta["total"]:
+                raise UploadError(f"Upload incomplete: {self.offset}/{self.meta['total']} bytes")
+            if not self.meta["valid"]:
+                self.ws.remove()
+                raise UploadError("File header could not be validated")
+
+            sha, _ = self._hasher()
+            _hashers.pop(self.id, None)
+            with _locks_guard:
+                _locks.pop(self.id, None)
+            self.meta["sha256"] = sha.hexdigest()
+            self._save_meta()
+            return self.meta["sha256"]
+
+
+def save_stream(stream, filename, user_id=None):
+    """
+    Single-request upload (the plain form post): stream to a new
+    workspace while hashing and validating. Returns (workspace, path, sha256).
+    """
+    upload = Upload.create(filename, MAX_UPLOAD_BYTES, user_id)
+    upload.write_chunk(stream, 0)
+    upload.meta["total"] = upload.offset
+    return upload.ws, upload.path, upload.finish()
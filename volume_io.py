@@ -0,0 +1,129 @@
+import gzip
+import os
+import shutil
+import tempfile
+import threading
+
+import nibabel as nib
+import numpy as np
+
+CHUNK = 4 * 1024 * 1024
+
+
+def _decompressed_path(path):
+    """
+    Decompress a .nii.gz once, next to the source file when possible (so
+    it is removed together with the case workspace), and reuse it on
+    every later access.
+    """
+    target = path[:-3]
+    if not os.access(os.path.dirname(target) or ".", os.W_OK):
+        target = os.path.join(tempfile.gettempdir(), os.path.basename(target))
+
+    if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+        return target
+
+    tmp = f"{target}.tmp{os.getpid()}-{threading.get_ident()}"
+    with gzip.open(path, "rb") as src, open(tmp, "wb") as dst:
+        shutil.copyfileobj(src, dst, CHUNK)
+    os.replace(tmp, target)
+    return target
+
+
+class CTVolume:
+    """
+    Lazy view of a NIfTI volume. Only the header is parsed on open; voxel
+    data is read through nibabel's array proxy over a memory map, so
+    `ct[:, :, z]` touches just the pages of that slice and keeps the
+    on-disk dtype (unless the header asks for intensity scaling).
+
+    Compressed volumes are decompressed to disk on first access and then
+    memory-mapped like any other .nii.
+    """
+
+    def __init__(self, path, decompress=True):
+        self.source_path = path
+        self._decompress = decompress and path.endswith(".gz")
+        self._img = None
+        self._lock = threading.Lock()     # stages may read the same volume concurrently
+        if not self._decompress:
+            self._img = nib.load(path, mmap=True)
+            self.header = self._img.header
+        else:
+            # header only; the gzip stream is not inflated past it
+            self.header = nib.load(path).header
+
+    @property
+    def img(self):
+        if self._img is None:
+            with self._lock:
+                if self._img is None:
+                    self._img = nib.load(_decompressed_path(self.source_path), mmap=True)
+        return self._img
+
+    @property
+    def shape(self):
+        return tuple(int(n) for n in self.header.get_data_shape()[:3])
+
+    @property
+    def spacing(self):
+        return tuple(float(s) for s in self.header.get_zooms()[:3])
+
+    @property
+    def dtype(self):
+        return self.header.get_data_dtype()
+
+    @property
+    def affine(self):
+        return self.header.get_best_affine()
+
+    def __getitem__(self, slicer):
+        return np.asarray(self.img.dataobj[slicer])
+
+    def axial(self, z):
+        return self[:, :, int(z)]
+
+    def coronal(self, y):
+        return self[:, int(y), :]
+
+    def sagittal(self, x):
+        return self[int(x), :, :]
+
+    def slab(self, z_min, z_max):
+        return self[:, :, int(z_min):int(z_max) + 1]
+
+
+class ArrayVolume(CTVolume):
+    """
+    An in-memory (x, y, z) volume with the CTVolume interface, for series
+    that never touch disk as NIfTI (e.g. decoded DICOM).
+    """
+
+    def __init__(self, data, spacing, affine=None):
+        self.source_path = None
+        self.data = data
+        self._spacing = tuple(float(s) for s in spacing)
+        self._affine = np.diag(list(self._spacing) + [1.0]) if affine is None else affine
+
+    @property
+    def shape(self):
+        return tuple(int(n) for n in self.data.shape[:3])
+
+    @property
+    def spacing(self):
+        return self._spacing
+
+    @property
+    def dtype(self):
+        return self.data.dtype
+
+    @property
+    def affine(self):
+        return self._affine
+
+    def __getitem__(self, slicer):
+        return self.data[slicer]
+
+
+def open_volume(path, decompress=True):
+    return CTVolume(path, decompress=decompress)
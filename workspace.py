@@ -0,0 +1,65 @@
+import os
+import shutil
+import time
+import uuid
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Workspaces live under static/ so the rendered PNGs can be served directly
+WORKSPACE_ROOT = os.path.join(BASE_DIR, "static", "workspaces")
+WORKSPACE_TTL = float(os.getenv("WORKSPACE_TTL_HOURS", "24")) * 3600
+
+# Outputs of finished, stored analyses; kept for the prediction history
+CASES_ROOT = os.path.join(BASE_DIR, "static", "cases")
+
+
+class Workspace:
+    """
+    Private scratch directory for one analysis:
+
+        static/workspaces/<id>/input/    uploaded volume
+        static/workspaces/<id>/output/   prediction NIfTI + rendered images
+
+    Nothing in here is shared with other cases, so any number of analyses
+    can run side by side.
+    """
+
+    def __init__(self, workspace_id, root=WORKSPACE_ROOT):
+        self.id = workspace_id
+        self.path = os.path.join(root, workspace_id)
+        self.input_dir = os.path.join(self.path, "input")
+        self.output_dir = os.path.join(self.path, "output")
+
+    @classmethod
+    def create(cls, root=WORKSPACE_ROOT):
+        ws = cls(uuid.uuid4().hex, root)
+        os.makedirs(ws.input_dir)
+        os.makedirs(ws.output_dir)
+        return ws
+
+    def input_path(self, filename):
+        return os.path.join(self.input_dir, filename)
+
+    def exists(self):
+        return os.path.isdir(self.path)
+
+    def remove(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def case_dir(case_id, root=CASES_ROOT):
+    return os.path.join(root, case_id)
+
+
+def cleanup_expired(ttl=WORKSPACE_TTL, root=WORKSPACE_ROOT):
+    """Delete workspaces not modified within `ttl` seconds. Returns the count."""
+    if not os.path.isdir(root):
+        return 0
+
+    cutoff = time.time() - ttl
+    removed = 0
+    for entry in os.scandir(root):
+        if entry.is_dir() and entry.stat().st_mtime < cutoff:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+    return removed
@@ -0,0 +1,94 @@
+"""
+3D distance-to-boundary heatmaps for the XAI views.
+
+One anisotropic Euclidean distance transform (in mm, using the real voxel
+spacing) over the tumor's bounding box gives the heatmap of every tumor
+slice at once, plus a maximum-intensity projection. They are stored with
+the case as XAI_FILE, so any slice can be served later without
+recomputation.
+"""
+import numpy as np
+from scipy import ndimage
+
+from mask_codec import foreground_bbox
+
+XAI_FILE = "xai.npz"
+
+
+class Heatmaps:
+    """
+    Weights in [0, 1] (distance to the tumor surface / deepest point),
+    stored as uint8 over the bounding box at `offset` of a volume of
+    `shape`, all (x, y, z). `peak_mm` is the depth of the deepest voxel.
+
+    Stored weights are relative to that 3D peak, which `mip()` keeps.
+    `axial()` rescales each slice to its own maximum, as the per-slice
+    heatmaps did, so the thin edge slices of a tumor are not rendered
+    near-black.
+    """
+
+    def __init__(self, shape, offset, weights, peak_mm):
+        self.shape = tuple(int(n) for n in shape)
+        self.offset = tuple(int(o) for o in offset)
+        self.weights = weights
+        self.peak_mm = float(peak_mm)
+
+    @classmethod
+    def compute(cls, label_map, spacing, offset=(0, 0, 0), shape=None):
+        """
+        `label_map` is the full (x, y, z) prediction, or a crop of it at
+        `offset` in a volume of `shape` (e.g. mask_codec.PackedMask.crop()).
+        """
+        label_map = np.asarray(label_map)
+        shape = tuple(shape or label_map.shape)
+        bbox = foreground_bbox(label_map)
+        if bbox is None:
+            return cls(shape, (0, 0, 0), np.zeros((0, 0, 0), dtype=np.uint8), 0.0)
+
+        # one voxel of background around the box so the surface is seen on every side
+        mask = np.pad(label_map[tuple(slice(a, b) for a, b in bbox)] > 0, 1)
+        dist = ndimage.distance_transform_edt(mask, sampling=[float(s) for s in spacing[:3]])[1:-1, 1:-1, 1:-1]
+        peak = float(dist.max())
+        weights = np.rint(dist * (255.0 / peak)).astype(np.uint8)
+        return cls(shape, [o + a for o, (a, _) in zip(offset, bbox)], weights, peak)
+
+    @property
+    def slices(self):
+        """Axial indices that have a heatmap."""
+        return range(self.offset[2], self.offset[2] + self.weights.shape[2])
+
+    def _full(self, plane, peak=255):
+        out = np.zeros(self.shape[:2], dtype=np.float32)
+        x0, y0 = self.offset[:2]
+        sx, sy = plane.shape
+        out[x0:x0 + sx, y0:y0 + sy] = plane * np.float32(1 / peak)
+        return out
+
+    def axial(self, z):
+        """
+        Full-size (x, y) float32 weights of slice `z` (zeros outside the
+        tumor), scaled so the slice's deepest voxel is 1.
+        """
+        k = z - self.offset[2]
+        if not 0 <= k < self.weights.shape[2]:
+            return np.zeros(self.shape[:2], dtype=np.float32)
+        plane = self.weights[:, :, k]
+        return self._full(plane, max(int(plane.max()), 1))
+
+    def mip(self):
+        """Full-size maximum-intensity projection along z, relative to the 3D peak."""
+        if self.weights.size == 0:
+            return np.zeros(self.shape[:2], dtype=np.float32)
+        return self._full(self.weights.max(axis=2))
+
+    # ================= FILES =================
+    def save(self, path):
+        with open(path, "wb") as f:
+            np.savez_compressed(f, shape=np.asarray(self.shape), offset=np.asarray(self.offset),
+                                weights=self.weights, peak_mm=np.float64(self.peak_mm))
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            return cls(f["shape"], f["offset"], f["weights"], f["peak_mm"])